@@ -0,0 +1,42 @@
+import argparse
+import sys
+import os
+
+script_path = os.path.abspath(__file__)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(script_path), "..")))
+
+from src.config import AppConfig
+from src.database.persistence import DatabaseManager
+from src.database.retention import compact_pipeline_versions, count_pipeline_version_rows, \
+    superseded_pipeline_versions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive & remove the rows of the pipeline versions superseded by the "
+                                                 "configured pipeline version, then reclaim their space")
+    parser.add_argument('--keep-versions', type=int, default=AppConfig.KEEP_PIPELINE_VERSIONS,
+                        help="number of the latest superseded pipeline versions kept")
+    parser.add_argument('--dry-run', action='store_true', help="only print the rows that would be removed")
+    args = parser.parse_args()
+
+    db_manager = DatabaseManager(AppConfig.DATABASE_URI)
+    pipeline_versions = superseded_pipeline_versions(db_manager, AppConfig.PIPELINE_VERSION, args.keep_versions)
+    if not pipeline_versions:
+        print(f"No pipeline version superseded by pipeline version {AppConfig.PIPELINE_VERSION} to remove")
+        sys.exit()
+
+    if args.dry_run:
+        for pipeline_version in pipeline_versions:
+            for table_name, rows in count_pipeline_version_rows(db_manager, pipeline_version).items():
+                print(f"Pipeline version {pipeline_version}: {rows} rows in {table_name}")
+        sys.exit()
+
+    archive_directory = AppConfig.ARCHIVE_DIRECTORY
+    print(f"Removing pipeline versions {', '.join(map(str, pipeline_versions))}, "
+          f"{'archived to ' + archive_directory if archive_directory else 'without archiving'}")
+    report = compact_pipeline_versions(db_manager, pipeline_versions, archive_directory,
+                                       AppConfig.COMPACTION_BATCH_ROWS, AppConfig.COLUMNAR_STORE_DIRECTORY)
+
+    print(f"Removed {sum(report['tables'].values())} rows, {report['archived_bytes']} bytes archived")
+    if report['database_bytes_before'] is not None:
+        print(f"Database size {report['database_bytes_before']} -> {report['database_bytes_after']} bytes, "
+              f"{report['database_bytes_before'] - report['database_bytes_after']} bytes reclaimed")
@@ -0,0 +1,27 @@
+import sys
+import os
+from datetime import timedelta
+
+script_path = os.path.abspath(__file__)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(script_path), "..")))
+
+from src.config import AppConfig
+from src.database.persistence import DatabaseManager
+
+if __name__ == "__main__":
+    db_manager = DatabaseManager(AppConfig.DATABASE_URI)
+
+    # Explain the stats queries for the first window of the configured pipeline version
+    min_timestamp, _ = db_manager.fetch_min_max_cleaned_readings_timestamp(AppConfig.PIPELINE_VERSION)
+    if not min_timestamp:
+        print(f"No cleaned readings to explain the queries for Pipeline version : {AppConfig.PIPELINE_VERSION}")
+        sys.exit()
+
+    from_date = min_timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    to_date = from_date + timedelta(days=AppConfig.DURATION_IN_DAYS)
+
+    query_plans = db_manager.explain_hot_queries(AppConfig.PIPELINE_VERSION, from_date, to_date)
+    for query_name, query_plan in query_plans.items():
+        print(f"{query_name}:")
+        for line in query_plan:
+            print(f"    {line}")
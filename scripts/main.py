@@ -1,5 +1,8 @@
+import argparse
+import logging
 import sys
 import os
+from contextlib import nullcontext
 
 script_path = os.path.abspath(__file__)
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(script_path), "..")))
@@ -7,16 +10,62 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(script_path), "..")
 from src.config import AppConfig
 from src.pipeline.etl import trigger_etl
 from src.analysis.stats import trigger_summary_stats_creation
+from src.pipeline.watch import watch_input_directory
+from src.util.instrumentation import METRICS
+from src.util.profiling import PROFILERS, ChunkSampler, create_run_directory, profile_step
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the ETL & the summary stats creation")
+    parser.add_argument('--watch', action='store_true',
+                        help="keep running & load the lines appended to the input files as they arrive")
+    parser.add_argument('--poll-interval', type=float, default=AppConfig.WATCH_POLL_INTERVAL_SECONDS,
+                        help="seconds between two polls of the input directory in watch mode")
+    parser.add_argument('--profile', choices=PROFILERS,
+                        help="profile the ETL & the stats creation separately, the profiles are written to a run "
+                             "directory & their top entries printed")
+    parser.add_argument('--profile-top', type=int, default=20, help="number of entries printed of every profile")
+    parser.add_argument('--profile-directory', default='profiles', help="directory the run directories are created in")
+    parser.add_argument('--profile-chunks', action='store_true',
+                        help="also sample the time & memory after the cleaning of every chunk & every stats "
+                             "computation, the memory is traced with --profile tracemalloc")
+    args = parser.parse_args()
+
+    if args.watch and args.profile:
+        parser.error("--profile can not be used with --watch")
+    if args.profile_chunks and not args.profile:
+        parser.error("--profile-chunks needs --profile")
+
+    logging.basicConfig(level=AppConfig.LOG_LEVEL, format='%(asctime)s %(levelname)s %(name)s %(message)s')
+
     print(f"Database URI: {AppConfig.DATABASE_URI}")
     print(f"Pipeline version URI: {AppConfig.PIPELINE_VERSION}")
     print(f"Input directory path: {AppConfig.INPUT_DIRECTORY_PATH}")
 
-    print("Triggering ETL")
-    trigger_etl()
-    print("ETL Complete")
+    if args.watch:
+        watch_input_directory(args.poll_interval)
+        sys.exit()
+
+    run_directory = None
+    if args.profile:
+        run_directory = create_run_directory(args.profile_directory)
+        print(f"Profiling with {args.profile}, profiles written to {run_directory}")
+
+    def run_step(name, step):
+        if args.profile:
+            return profile_step(args.profile, run_directory, name, step, args.profile_top)
+        return step()
+
+    chunk_sampler = ChunkSampler(os.path.join(run_directory, 'chunk_samples.csv')) if args.profile_chunks \
+        else nullcontext()
+    with chunk_sampler:
+        print("Triggering ETL")
+        run_step('trigger_etl', trigger_etl)
+        print("ETL Complete")
+
+        print("Triggering Summary Stats Creation")
+        run_step('trigger_summary_stats_creation', trigger_summary_stats_creation)
+        print("Summary Stats Creation Complete")
 
-    print("Triggering Summary Stats Creation")
-    trigger_summary_stats_creation()
-    print("Summary Stats Creation Complete")
+    METRICS.log_summary()
+    if AppConfig.METRICS_TEXTFILE:
+        METRICS.write_prometheus_textfile(AppConfig.METRICS_TEXTFILE)
@@ -0,0 +1,13 @@
+import sys
+import os
+
+script_path = os.path.abspath(__file__)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(script_path), "..")))
+
+from src.config import AppConfig
+from src.database.persistence import DatabaseManager
+
+if __name__ == "__main__":
+    print(f"Rebuilding statistics accumulators, power curves & rollups for Pipeline version "
+          f"{AppConfig.PIPELINE_VERSION}")
+    DatabaseManager(AppConfig.DATABASE_URI).rebuild_statistics_accumulators(AppConfig.PIPELINE_VERSION)
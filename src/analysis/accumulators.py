@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+
+ACCUMULATOR_COLUMNS = ['reading_count', 'power_sum', 'power_m2', 'min_power', 'max_power']
+
+
+def calculate_accumulators(df):
+    # Partial stats of the power output per day & turbine
+    group_keys = [pd.to_datetime(df['timestamp']).dt.floor('D').rename('window_start'),
+                  df['turbine_id'].astype('int64')]
+
+    return calculate_grouped_accumulators(df, group_keys)
+
+
+def calculate_power_curve_accumulators(df, bin_width):
+    # Partial stats of the power output per turbine & wind speed bin, the points of the power curves
+    wind_speed_bins = np.floor(df['wind_speed'].astype('float64') / bin_width).astype('int64')
+    group_keys = [df['turbine_id'].astype('int64'), wind_speed_bins.rename('wind_speed_bin')]
+
+    return calculate_grouped_accumulators(df, group_keys)
+
+
+def calculate_grouped_accumulators(df, group_keys):
+    # power_m2 is the sum of squared deviations from the mean (Welford M2), unlike a sum of squares it can be merged
+    # without losing precision
+    power_output = df['power_output'].astype('float64')
+
+    grouped = power_output.groupby(group_keys, sort=True)
+    accumulators = grouped.agg(['count', 'sum', 'min', 'max'])
+
+    return pd.DataFrame({
+        'reading_count': accumulators['count'],
+        'power_sum': accumulators['sum'],
+        'power_m2': grouped.var(ddof=0) * accumulators['count'],
+        'min_power': accumulators['min'],
+        'max_power': accumulators['max'],
+    }).reset_index()
+
+
+def merge_accumulators(accumulators_df, group_columns):
+    # Merges the accumulators of each group, eg the daily accumulators of a week into weekly ones. The M2 of the
+    # merged group is the sum of the M2 of its parts plus the spread of their means around the merged mean
+    # (Chan et al.)
+    grouped = accumulators_df.groupby(group_columns, sort=True)
+    group_codes = grouped.ngroup().to_numpy()
+
+    merged = grouped.agg(reading_count=('reading_count', 'sum'), power_sum=('power_sum', 'sum'),
+                         power_m2=('power_m2', 'sum'), min_power=('min_power', 'min'),
+                         max_power=('max_power', 'max'))
+
+    merged_mean = (merged['power_sum'] / merged['reading_count']).to_numpy()
+    part_mean = (accumulators_df['power_sum'] / accumulators_df['reading_count']).to_numpy()
+    spread = accumulators_df['reading_count'].to_numpy() * (part_mean - merged_mean[group_codes]) ** 2
+    merged['power_m2'] += np.bincount(group_codes, weights=spread, minlength=len(merged))
+
+    return merged.reset_index()
+
+
+def calculate_stats_from_accumulators(accumulators_df, group_columns):
+    merged = merge_accumulators(accumulators_df, group_columns)
+
+    average = merged['power_sum'] / merged['reading_count']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        std_deviation = np.sqrt(merged['power_m2'] / (merged['reading_count'] - 1))
+
+        # The reading furthest from the mean is either the min or the max, so a group has a reading with a z-score
+        # above 2 exactly when its min or max has one. This replaces the second pass over the readings
+        has_anomaly_reading = (((merged['max_power'] - average) / std_deviation > 2) |
+                               ((average - merged['min_power']) / std_deviation > 2))
+
+    final_stats = merged[group_columns].copy()
+    final_stats['min_power'] = merged['min_power']
+    final_stats['max_power'] = merged['max_power']
+    final_stats['average'] = average
+    final_stats['std_deviation'] = std_deviation
+    final_stats['has_anomaly_reading'] = has_anomaly_reading
+
+    final_stats = final_stats.round(2)
+
+    return final_stats
@@ -0,0 +1,164 @@
+import numpy as np
+import pandas as pd
+
+ANOMALY_ENGINES = ['zscore', 'rolling', 'mad', 'power_curve']
+DEFAULT_ANOMALY_ENGINE = 'zscore'
+
+# A reading is an anomaly when the absolute value of its score is above the threshold of its engine. 3.5 is the usual
+# threshold of the robust (modified) z-score of Iglewicz & Hoaglin
+ANOMALY_THRESHOLDS = {
+    'zscore': 2.0,
+    'rolling': 2.0,
+    'mad': 3.5,
+    'power_curve': 3.5,
+}
+
+# Scale the median absolute deviation & the mean absolute deviation to the std of normally distributed values
+MAD_SCALE = 1.4826
+MEAN_ABSOLUTE_DEVIATION_SCALE = 1.2533
+
+# Readings needed before a reading in the rolling window for its score, fewer give no usable std
+MIN_ROLLING_READINGS = 3
+
+# The turbine & wind speed bin of a power curve point are combined into one sortable key, the bins of the valid wind
+# speeds are far below the base
+POWER_CURVE_KEY_BASE = 1 << 20
+
+
+class PowerCurve:
+    # Expected power of every turbine & wind speed bin from the power_curve table maintained by the ETL. The points are
+    # kept sorted by key so the expected power of all the readings of a window is looked up with one searchsorted
+    def __init__(self, power_curve_df, bin_width):
+        self.bin_width = bin_width
+        keys = power_curve_keys(power_curve_df['turbine_id'].to_numpy(dtype='int64'),
+                                power_curve_df['wind_speed_bin'].to_numpy(dtype='int64'))
+        order = np.argsort(keys)
+        self.keys = keys[order]
+        self.expected_power = (power_curve_df['power_sum'].to_numpy(dtype='float64') /
+                               power_curve_df['reading_count'].to_numpy(dtype='float64'))[order]
+
+    def lookup(self, turbine_ids, wind_speed):
+        # NaN for the readings without a point on the curve
+        reading_keys = power_curve_keys(turbine_ids, wind_speed_bins(wind_speed, self.bin_width))
+        if not len(self.keys):
+            return np.full(len(reading_keys), np.nan)
+
+        positions = np.minimum(np.searchsorted(self.keys, reading_keys), len(self.keys) - 1)
+        return np.where(self.keys[positions] == reading_keys, self.expected_power[positions], np.nan)
+
+
+def power_curve_keys(turbine_ids, bins):
+    return turbine_ids.astype('int64') * POWER_CURVE_KEY_BASE + bins
+
+
+def wind_speed_bins(wind_speed, bin_width):
+    return np.floor(np.asarray(wind_speed, dtype='float64') / bin_width).astype('int64')
+
+
+def parse_anomaly_engines(anomaly_engines):
+    # The engines of the stats versions as configured, eg '1:zscore, 2:mad'
+    engines_by_version = {}
+    for version_engine in anomaly_engines.split(','):
+        if not version_engine.strip():
+            continue
+        stats_version, anomaly_engine = (value.strip() for value in version_engine.split(':'))
+        if anomaly_engine not in ANOMALY_ENGINES:
+            raise ValueError(f"Unknown anomaly engine '{anomaly_engine}' for stats version {stats_version}, expected "
+                             f"one of: {', '.join(ANOMALY_ENGINES)}")
+        engines_by_version[stats_version] = anomaly_engine
+    return engines_by_version
+
+
+def score_readings(anomaly_engine, df, group_codes, group_stats, rolling_window_readings=24,
+                   power_curve_bin_width=1.0, power_curve=None):
+    # Scores every reading of df against the readings of its group. group_codes is the group code of every reading &
+    # group_stats the mean & std of every group in group code order. All the groups are scored at once, a NaN score is
+    # never an anomaly. The power_curve engine looks the expected power up in power_curve when given
+    power_output = df['power_output'].to_numpy(dtype='float64')
+
+    if anomaly_engine == 'zscore':
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return (power_output - group_stats['mean'].to_numpy()[group_codes]) / group_stats['std'].to_numpy()[
+                group_codes]
+    if anomaly_engine == 'rolling':
+        timestamps = pd.to_datetime(df['timestamp']).to_numpy().view('int64')
+        return rolling_scores(power_output, group_codes, timestamps, rolling_window_readings)
+    if anomaly_engine == 'mad':
+        return robust_scores(power_output, group_codes)
+    if anomaly_engine == 'power_curve':
+        wind_speed = df['wind_speed'].to_numpy(dtype='float64')
+        expected_power = None
+        if power_curve is not None:
+            expected_power = power_curve.lookup(df['turbine_id'].to_numpy(dtype='int64'), wind_speed)
+        return power_curve_scores(power_output, wind_speed, group_codes, power_curve_bin_width, expected_power)
+
+    raise ValueError(f"Unknown anomaly engine '{anomaly_engine}', expected one of: {', '.join(ANOMALY_ENGINES)}")
+
+
+def is_anomaly(anomaly_engine, scores):
+    with np.errstate(invalid='ignore'):
+        return np.abs(scores) > ANOMALY_THRESHOLDS[anomaly_engine]
+
+
+def rolling_scores(values, group_codes, timestamps, window_readings):
+    # z-score of every reading against the window_readings readings before it in its group, in time order. The sums of
+    # the trailing windows of all the groups are differences of one cumulative sum, the windows are cut at the start of
+    # their group
+    order = np.lexsort((timestamps, group_codes))
+    sorted_codes = group_codes[order]
+
+    # Centered on the group means so the cumulative sums stay small
+    group_means = np.bincount(group_codes, weights=values) / np.bincount(group_codes)
+    sorted_values = values[order] - group_means[sorted_codes]
+
+    positions = np.arange(len(values))
+    group_starts = np.searchsorted(sorted_codes, sorted_codes, side='left')
+    window_starts = np.maximum(group_starts, positions - window_readings)
+    counts = positions - window_starts
+
+    cumulative_sums = np.concatenate([[0.0], np.cumsum(sorted_values)])
+    cumulative_squares = np.concatenate([[0.0], np.cumsum(sorted_values ** 2)])
+    sums = cumulative_sums[positions] - cumulative_sums[window_starts]
+    squares = cumulative_squares[positions] - cumulative_squares[window_starts]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = sums / counts
+        stds = np.sqrt(np.maximum(squares - sums * means, 0) / (counts - 1))
+        sorted_scores = (sorted_values - means) / stds
+    sorted_scores[counts < MIN_ROLLING_READINGS] = np.nan
+
+    scores = np.empty(len(values))
+    scores[order] = sorted_scores
+    return scores
+
+
+def robust_scores(values, group_codes):
+    # Distance of every reading from the median of its group in median absolute deviations. A group with more than
+    # half of its readings equal has a MAD of 0 & is scaled by its mean absolute deviation instead
+    group_medians = pd.Series(values).groupby(group_codes).median().to_numpy()
+    deviations = values - group_medians[group_codes]
+    absolute_deviations = np.abs(deviations)
+
+    mads = pd.Series(absolute_deviations).groupby(group_codes).median().to_numpy() * MAD_SCALE
+    mean_absolute_deviations = (np.bincount(group_codes, weights=absolute_deviations) / np.bincount(group_codes) *
+                                MEAN_ABSOLUTE_DEVIATION_SCALE)
+    scales = np.where(mads > 0, mads, mean_absolute_deviations)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return deviations / scales[group_codes]
+
+
+def power_curve_scores(power_output, wind_speed, group_codes, bin_width, expected_power=None):
+    # The residuals of the readings from the expected power of their turbine at their wind speed are scored like the
+    # readings of the mad engine, so a turbine producing far less or more than at the same wind speed is an anomaly
+    # while a turbine following the wind is not. Without an expected power, ie from the power curve, it is derived
+    # from the window as the median power of the readings of the group in the same wind speed bin
+    missing_expected_power = np.ones(len(power_output), dtype=bool) if expected_power is None \
+        else np.isnan(expected_power)
+    if missing_expected_power.any():
+        window_expected_power = pd.Series(power_output).groupby(
+            [group_codes, wind_speed_bins(wind_speed, bin_width)]).transform('median').to_numpy()
+        expected_power = window_expected_power if expected_power is None \
+            else np.where(missing_expected_power, window_expected_power, expected_power)
+
+    return robust_scores(power_output - expected_power, group_codes)
@@ -0,0 +1,187 @@
+import numpy as np
+import pandas as pd
+
+from src.config import AppConfig
+
+# From the finest to the coarsest, every level is rolled up from the level before it
+ROLLUP_LEVELS = ['hour', 'day', 'month']
+
+# The compass points the wind directions are bucketed into, 45 degrees wide & centered on the point
+WIND_DIRECTION_BUCKETS = ['n', 'ne', 'e', 'se', 's', 'sw', 'w', 'nw']
+WIND_DIRECTION_COLUMNS = [f"wind_direction_{bucket}_count" for bucket in WIND_DIRECTION_BUCKETS]
+
+# Summed when rollups are merged, on top of the accumulator columns
+ROLLUP_SUM_COLUMNS = ['wind_speed_sum', *WIND_DIRECTION_COLUMNS]
+
+ROLLUP_GROUP_COLUMNS = ['bucket_start', 'turbine_id']
+
+# From a bucket start to the start of the next bucket of the level
+ROLLUP_OFFSETS = {'hour': pd.offsets.Hour(1), 'day': pd.offsets.Day(1), 'month': pd.offsets.MonthBegin(1)}
+
+# The NumPy datetime64 unit the timestamps are truncated to for the buckets of the level
+ROLLUP_UNITS = {'hour': 'h', 'day': 'D', 'month': 'M'}
+
+
+def rollup_bucket_starts(timestamps, rollup_level):
+    timestamps = pd.to_datetime(timestamps)
+    return pd.Series(truncate_timestamps(timestamps.to_numpy(), rollup_level), index=timestamps.index,
+                     name=timestamps.name)
+
+
+def truncate_timestamps(timestamps, rollup_level):
+    # Truncating the datetime64 values to the unit of the level is a single cast of the whole array, unlike flooring
+    # or converting to periods
+    if rollup_level not in ROLLUP_UNITS:
+        raise ValueError(f"Unknown rollup level '{rollup_level}', expected one of: {', '.join(ROLLUP_LEVELS)}")
+
+    return timestamps.astype(f"datetime64[{ROLLUP_UNITS[rollup_level]}]").astype('datetime64[ns]')
+
+
+def rollup_bucket_range(timestamps, rollup_level):
+    # The start of the first bucket & the end of the last bucket of the level with any of the timestamps
+    bucket_starts = rollup_bucket_starts(pd.Series(timestamps), rollup_level)
+    return bucket_starts.min(), bucket_starts.max() + ROLLUP_OFFSETS[rollup_level]
+
+
+def wind_direction_buckets(wind_direction):
+    return (np.floor((np.asarray(wind_direction, dtype='float64') % 360 + 22.5) / 45) % 8).astype('int64')
+
+
+class RollupValues:
+    # The arrays of the readings of a chunk the rollups of every level are grouped from. The wind directions are one
+    # hot encoded per compass point, so they are counted by the same sum as the wind speeds
+    def __init__(self, df):
+        self.timestamps = pd.to_datetime(df['timestamp']).to_numpy()
+        self.turbine_ids = df['turbine_id'].to_numpy(dtype='int64')
+        self.power_output = df['power_output'].to_numpy(dtype='float64')
+
+        self.sums = np.zeros((len(df), len(ROLLUP_SUM_COLUMNS)))
+        self.sums[:, 0] = df['wind_speed'].to_numpy(dtype='float64')
+        self.sums[np.arange(len(df)), 1 + wind_direction_buckets(df['wind_direction'])] = 1
+
+
+def group_rollups(values, rollup_level):
+    # The partial stats of the power output per bucket & turbine of the level with the sums of the other values. The
+    # readings are sorted by bucket & turbine once, every stat is then a single reduction over the runs of readings of
+    # the same group. power_m2 is the M2 of the accumulators, from the deviations to the mean of the group
+    bucket_starts = truncate_timestamps(values.timestamps, rollup_level)
+    order = np.lexsort((values.turbine_ids, bucket_starts))
+    bucket_starts, turbine_ids = bucket_starts[order], values.turbine_ids[order]
+    power_output = values.power_output[order]
+
+    is_group_start = np.ones(len(order), dtype=bool)
+    is_group_start[1:] = (bucket_starts[1:] != bucket_starts[:-1]) | (turbine_ids[1:] != turbine_ids[:-1])
+    group_starts = np.flatnonzero(is_group_start)
+    reading_counts = np.diff(np.append(group_starts, len(order)))
+
+    power_sum = np.add.reduceat(power_output, group_starts)
+    group_means = np.repeat(power_sum / reading_counts, reading_counts)
+    rollups_df = pd.DataFrame({
+        'bucket_start': bucket_starts[group_starts],
+        'turbine_id': turbine_ids[group_starts],
+        'reading_count': reading_counts,
+        'power_sum': power_sum,
+        'power_m2': np.add.reduceat((power_output - group_means) ** 2, group_starts),
+        'min_power': np.minimum.reduceat(power_output, group_starts),
+        'max_power': np.maximum.reduceat(power_output, group_starts),
+    })
+
+    sums = np.add.reduceat(values.sums[order], group_starts)
+    for index, column in enumerate(ROLLUP_SUM_COLUMNS):
+        rollups_df[column] = sums[:, index] if column == 'wind_speed_sum' else sums[:, index].astype('int64')
+    return rollups_df
+
+
+def calculate_rollups(df, rollup_level):
+    # The rollups of a level calculated from the readings
+    if df.empty:
+        return pd.DataFrame(columns=[*ROLLUP_GROUP_COLUMNS, 'reading_count', 'power_sum', 'power_m2', 'min_power',
+                                     'max_power', *ROLLUP_SUM_COLUMNS])
+    return group_rollups(RollupValues(df), rollup_level)
+
+
+def calculate_hourly_rollups(df):
+    return calculate_rollups(df, 'hour')
+
+
+def roll_up(rollups_df, rollup_level):
+    # The rollups of a coarser level merged from the rollups of a finer one, eg the days from the hours
+    bucket_starts = rollup_bucket_starts(rollups_df['bucket_start'], rollup_level)
+    return merge_rollups(rollups_df.assign(bucket_start=bucket_starts))
+
+
+def merge_rollups(rollups_df, group_columns=None):
+    # Same as merge_accumulators with the sums of the rollups, with one groupby for all the columns. The M2 of a
+    # merged group is the sum of the M2 of its parts plus the spread of their means around the merged mean
+    group_columns = group_columns or ROLLUP_GROUP_COLUMNS
+    grouped = rollups_df.groupby(group_columns, sort=True)
+    group_codes = grouped.ngroup().to_numpy()
+
+    merged = grouped[['reading_count', 'power_sum', 'power_m2']].sum()
+    merged['min_power'] = grouped['min_power'].min()
+    merged['max_power'] = grouped['max_power'].max()
+    merged[ROLLUP_SUM_COLUMNS] = grouped[ROLLUP_SUM_COLUMNS].sum()
+
+    merged_mean = (merged['power_sum'] / merged['reading_count']).to_numpy()
+    part_mean = (rollups_df['power_sum'] / rollups_df['reading_count']).to_numpy()
+    spread = rollups_df['reading_count'].to_numpy() * (part_mean - merged_mean[group_codes]) ** 2
+    merged['power_m2'] += np.bincount(group_codes, weights=spread, minlength=len(merged))
+
+    return merged.reset_index()
+
+
+def calculate_all_rollups(df):
+    # The rollups of every level of the readings of a chunk. Every level is grouped straight from the readings by its
+    # bucket keys, the arrays of the readings are only prepared once
+    if df.empty:
+        return {rollup_level: calculate_rollups(df, rollup_level) for rollup_level in ROLLUP_LEVELS}
+
+    values = RollupValues(df)
+    return {rollup_level: group_rollups(values, rollup_level) for rollup_level in ROLLUP_LEVELS}
+
+
+def coarsest_rollup_level(from_date, to_date):
+    # The coarsest level with buckets that exactly cover the range from_date to to_date
+    for rollup_level in reversed(ROLLUP_LEVELS):
+        bucket_starts = rollup_bucket_starts(pd.Series([from_date, to_date]), rollup_level)
+        if (bucket_starts == pd.to_datetime(pd.Series([from_date, to_date]))).all():
+            return rollup_level
+
+    raise ValueError(f"The rollups cover whole hours, got the range {from_date} to {to_date}")
+
+
+def calculate_rollup_stats(rollups_df, group_columns=None):
+    # Finalizes the rollups merged per group, eg per bucket & turbine for a dashboard series or per turbine for the
+    # totals of the range
+    merged = merge_rollups(rollups_df, group_columns)
+
+    rollup_stats = merged[group_columns or ROLLUP_GROUP_COLUMNS].copy()
+    rollup_stats['reading_count'] = merged['reading_count']
+    rollup_stats['min_power'] = merged['min_power']
+    rollup_stats['max_power'] = merged['max_power']
+    rollup_stats['average'] = merged['power_sum'] / merged['reading_count']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rollup_stats['std_deviation'] = np.sqrt(merged['power_m2'] / (merged['reading_count'] - 1))
+    rollup_stats['mean_wind_speed'] = merged['wind_speed_sum'] / merged['reading_count']
+    rollup_stats['dominant_wind_direction'] = np.asarray(WIND_DIRECTION_BUCKETS)[
+        merged[WIND_DIRECTION_COLUMNS].to_numpy().argmax(axis=1)] if len(merged) else []
+
+    return rollup_stats.round(2)
+
+
+def query_rollups(db_manager, pipeline_version, from_date, to_date, turbine_ids=None, rollup_level=None,
+                  group_columns=None):
+    # The stats of the readings from from_date to to_date from the rollups of the coarsest level covering the range,
+    # unless a finer rollup_level is asked for, eg hours for a daily dashboard
+    if not AppConfig.READING_ROLLUPS:
+        raise ValueError("The rollups are not maintained by the ETL, set reading_rollups = true in config.ini & rebuild "
+                         "them with scripts/rebuild_accumulators.py")
+    coarsest_level = coarsest_rollup_level(from_date, to_date)
+    rollup_level = rollup_level or coarsest_level
+    if ROLLUP_LEVELS.index(rollup_level) > ROLLUP_LEVELS.index(coarsest_level):
+        raise ValueError(f"The {rollup_level} rollups do not cover the range {from_date} to {to_date}, the coarsest "
+                         f"level covering it is {coarsest_level}")
+
+    rollups_df = db_manager.fetch_reading_rollups(pipeline_version, rollup_level, from_date, to_date, turbine_ids)
+
+    return calculate_rollup_stats(rollups_df, group_columns)
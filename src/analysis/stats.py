@@ -1,96 +1,412 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import timedelta
 
+import numpy as np
 import pandas as pd
+from src.analysis.accumulators import ACCUMULATOR_COLUMNS, calculate_grouped_accumulators, \
+    calculate_stats_from_accumulators, merge_accumulators
+from src.analysis.anomalies import DEFAULT_ANOMALY_ENGINE, PowerCurve, is_anomaly, parse_anomaly_engines, \
+    score_readings
 from src.config import AppConfig
+from src.database.columnar_store import ColumnarStore
 from src.database.persistence import DatabaseManager
+from src.util.instrumentation import instrumented, timed_stage
+
+# Estimate of the memory a streamed reading takes while its chunk is read, the row tuple & python objects of the
+# turbine & power output plus their column values in the DataFrame of the chunk
+STREAMED_BYTES_PER_READING = 160
 
 
 def trigger_summary_stats_creation():
+    # The accumulators are kept per day so they can only be merged into windows of whole days
+    if AppConfig.USE_ACCUMULATORS and not AppConfig.DURATION_IN_DAYS.is_integer():
+        raise ValueError(f"Stats from accumulators need a duration of whole days, got {AppConfig.DURATION_IN_DAYS}")
+    if AppConfig.STREAMING_MEMORY_BUDGET_MB > 0 and AppConfig.BACKFILL_SLICE_DAYS > 0:
+        raise ValueError("Streaming stats are created one window at a time, set backfill_slice_days to 0")
+    if current_anomaly_engine() != DEFAULT_ANOMALY_ENGINE and (AppConfig.USE_ACCUMULATORS or
+                                                               AppConfig.STREAMING_MEMORY_BUDGET_MB > 0):
+        raise ValueError(f"The {current_anomaly_engine()} anomaly engine scores the readings, set use_accumulators to "
+                         f"false & streaming_memory_budget_mb to 0")
+    if AppConfig.STATS_WORKERS > 1 and (AppConfig.USE_ACCUMULATORS or AppConfig.STREAMING_MEMORY_BUDGET_MB > 0 or
+                                        AppConfig.BACKFILL_SLICE_DAYS > 0):
+        raise ValueError("Parallel stats are computed from the readings, set use_accumulators to false, "
+                         "streaming_memory_budget_mb & backfill_slice_days to 0")
+
+    if AppConfig.STATS_WORKERS > 1:
+        trigger_parallel_summary_stats(AppConfig.STATS_WORKERS, AppConfig.STATS_TURBINE_SHARDS)
+        return
+
+    if AppConfig.BACKFILL_SLICE_DAYS > 0:
+        trigger_summary_stats_backfill(AppConfig.BACKFILL_SLICE_DAYS)
+        return
+
     db_manager = DatabaseManager(AppConfig.DATABASE_URI)
 
-    # Find the min and max value of timestamp in the cleaned readings
+    windows_start = pending_windows_start(db_manager, AppConfig.PIPELINE_VERSION, AppConfig.STATS_VERSION)
+    if not windows_start:
+        return
+    from_date, cleaned_readings_max_time = windows_start
+
+    # We only want to run the stats if data is available for the new window
+    while from_date <= cleaned_readings_max_time:
+        to_date = from_date + timedelta(days=AppConfig.DURATION_IN_DAYS)
+        create_window_stats(db_manager, from_date, to_date)
+        from_date = to_date
+
+
+def pending_windows_start(db_manager, pipeline_version, stats_version):
+    # The start of the first window without stats & the timestamp of the latest cleaned reading, None when there are no
+    # cleaned readings. The windows are counted from the day of the first reading & resume after the latest window of
+    # the pipeline version & stats version in statistics_control
     cleaned_readings_min_time, cleaned_readings_max_time = db_manager.fetch_min_max_cleaned_readings_timestamp(
-        AppConfig.PIPELINE_VERSION)
+        pipeline_version)
 
     print(f"Min timestamp : {cleaned_readings_min_time} \nMax timestamp : {cleaned_readings_max_time}")
 
     if not cleaned_readings_min_time:
-        print(f"Not running stats as no cleaned readings available for Pipeline version : {AppConfig.PIPELINE_VERSION}")
-        return
+        print(f"Not running stats as no cleaned readings available for Pipeline version : {pipeline_version}")
+        return None
 
-    initial_date = cleaned_readings_min_time.replace(hour=0, minute=0, second=0, microsecond=0)
+    stats_control = db_manager.fetch_latest_statistics_control(pipeline_version, stats_version)
 
-    while True:
-        # For the current pipeline version & stats version get the latest entry in the table
-        stats_control = db_manager.fetch_latest_statistics_control(AppConfig.PIPELINE_VERSION, AppConfig.STATS_VERSION)
+    from_date = cleaned_readings_min_time.replace(hour=0, minute=0, second=0, microsecond=0)
+    if stats_control:
+        from_date = stats_control.to_date
 
-        new_from_date = initial_date
-        if stats_control:
-            new_from_date = stats_control.to_date
+    return from_date, cleaned_readings_max_time
 
-        # We only want to run the stats if data is available for the new window
-        if new_from_date > cleaned_readings_max_time:
-            break
 
-        new_to_date = new_from_date + timedelta(days=AppConfig.DURATION_IN_DAYS)
+def current_anomaly_engine():
+    # The anomaly engine is picked by the stats version, a new engine is rolled out by bumping the stats version
+    return parse_anomaly_engines(AppConfig.ANOMALY_ENGINES).get(str(AppConfig.STATS_VERSION), DEFAULT_ANOMALY_ENGINE)
 
+
+def fetch_power_curve(db_manager, anomaly_engine):
+    # Only the power_curve engine scores the readings against the power curves maintained by the ETL. Without the
+    # curves, eg on a database without ON CONFLICT, the expected power is derived from the readings of the window
+    if anomaly_engine != 'power_curve':
+        return None
+
+    with timed_stage('fetch') as stage:
+        power_curve_df = db_manager.fetch_power_curves(AppConfig.PIPELINE_VERSION)
+        stage.rows_out = len(power_curve_df)
+    return PowerCurve(power_curve_df, AppConfig.POWER_CURVE_BIN_WIDTH)
+
+
+def create_window_stats(db_manager, from_date, to_date):
+    anomalies_df = None
+    if AppConfig.USE_ACCUMULATORS:
+        # The stats are finalized from the accumulators of the days in the window without reading the readings
+        with timed_stage('fetch') as stage:
+            accumulators_df = db_manager.fetch_statistics_accumulators(AppConfig.PIPELINE_VERSION, from_date, to_date)
+            stage.rows_out = len(accumulators_df)
+        with timed_stage('compute', len(accumulators_df)) as stage:
+            stats_df = calculate_stats_from_accumulators(accumulators_df, ['turbine_id'])
+            stage.rows_out = len(stats_df)
+    elif AppConfig.STREAMING_MEMORY_BUDGET_MB > 0:
+        # The readings of the window are never all in memory, only a chunk & the accumulators of the turbines
+        stats_df = calculate_streaming_stats(stream_cleaned_readings(db_manager, from_date, to_date,
+                                                                     AppConfig.STREAMING_MEMORY_BUDGET_MB))
+    else:
         # Fetch a dataframe of rows to do the stats
-        df = db_manager.fetch_cleaned_readings(AppConfig.PIPELINE_VERSION, new_from_date, new_to_date)
+        df = fetch_cleaned_readings(db_manager, from_date, to_date)
+
+        anomaly_engine = current_anomaly_engine()
+        stats_df, anomalies_df = calculate_stats_with_anomalies(df, anomaly_engine,
+                                                                fetch_power_curve(db_manager, anomaly_engine))
+
+    # store the stats along with an entry into the statistic_control table for this period. The stats from
+    # accumulators & streamed readings have no readings to store as anomalies
+    with timed_stage('store', len(stats_df)):
+        db_manager.store_stats(AppConfig.PIPELINE_VERSION, AppConfig.STATS_VERSION, from_date, to_date, stats_df,
+                               anomalies_df)
+
+    print(
+        f"Created stats for duration from {from_date} to {to_date} "
+        f"for Pipeline version {AppConfig.PIPELINE_VERSION} and Stats version {AppConfig.STATS_VERSION}")
+
+
+def refresh_summary_stats(changed_from_time, changed_to_time):
+    # Used by the watch mode after new readings were loaded. The stats of the windows already created that got new
+    # readings between changed_from_time & changed_to_time are created again, then the stats of the new windows
+    db_manager = DatabaseManager(AppConfig.DATABASE_URI)
+
+    stats_control = db_manager.fetch_latest_statistics_control(AppConfig.PIPELINE_VERSION, AppConfig.STATS_VERSION)
+    if stats_control:
+        cleaned_readings_min_time, _ = db_manager.fetch_min_max_cleaned_readings_timestamp(AppConfig.PIPELINE_VERSION)
+
+        # The windows are counted from the day of the first reading, same as when they were created
+        initial_date = cleaned_readings_min_time.replace(hour=0, minute=0, second=0, microsecond=0)
+        window_duration = timedelta(days=AppConfig.DURATION_IN_DAYS)
+        changed_from_time = pd.Timestamp(changed_from_time).to_pydatetime()
+        changed_to_time = pd.Timestamp(changed_to_time).to_pydatetime()
+
+        from_date = initial_date + ((changed_from_time - initial_date) // window_duration) * window_duration
+        while from_date < stats_control.to_date and from_date <= changed_to_time:
+            create_window_stats(db_manager, from_date, from_date + window_duration)
+            from_date += window_duration
+
+    trigger_summary_stats_creation()
+
+
+def trigger_parallel_summary_stats(workers, turbine_shards):
+    # Every window is split into turbine shards & the (window, shard) work units are computed in a pool of worker
+    # processes, each fetching its readings on its own connection. The shards of a window are merged & the windows are
+    # stored in order by this process, so statistics_control only ever moves forward & an interrupted run resumes after
+    # the last window stored
+    db_manager = DatabaseManager(AppConfig.DATABASE_URI)
+
+    windows_start = pending_windows_start(db_manager, AppConfig.PIPELINE_VERSION, AppConfig.STATS_VERSION)
+    if not windows_start:
+        return
+    from_date, cleaned_readings_max_time = windows_start
+
+    window_duration = timedelta(days=AppConfig.DURATION_IN_DAYS)
+    pending = deque()
+
+    def store_next_window():
+        window_from_date, window_to_date, futures = pending.popleft()
+        shard_results = [future.result() for future in futures]
+        stats_df = pd.concat([shard_stats_df for shard_stats_df, _ in shard_results], ignore_index=True)
+        stats_df = stats_df.sort_values('turbine_id', ignore_index=True)
+        anomalies_df = pd.concat([shard_anomalies_df for _, shard_anomalies_df in shard_results], ignore_index=True)
+
+        with timed_stage('store', len(stats_df)):
+            db_manager.store_stats(AppConfig.PIPELINE_VERSION, AppConfig.STATS_VERSION, window_from_date,
+                                   window_to_date, stats_df, anomalies_df)
+
+        print(
+            f"Created stats for duration from {window_from_date} to {window_to_date} "
+            f"for Pipeline version {AppConfig.PIPELINE_VERSION} and Stats version {AppConfig.STATS_VERSION}")
+
+    print(f"Running parallel stats with {workers} workers and {turbine_shards} turbine shards")
+    with ProcessPoolExecutor(max_workers=workers, initializer=initialize_stats_worker) as executor:
+        # Same as the window by window run, there are no windows after the latest reading
+        while from_date <= cleaned_readings_max_time:
+            to_date = from_date + window_duration
+            futures = [executor.submit(calculate_window_shard_stats, from_date, to_date, turbine_shard, turbine_shards)
+                       for turbine_shard in range(turbine_shards)]
+            pending.append((from_date, to_date, futures))
+
+            # Bound the windows in flight so the stats waiting to be stored do not fill up the memory
+            if len(pending) >= workers * 2:
+                store_next_window()
+
+            from_date = to_date
+
+        while pending:
+            store_next_window()
+
+
+def initialize_stats_worker():
+    # A forked worker inherits the engine of this process, the pooled connections must not be shared between processes
+    # so the worker starts with an empty pool
+    DatabaseManager(AppConfig.DATABASE_URI).engine.dispose(close=False)
 
-        stats_df = calculate_stats(df)
 
-        # store the stats along with an entry into the statistic_control table for this period
-        db_manager.store_stats(AppConfig.PIPELINE_VERSION, AppConfig.STATS_VERSION, new_from_date, new_to_date,
-                               stats_df)
+def calculate_window_shard_stats(from_date, to_date, turbine_shard, turbine_shards):
+    # Runs in a worker process
+    db_manager = DatabaseManager(AppConfig.DATABASE_URI)
+    df = fetch_cleaned_readings(db_manager, from_date, to_date, turbine_shard, turbine_shards)
+
+    anomaly_engine = current_anomaly_engine()
+    return calculate_stats_with_anomalies(df, anomaly_engine, fetch_power_curve(db_manager, anomaly_engine))
+
+
+def trigger_summary_stats_backfill(backfill_slice_days):
+    db_manager = DatabaseManager(AppConfig.DATABASE_URI)
+
+    windows_start = pending_windows_start(db_manager, AppConfig.PIPELINE_VERSION, AppConfig.STATS_VERSION)
+    if not windows_start:
+        return
+    from_date, cleaned_readings_max_time = windows_start
+
+    window_duration = timedelta(days=AppConfig.DURATION_IN_DAYS)
+    windows_per_slice = max(1, int(backfill_slice_days // AppConfig.DURATION_IN_DAYS))
+
+    # Instead of a round-trip per window the readings of a slice of windows are fetched with one query, bucketed into
+    # their windows in memory & the stats of all the windows in the slice are stored in one transaction
+    while from_date <= cleaned_readings_max_time:
+        windows = []
+        for window_index in range(windows_per_slice):
+            window_from_date = from_date + window_index * window_duration
+            # Same as the window by window run, there are no windows after the latest reading
+            if window_from_date > cleaned_readings_max_time:
+                break
+            windows.append((window_from_date, window_from_date + window_duration))
+
+        slice_to_date = windows[-1][1]
+        anomalies_df = None
+        if AppConfig.USE_ACCUMULATORS:
+            with timed_stage('fetch') as stage:
+                accumulators_df = db_manager.fetch_statistics_accumulators(AppConfig.PIPELINE_VERSION, from_date,
+                                                                           slice_to_date)
+                stage.rows_out = len(accumulators_df)
+            with timed_stage('compute', len(accumulators_df)) as stage:
+                stats_df = calculate_window_stats_from_accumulators(accumulators_df, from_date, window_duration)
+                stage.rows_out = len(stats_df)
+        else:
+            df = fetch_cleaned_readings(db_manager, from_date, slice_to_date)
+
+            anomaly_engine = current_anomaly_engine()
+            stats_df, anomalies_df = calculate_window_stats_with_anomalies(df, from_date, window_duration,
+                                                                           anomaly_engine,
+                                                                           fetch_power_curve(db_manager, anomaly_engine))
+
+        with timed_stage('store', len(stats_df)):
+            db_manager.store_window_stats(AppConfig.PIPELINE_VERSION, AppConfig.STATS_VERSION, windows, stats_df,
+                                          anomalies_df)
 
         print(
-            f"Created stats for duration from {new_from_date} to {new_to_date} "
+            f"Created stats for {len(windows)} windows from {from_date} to {slice_to_date} "
             f"for Pipeline version {AppConfig.PIPELINE_VERSION} and Stats version {AppConfig.STATS_VERSION}")
 
+        from_date = slice_to_date
+
+
+@instrumented('fetch', rows_out=len)
+def fetch_cleaned_readings(db_manager, from_date, to_date, turbine_shard=None, turbine_shards=1):
+    # With a turbine_shard only the readings of the turbines with turbine_id % turbine_shards == turbine_shard
+    if AppConfig.READINGS_SOURCE == 'columnar':
+        if not AppConfig.COLUMNAR_STORE_DIRECTORY:
+            raise ValueError("readings_source is columnar but no columnar_store_directory_name is configured")
+
+        # Only the date partitions of the window & the columns needed for the stats are read
+        columnar_store = ColumnarStore(AppConfig.COLUMNAR_STORE_DIRECTORY, AppConfig.COLUMNAR_FORMAT)
+        df = columnar_store.fetch_cleaned_readings(AppConfig.PIPELINE_VERSION, from_date, to_date,
+                                                   columns=['turbine_id', 'timestamp', 'wind_speed', 'power_output'])
+        if turbine_shard is not None:
+            df = df[df['turbine_id'] % turbine_shards == turbine_shard]
+        return df
+
+    return db_manager.fetch_cleaned_readings(AppConfig.PIPELINE_VERSION, from_date, to_date, turbine_shard,
+                                             turbine_shards)
+
+
+def streaming_chunk_size(memory_budget_mb):
+    return max(1, int(memory_budget_mb * 1e6 // STREAMED_BYTES_PER_READING))
+
+
+def stream_cleaned_readings(db_manager, from_date, to_date, memory_budget_mb):
+    # Yields the turbine & power output of the readings of the window chunk by chunk. The chunks read from the
+    # database are sized to the memory budget, the columnar store is read a file, ie an ETL chunk, at a time
+    columns = ['turbine_id', 'power_output']
+    if AppConfig.READINGS_SOURCE == 'columnar':
+        if not AppConfig.COLUMNAR_STORE_DIRECTORY:
+            raise ValueError("readings_source is columnar but no columnar_store_directory_name is configured")
+
+        columnar_store = ColumnarStore(AppConfig.COLUMNAR_STORE_DIRECTORY, AppConfig.COLUMNAR_FORMAT)
+        yield from columnar_store.iter_cleaned_readings(AppConfig.PIPELINE_VERSION, from_date, to_date, columns)
+        return
 
-def calculate_stats(df):
-    df = df.astype({
-        "timestamp": "datetime64[ns]",
-        "turbine_id": "int64",
-        "wind_speed": "float64",
-        "wind_direction": "int64",
-        "power_output": "float64",
+    yield from db_manager.iter_cleaned_power_outputs(AppConfig.PIPELINE_VERSION, from_date, to_date,
+                                                     streaming_chunk_size(memory_budget_mb))
+
+
+def calculate_streaming_stats(readings_chunks):
+    # The stats of a window in one pass over its readings. The accumulators of every chunk are merged into the
+    # accumulators per turbine, which is all that is kept between chunks. Like the stats from the daily accumulators
+    # the anomalies are found from the min & max against the final mean & std, so the readings are not read a second
+    # time. The stage includes the reads of the chunks as they are interleaved with the computation
+    with timed_stage('compute', 0) as stage:
+        turbine_accumulators_df = pd.DataFrame(columns=['turbine_id', *ACCUMULATOR_COLUMNS])
+        for chunk_df in readings_chunks:
+            stage.rows_in += len(chunk_df)
+            if chunk_df.empty:
+                continue
+
+            chunk_accumulators_df = calculate_grouped_accumulators(chunk_df,
+                                                                   [chunk_df['turbine_id'].astype('int64')])
+            if turbine_accumulators_df.empty:
+                turbine_accumulators_df = chunk_accumulators_df
+            else:
+                turbine_accumulators_df = merge_accumulators(
+                    pd.concat([turbine_accumulators_df, chunk_accumulators_df], ignore_index=True), ['turbine_id'])
+
+        stats_df = calculate_stats_from_accumulators(turbine_accumulators_df, ['turbine_id'])
+        stage.rows_out = len(stats_df)
+
+    return stats_df
+
+
+def calculate_stats(df, anomaly_engine=DEFAULT_ANOMALY_ENGINE):
+    return calculate_stats_with_anomalies(df, anomaly_engine)[0]
+
+
+@instrumented('compute', rows_in=lambda df, *args: len(df), rows_out=lambda result: len(result[0]))
+def calculate_stats_with_anomalies(df, anomaly_engine=DEFAULT_ANOMALY_ENGINE, power_curve=None):
+    return calculate_grouped_stats(df, ['turbine_id'], anomaly_engine, power_curve)
+
+
+def calculate_window_stats(df, from_date, window_duration, anomaly_engine=DEFAULT_ANOMALY_ENGINE):
+    return calculate_window_stats_with_anomalies(df, from_date, window_duration, anomaly_engine)[0]
+
+
+@instrumented('compute', rows_in=lambda df, *args: len(df), rows_out=lambda result: len(result[0]))
+def calculate_window_stats_with_anomalies(df, from_date, window_duration, anomaly_engine=DEFAULT_ANOMALY_ENGINE,
+                                          power_curve=None):
+    # Bucket every reading into the window it falls in counting from from_date, the stats are grouped by window &
+    # turbine. Only the columns needed for the stats & the anomaly engines are copied
+    timestamps = pd.to_datetime(df['timestamp'])
+    window_df = pd.DataFrame({
+        'window_index': ((timestamps - pd.Timestamp(from_date)) // window_duration).astype('int64'),
+        'turbine_id': df['turbine_id'],
+        'timestamp': timestamps,
+        'power_output': df['power_output'],
     })
+    if 'wind_speed' in df.columns:
+        window_df['wind_speed'] = df['wind_speed']
 
-    # Calculate min, max, mean & std for each turbine
-    stats = df.groupby('turbine_id').agg(
-        min_power=("power_output", "min"),
-        max_power=("power_output", "max"),
-        average=("power_output", "mean"),
-        std_deviation=("power_output", "std")
-    ).reset_index()
-
-    # Join stats with the cleaned_readings data frame
-    df = pd.merge(df, stats, on='turbine_id')
-
-    # Calculate z-scores for each power output reading
-    df['z-score'] = (df['power_output'] - df['average']) / df['std_deviation']
-    df['has_anomaly'] = abs((df['power_output'] - df['average']) / df['std_deviation']) > 2
-
-    # Reduce it back to final stats with the anomaly identification column
-    final_stats = df.groupby('turbine_id').agg(
-        min_power=("min_power", agg_first_value),
-        max_power=("max_power", agg_first_value),
-        average=("average", agg_first_value),
-        has_anomaly_reading=("has_anomaly", agg_any_true)
-    ).reset_index()
+    return calculate_grouped_stats(window_df, ['window_index', 'turbine_id'], anomaly_engine, power_curve)
 
-    final_stats = final_stats.round(2)
 
-    return final_stats
+def calculate_window_stats_from_accumulators(accumulators_df, from_date, window_duration):
+    # The daily accumulators are bucketed into their windows the same way as the readings & merged per window
+    window_accumulators_df = accumulators_df.assign(
+        window_index=((accumulators_df['window_start'] - pd.Timestamp(from_date)) // window_duration).astype('int64'))
+
+    return calculate_stats_from_accumulators(window_accumulators_df, ['window_index', 'turbine_id'])
+
 
+def calculate_grouped_stats(df, group_columns, anomaly_engine=DEFAULT_ANOMALY_ENGINE, power_curve=None):
+    # Every group is mapped to a group code once, all the statistics are then reductions over the group codes. There
+    # is no python code per group & the readings are never merged with their stats. Returns the stats & the readings
+    # flagged as anomalies by the anomaly engine
+    group_keys = df[group_columns].astype('int64')
+    power_output = df['power_output'].to_numpy(dtype='float64')
 
-def agg_first_value(series):
-    return series.iloc[0] if not series.empty else None
+    grouped = pd.Series(power_output, index=df.index).groupby([group_keys[column] for column in group_columns],
+                                                                sort=True)
+    group_codes = grouped.ngroup().to_numpy()
+
+    # min, max, mean & std are the cython groupby reductions of pandas
+    group_stats = grouped.agg(['min', 'max', 'mean', 'std'])
+
+    # Every reading is scored against the readings of its group looked up by group code. The std is NaN for a group
+    # with a single reading, the z-score then is NaN as well & the reading is not an anomaly
+    scores = score_readings(anomaly_engine, df, group_codes, group_stats, AppConfig.ROLLING_WINDOW_READINGS,
+                            AppConfig.POWER_CURVE_BIN_WIDTH, power_curve)
+    anomaly_mask = is_anomaly(anomaly_engine, scores)
+    has_anomaly = np.bincount(group_codes, weights=anomaly_mask, minlength=len(group_stats)) > 0
+
+    final_stats = group_stats.index.to_frame(index=False)
+    final_stats['min_power'] = group_stats['min'].to_numpy()
+    final_stats['max_power'] = group_stats['max'].to_numpy()
+    final_stats['average'] = group_stats['mean'].to_numpy()
+    final_stats['std_deviation'] = group_stats['std'].to_numpy()
+    final_stats['has_anomaly_reading'] = has_anomaly
+
+    final_stats = final_stats.round(2)
 
+    anomaly_columns = [column for column in [*group_columns, 'timestamp', 'power_output'] if column in df.columns]
+    anomalies_df = df.loc[anomaly_mask, anomaly_columns].astype({column: 'int64' for column in group_columns})
+    if 'timestamp' in anomalies_df.columns:
+        anomalies_df['timestamp'] = pd.to_datetime(anomalies_df['timestamp'])
+    anomalies_df['anomaly_engine'] = anomaly_engine
+    anomalies_df['score'] = scores[anomaly_mask].round(4)
 
-def agg_any_true(series):
-    return any(series)
+    return final_stats, anomalies_df.reset_index(drop=True)
 
 
 if __name__ == "__main__":
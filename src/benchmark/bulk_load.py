@@ -0,0 +1,62 @@
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+
+from src.database.bulk_writer import PandasBulkWriter, SqliteBulkWriter
+from src.database.database_schema import CleanedReadingEntity, create_tables
+
+
+def generate_cleaned_readings(rows, turbines=15, seed=42):
+    rng = np.random.default_rng(seed)
+    hours = np.arange(rows) // turbines
+
+    return pd.DataFrame({
+        'turbine_id': np.arange(rows) % turbines + 1,
+        'timestamp': pd.Timestamp('2022-03-01') + pd.to_timedelta(hours, unit='h'),
+        'wind_speed': rng.uniform(0, 25, rows).round(1),
+        'wind_direction': rng.integers(0, 360, rows),
+        'power_output': rng.uniform(0, 5, rows).round(1),
+        'load_id': 1,
+    })
+
+
+def time_bulk_writer(bulk_writer, chunks):
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'benchmark.db')}")
+        bulk_writer.prepare(engine)
+        create_tables(engine)
+
+        # One transaction per chunk, same as the ETL
+        start = time.perf_counter()
+        for chunk in chunks:
+            with engine.begin() as connection:
+                bulk_writer.write(connection, CleanedReadingEntity.__tablename__, chunk)
+        elapsed = time.perf_counter() - start
+
+        engine.dispose()
+
+    return elapsed
+
+
+def run_benchmark(rows, chunk_size):
+    df = generate_cleaned_readings(rows)
+    chunks = [df.iloc[start:start + chunk_size] for start in range(0, rows, chunk_size)]
+
+    print(f"Loading {rows} cleaned readings in chunks of {chunk_size} into SQLite")
+    for bulk_writer in [PandasBulkWriter(), SqliteBulkWriter()]:
+        elapsed = time_bulk_writer(bulk_writer, chunks)
+        print(f"{type(bulk_writer).__name__}: {elapsed:.2f}s ({rows / elapsed:.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare rows per second of the cleaned_reading bulk writers")
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    args = parser.parse_args()
+
+    run_benchmark(args.rows, args.chunk_size)
@@ -0,0 +1,92 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+CSV_TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+OUTPUT_FORMATS = ['csv', 'parquet']
+
+
+def generate_raw_readings(turbines, days, missing_rate=0.0, invalid_rate=0.0, anomaly_rate=0.0,
+                          start_date='2022-03-01', seed=42):
+    # Hourly readings of every turbine ordered by timestamp & turbine, the same layout as the input files. Every value
+    # is generated for all the readings at once, the rates are the fraction of readings with a missing value, an
+    # invalid value & an anomalous power output
+    rng = np.random.default_rng(seed)
+    hours = int(days * 24)
+    readings = hours * turbines
+
+    # Only the distinct hours are formatted, every turbine has a reading at every hour
+    hourly_timestamps = pd.date_range(start_date, periods=hours, freq='h').strftime(CSV_TIMESTAMP_FORMAT).to_numpy()
+    timestamps = np.repeat(hourly_timestamps.astype(object), turbines)
+    turbine_ids = np.tile(np.arange(1, turbines + 1), hours)
+
+    # Wind speeds follow a Weibull distribution, the power output a cubic power curve rated at 3MW from 12m/s
+    wind_speeds = np.clip(rng.weibull(2.0, readings) * 8.0, 0, 40).round(1)
+    wind_directions = rng.integers(0, 360, readings)
+    power_outputs = (np.clip((wind_speeds / 12.0) ** 3, 0, 1) * 3.0 + rng.normal(0, 0.1, readings)).clip(0).round(1)
+
+    is_anomaly = rng.random(readings) < anomaly_rate
+    power_outputs[is_anomaly] = (power_outputs[is_anomaly] + rng.uniform(10, 20, is_anomaly.sum())).round(1)
+
+    df = pd.DataFrame({
+        'timestamp': timestamps,
+        'turbine_id': pd.array(turbine_ids, dtype='Int64'),
+        'wind_speed': wind_speeds,
+        'wind_direction': pd.array(wind_directions, dtype='Int64'),
+        'power_output': power_outputs,
+    })
+
+    # Missing values are spread over the columns that are imputed by the ETL
+    missing_columns = ['wind_speed', 'wind_direction', 'power_output']
+    is_missing = rng.random(readings) < missing_rate
+    missing_column_codes = rng.integers(0, len(missing_columns), readings)
+    for column_code, column in enumerate(missing_columns):
+        df.loc[is_missing & (missing_column_codes == column_code), column] = None
+
+    # Half of the invalid readings have a value out of range, the other half a value that can not be parsed
+    is_invalid = rng.random(readings) < invalid_rate
+    is_unparseable = is_invalid & (rng.random(readings) < 0.5)
+    is_unparseable_timestamp = rng.random(readings) < 0.5
+    df.loc[is_invalid & ~is_unparseable, 'wind_direction'] = 400
+    for column, invalid_value, column_mask in [
+        ('timestamp', 'not a timestamp', is_unparseable & is_unparseable_timestamp),
+        ('turbine_id', 'unknown', is_unparseable & ~is_unparseable_timestamp),
+    ]:
+        if column_mask.any():
+            df[column] = df[column].astype(object)
+            df.loc[column_mask, column] = invalid_value
+
+    return df
+
+
+def write_raw_readings(df, output_path, output_format='csv'):
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format '{output_format}', expected one of: csv, parquet")
+
+    if output_format == 'csv':
+        df.to_csv(output_path, index=False)
+    else:
+        # Columns with invalid values are mixed types, they are stored as strings like in the CSV files
+        df.astype({column: 'string' for column in df.columns if df[column].dtype == object}).to_parquet(
+            output_path, index=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate hourly turbine readings for benchmarks")
+    parser.add_argument('--turbines', type=int, default=1000)
+    parser.add_argument('--days', type=float, default=30)
+    parser.add_argument('--missing-rate', type=float, default=0.01)
+    parser.add_argument('--invalid-rate', type=float, default=0.001)
+    parser.add_argument('--anomaly-rate', type=float, default=0.001)
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='csv')
+    parser.add_argument('--output', default=os.path.join('benchmark_results', 'readings.csv'))
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    readings_df = generate_raw_readings(args.turbines, args.days, args.missing_rate, args.invalid_rate,
+                                        args.anomaly_rate, seed=args.seed)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    write_raw_readings(readings_df, args.output, args.format)
+    print(f"Wrote {len(readings_df)} readings of {args.turbines} turbines to {args.output}")
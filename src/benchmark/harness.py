@@ -0,0 +1,118 @@
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+from sqlalchemy import create_engine
+
+from src.analysis.stats import calculate_stats
+from src.benchmark.generator import generate_raw_readings, write_raw_readings
+from src.database.database_schema import create_tables, upgrade_tables
+from src.database.persistence import DatabaseManager
+from src.pipeline.etl import clean_data, do_etl
+
+BENCHMARK_PIPELINE_VERSION = 1
+BENCHMARK_STATS_VERSION = 1
+
+
+def time_step(results, name, rows, step):
+    # rows None counts the rows returned by the step
+    start = time.perf_counter()
+    value = step()
+    elapsed = time.perf_counter() - start
+
+    if rows is None:
+        rows = len(value)
+    results[name] = {'seconds': round(elapsed, 4), 'rows': rows,
+                     'rows_per_second': round(rows / elapsed) if elapsed > 0 else None}
+    print(f"{name}: {elapsed:.3f}s for {rows} rows")
+    return value
+
+
+def run_benchmark(turbines, days, missing_rate, invalid_rate, anomaly_rate, chunk_size):
+    results = {}
+    raw_df = generate_raw_readings(turbines, days, missing_rate, invalid_rate, anomaly_rate)
+    print(f"Benchmarking {len(raw_df)} readings of {turbines} turbines over {days} days")
+
+    with tempfile.TemporaryDirectory() as directory:
+        input_file_path = os.path.join(directory, 'readings.csv')
+        write_raw_readings(raw_df, input_file_path)
+
+        # clean_data is timed on the whole file read as text, like the chunks of the ETL before they are typed
+        text_df = pd.read_csv(input_file_path, dtype=str)
+        time_step(results, 'clean_data', len(text_df), lambda: clean_data(text_df))
+
+        # The DatabaseManager is a singleton, this process only ever uses the benchmark database
+        database_uri = f"sqlite:///{os.path.join(directory, 'benchmark.db')}"
+        engine = create_engine(database_uri)
+        create_tables(engine)
+        upgrade_tables(engine)
+        engine.dispose()
+        db_manager = DatabaseManager(database_uri)
+
+        time_step(results, 'do_etl', len(raw_df),
+                  lambda: do_etl(db_manager, 'readings.csv', BENCHMARK_PIPELINE_VERSION, input_file_path, chunk_size))
+
+        # The stats paths are timed on the first day of readings, the window of the default stats config
+        from_date = datetime(2022, 3, 1)
+        to_date = from_date + timedelta(days=1)
+        cleaned_df = time_step(results, 'fetch_cleaned_readings', None,
+                               lambda: db_manager.fetch_cleaned_readings(BENCHMARK_PIPELINE_VERSION, from_date,
+                                                                         to_date))
+        stats_df = time_step(results, 'calculate_stats', len(cleaned_df), lambda: calculate_stats(cleaned_df))
+        time_step(results, 'store_stats', len(stats_df),
+                  lambda: db_manager.store_stats(BENCHMARK_PIPELINE_VERSION, BENCHMARK_STATS_VERSION, from_date,
+                                                 to_date, stats_df))
+
+        db_manager.engine.dispose()
+
+    return results
+
+
+def compare_results(results, baseline):
+    # A step slower than its baseline by more than 10% is reported as a regression
+    for name, result in results.items():
+        baseline_result = baseline['results'].get(name)
+        if not baseline_result:
+            continue
+        ratio = result['seconds'] / baseline_result['seconds'] if baseline_result['seconds'] else float('inf')
+        status = 'REGRESSION' if ratio > 1.1 else 'ok'
+        print(f"{name}: {result['seconds']:.3f}s vs {baseline_result['seconds']:.3f}s ({ratio:.2f}x) {status}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the ETL & stats steps on synthetic readings, the results are "
+                                                 "written as JSON")
+    parser.add_argument('--turbines', type=int, default=100)
+    parser.add_argument('--days', type=float, default=30)
+    parser.add_argument('--missing-rate', type=float, default=0.01)
+    parser.add_argument('--invalid-rate', type=float, default=0.001)
+    parser.add_argument('--anomaly-rate', type=float, default=0.001)
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    parser.add_argument('--output-directory', default='benchmark_results')
+    parser.add_argument('--baseline', help="JSON results of an earlier run to compare with")
+    args = parser.parse_args()
+
+    benchmark_results = run_benchmark(args.turbines, args.days, args.missing_rate, args.invalid_rate,
+                                      args.anomaly_rate, args.chunk_size)
+
+    finished = datetime.now()
+    report = {
+        'run_at': finished.isoformat(timespec='seconds'),
+        'parameters': vars(args),
+        'environment': {'python': platform.python_version(), 'pandas': pd.__version__, 'machine': platform.machine()},
+        'results': benchmark_results,
+    }
+    os.makedirs(args.output_directory, exist_ok=True)
+    report_path = os.path.join(args.output_directory, f"benchmark-{finished:%Y%m%d-%H%M%S}.json")
+    with open(report_path, 'w') as report_file:
+        json.dump(report, report_file, indent=2)
+    print(f"Results written to {report_path}")
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            compare_results(benchmark_results, json.load(baseline_file))
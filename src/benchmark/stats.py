@@ -0,0 +1,65 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.analysis.stats import calculate_stats
+
+
+def calculate_stats_with_merge(df):
+    # The groupby, merge & groupby implementation calculate_stats replaced, kept as the baseline of the benchmark
+    stats = df.groupby('turbine_id').agg(
+        min_power=("power_output", "min"),
+        max_power=("power_output", "max"),
+        average=("power_output", "mean"),
+        std_deviation=("power_output", "std")
+    ).reset_index()
+
+    df = pd.merge(df, stats, on='turbine_id')
+    df['has_anomaly'] = abs((df['power_output'] - df['average']) / df['std_deviation']) > 2
+
+    final_stats = df.groupby('turbine_id').agg(
+        min_power=("min_power", lambda series: series.iloc[0]),
+        max_power=("max_power", lambda series: series.iloc[0]),
+        average=("average", lambda series: series.iloc[0]),
+        std_deviation=("std_deviation", lambda series: series.iloc[0]),
+        has_anomaly_reading=("has_anomaly", lambda series: any(series))
+    ).reset_index()
+
+    return final_stats.round(2)
+
+
+def generate_readings(readings, turbines, seed=42):
+    rng = np.random.default_rng(seed)
+
+    return pd.DataFrame({
+        'turbine_id': rng.integers(1, turbines + 1, readings),
+        'power_output': rng.normal(3.0, 0.5, readings).round(1),
+    })
+
+
+def run_benchmark(sizes, turbines):
+    for readings in sizes:
+        df = generate_readings(readings, turbines)
+
+        start = time.perf_counter()
+        baseline = calculate_stats_with_merge(df)
+        baseline_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        stats = calculate_stats(df)
+        elapsed = time.perf_counter() - start
+
+        pd.testing.assert_frame_equal(baseline, stats, check_dtype=False)
+        print(f"{readings} readings for {turbines} turbines: merge {baseline_elapsed:.3f}s, "
+              f"group reductions {elapsed:.3f}s ({baseline_elapsed / elapsed:.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare calculate_stats with the groupby & merge implementation")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000000, 10000000])
+    parser.add_argument('--turbines', type=int, default=1000)
+    args = parser.parse_args()
+
+    run_benchmark(args.sizes, args.turbines)
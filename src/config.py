@@ -6,9 +6,44 @@ class AppConfig:
     DATABASE_URI = None
     PIPELINE_VERSION = None
     INPUT_DIRECTORY_PATH = None
+    ETL_WORKERS = None
+    BULK_WRITER = None
+    COLUMNAR_STORE_DIRECTORY = None
+    COLUMNAR_FORMAT = None
+    CSV_ENGINE = None
+    TIMESTAMP_FORMAT = None
+    CHUNKS_PER_COMMIT = None
+    WATCH_POLL_INTERVAL_SECONDS = None
+    PIPELINED_ETL = None
+    PIPELINE_QUEUE_SIZE = None
+    READING_ROLLUPS = None
+
+    POOL_SIZE = None
+    MAX_OVERFLOW = None
+    POOL_TIMEOUT = None
+    POOL_RECYCLE = None
+    POOL_PRE_PING = None
 
     DURATION_IN_DAYS = None
     STATS_VERSION = None
+    BACKFILL_SLICE_DAYS = None
+    USE_ACCUMULATORS = None
+    READINGS_SOURCE = None
+    STREAMING_MEMORY_BUDGET_MB = None
+    STATS_WORKERS = None
+    STATS_TURBINE_SHARDS = None
+    READER_CACHE_WINDOWS = None
+
+    ANOMALY_ENGINES = None
+    ROLLING_WINDOW_READINGS = None
+    POWER_CURVE_BIN_WIDTH = None
+
+    KEEP_PIPELINE_VERSIONS = None
+    ARCHIVE_DIRECTORY = None
+    COMPACTION_BATCH_ROWS = None
+
+    LOG_LEVEL = None
+    METRICS_TEXTFILE = None
 
     @classmethod
     def load_config(cls, config_file=None):
@@ -20,9 +55,6 @@ class AppConfig:
         config = configparser.ConfigParser()
         config.read(config_file)
 
-        print(config_file)
-        print(config)
-
         cls.PIPELINE_VERSION = config.get('ETL', 'pipeline_version')
 
         data_base_uri = config.get('ETL', 'database_uri', fallback=None)
@@ -42,8 +74,62 @@ class AppConfig:
             cls.INPUT_DIRECTORY_PATH = os.path.abspath(
                 os.path.join(os.path.dirname(script_path), "..", input_directory_name))
 
+        cls.ETL_WORKERS = int(config.get('ETL', 'etl_workers', fallback=1))
+        cls.BULK_WRITER = config.get('ETL', 'bulk_writer', fallback='auto')
+
+        columnar_store_directory_name = config.get('ETL', 'columnar_store_directory_name', fallback=None)
+        if columnar_store_directory_name:
+            cls.COLUMNAR_STORE_DIRECTORY = os.path.abspath(
+                os.path.join(os.path.dirname(script_path), "..", columnar_store_directory_name))
+        cls.COLUMNAR_FORMAT = config.get('ETL', 'columnar_format', fallback='arrow')
+        cls.CSV_ENGINE = config.get('ETL', 'csv_engine', fallback='c')
+        # Read raw as the format is made of % directives
+        cls.TIMESTAMP_FORMAT = config.get('ETL', 'timestamp_format', raw=True, fallback=None) or None
+
+        cls.CHUNKS_PER_COMMIT = int(config.get('ETL', 'chunks_per_commit', fallback=1))
+        cls.WATCH_POLL_INTERVAL_SECONDS = float(config.get('ETL', 'watch_poll_interval_seconds', fallback=5))
+        cls.PIPELINED_ETL = config.getboolean('ETL', 'pipelined_etl', fallback=False)
+        cls.PIPELINE_QUEUE_SIZE = int(config.get('ETL', 'pipeline_queue_size', fallback=2))
+        cls.READING_ROLLUPS = config.getboolean('ETL', 'reading_rollups', fallback=False)
+
+        # Pool settings left empty keep the defaults of SQLAlchemy
+        pool_size = config.get('Database', 'pool_size', fallback=None)
+        cls.POOL_SIZE = int(pool_size) if pool_size else None
+        max_overflow = config.get('Database', 'max_overflow', fallback=None)
+        cls.MAX_OVERFLOW = int(max_overflow) if max_overflow else None
+        pool_timeout = config.get('Database', 'pool_timeout', fallback=None)
+        cls.POOL_TIMEOUT = float(pool_timeout) if pool_timeout else None
+        pool_recycle = config.get('Database', 'pool_recycle', fallback=None)
+        cls.POOL_RECYCLE = int(pool_recycle) if pool_recycle else None
+        pool_pre_ping = config.get('Database', 'pool_pre_ping', fallback=None)
+        cls.POOL_PRE_PING = config.getboolean('Database', 'pool_pre_ping') if pool_pre_ping else None
+
         cls.DURATION_IN_DAYS = float(config.get('Statistics', 'duration_in_days'))
         cls.STATS_VERSION = config.get('Statistics', 'stats_version')
+        cls.BACKFILL_SLICE_DAYS = float(config.get('Statistics', 'backfill_slice_days', fallback=0))
+        cls.USE_ACCUMULATORS = config.getboolean('Statistics', 'use_accumulators', fallback=False)
+        cls.READINGS_SOURCE = config.get('Statistics', 'readings_source', fallback='database')
+        cls.STREAMING_MEMORY_BUDGET_MB = float(config.get('Statistics', 'streaming_memory_budget_mb', fallback=0))
+        cls.STATS_WORKERS = int(config.get('Statistics', 'stats_workers', fallback=1))
+        cls.STATS_TURBINE_SHARDS = int(config.get('Statistics', 'stats_turbine_shards', fallback=1))
+        cls.READER_CACHE_WINDOWS = int(config.get('Statistics', 'reader_cache_windows', fallback=256))
+
+        cls.ANOMALY_ENGINES = config.get('Anomalies', 'engines', fallback='')
+        cls.ROLLING_WINDOW_READINGS = int(config.get('Anomalies', 'rolling_window_readings', fallback=24))
+        cls.POWER_CURVE_BIN_WIDTH = float(config.get('Anomalies', 'power_curve_bin_width', fallback=1.0))
+
+        cls.KEEP_PIPELINE_VERSIONS = int(config.get('Retention', 'keep_pipeline_versions', fallback=0))
+        archive_directory_name = config.get('Retention', 'archive_directory_name', fallback=None)
+        if archive_directory_name:
+            cls.ARCHIVE_DIRECTORY = os.path.abspath(
+                os.path.join(os.path.dirname(script_path), "..", archive_directory_name))
+        cls.COMPACTION_BATCH_ROWS = int(config.get('Retention', 'compaction_batch_rows', fallback=50000))
+
+        cls.LOG_LEVEL = config.get('Metrics', 'log_level', fallback='INFO').upper()
+        metrics_textfile_name = config.get('Metrics', 'prometheus_textfile_name', fallback=None)
+        if metrics_textfile_name:
+            cls.METRICS_TEXTFILE = os.path.abspath(
+                os.path.join(os.path.dirname(script_path), "..", metrics_textfile_name))
 
     @classmethod
     def print_config(cls):
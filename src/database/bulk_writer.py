@@ -0,0 +1,170 @@
+import abc
+import io
+from functools import partial
+
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+
+# Same format SQLAlchemy uses to store DateTime columns in SQLite
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+
+# Insert statements with an ON CONFLICT clause of the databases supporting it
+DIALECT_INSERTS = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert,
+}
+
+
+class BulkWriter(abc.ABC):
+    def prepare(self, engine):
+        pass
+
+    @abc.abstractmethod
+    def write(self, connection, table_name, df, conflict_columns=None):
+        # With conflict_columns a row with the same values in these columns as a stored row replaces the other values
+        # of the stored row instead of being inserted, so a replayed load does not duplicate rows
+        pass
+
+
+class PandasBulkWriter(BulkWriter):
+    # Fallback that works for every database supported by SQLAlchemy, rows are only upserted on the databases with an
+    # ON CONFLICT clause
+    def write(self, connection, table_name, df, conflict_columns=None):
+        method = 'multi'
+        if conflict_columns and connection.dialect.name in DIALECT_INSERTS:
+            df = drop_duplicate_keys(df, conflict_columns)
+            method = partial(insert_on_conflict, conflict_columns=conflict_columns)
+
+        df.to_sql(table_name, con=connection, if_exists='append', index=False, method=method, chunksize=1000)
+
+
+class SqliteBulkWriter(BulkWriter):
+    def prepare(self, engine):
+        # WAL lets the stats job read while a load is running & with WAL synchronous=NORMAL only syncs on checkpoints
+        # instead of on every commit, without risking corruption of the database
+        event.listen(engine, 'connect', set_sqlite_load_pragmas)
+
+    def write(self, connection, table_name, df, conflict_columns=None):
+        if df.empty:
+            return
+
+        columns = list(df.columns)
+        insert_sql = (f"INSERT INTO {table_name} ({', '.join(columns)}) "
+                      f"VALUES ({', '.join('?' for _ in columns)})")
+        if conflict_columns:
+            insert_sql += f" {on_conflict_clause(columns, conflict_columns)}"
+
+        # A single prepared statement executed for all the rows, the values are converted column wise
+        rows = list(zip(*(to_database_values(df[column]) for column in columns)))
+        connection.exec_driver_sql(insert_sql, rows)
+
+
+class PostgresCopyBulkWriter(BulkWriter):
+    def write(self, connection, table_name, df, conflict_columns=None):
+        if df.empty:
+            return
+
+        if not conflict_columns:
+            copy_from_dataframe(connection, table_name, df)
+            return
+
+        # COPY has no ON CONFLICT clause, the rows are copied into a temporary staging table & inserted from there with
+        # a single INSERT ... SELECT ... ON CONFLICT
+        df = drop_duplicate_keys(df, conflict_columns)
+        columns = ', '.join(df.columns)
+        staging_table_name = f"{table_name}_staging"
+        connection.exec_driver_sql(f"CREATE TEMPORARY TABLE {staging_table_name} AS "
+                                   f"SELECT {columns} FROM {table_name} WITH NO DATA")
+        copy_from_dataframe(connection, staging_table_name, df)
+        connection.exec_driver_sql(f"INSERT INTO {table_name} ({columns}) SELECT {columns} FROM {staging_table_name} "
+                                   f"{on_conflict_clause(list(df.columns), conflict_columns)}")
+        connection.exec_driver_sql(f"DROP TABLE {staging_table_name}")
+
+
+def copy_from_dataframe(connection, table_name, df):
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False, date_format=TIMESTAMP_FORMAT)
+    buffer.seek(0)
+
+    copy_sql = f"COPY {table_name} ({', '.join(df.columns)}) FROM STDIN WITH (FORMAT csv)"
+
+    # COPY is not part of the DBAPI, it is run on the driver cursor within the transaction of the connection
+    cursor = connection.connection.cursor()
+    try:
+        if hasattr(cursor, 'copy_expert'):
+            # psycopg2
+            cursor.copy_expert(copy_sql, buffer)
+        else:
+            # psycopg 3
+            with cursor.copy(copy_sql) as copy:
+                copy.write(buffer.getvalue())
+    finally:
+        cursor.close()
+
+
+BULK_WRITERS = {
+    'sqlite': SqliteBulkWriter,
+    'postgresql': PostgresCopyBulkWriter,
+}
+
+
+def create_bulk_writer(engine, bulk_writer_name='auto'):
+    if bulk_writer_name == 'pandas':
+        writer = PandasBulkWriter()
+    elif bulk_writer_name == 'auto':
+        writer = BULK_WRITERS.get(engine.dialect.name, PandasBulkWriter)()
+    else:
+        raise ValueError(f"Unknown bulk writer '{bulk_writer_name}', expected one of: auto, pandas")
+
+    writer.prepare(engine)
+    return writer
+
+
+def drop_duplicate_keys(df, conflict_columns):
+    # A statement can not update the same row twice, the last row of a key wins as it would if the rows were loaded
+    # one by one
+    return df.drop_duplicates(conflict_columns, keep='last')
+
+
+def on_conflict_clause(columns, conflict_columns):
+    # Same syntax on SQLite & PostgreSQL
+    update_columns = [column for column in columns if column not in conflict_columns]
+    if not update_columns:
+        return f"ON CONFLICT ({', '.join(conflict_columns)}) DO NOTHING"
+
+    assignments = ', '.join(f"{column} = excluded.{column}" for column in update_columns)
+    return f"ON CONFLICT ({', '.join(conflict_columns)}) DO UPDATE SET {assignments}"
+
+
+def insert_on_conflict(pd_table, connection, keys, data_iter, conflict_columns):
+    # Insert method of DataFrame.to_sql upserting the rows with the ON CONFLICT clause of the dialect
+    statement = DIALECT_INSERTS[connection.dialect.name](pd_table.table).values(
+        [dict(zip(keys, row)) for row in data_iter])
+
+    update_columns = {column: statement.excluded[column] for column in keys if column not in conflict_columns}
+    if update_columns:
+        statement = statement.on_conflict_do_update(index_elements=conflict_columns, set_=update_columns)
+    else:
+        statement = statement.on_conflict_do_nothing(index_elements=conflict_columns)
+    connection.execute(statement)
+
+
+def set_sqlite_load_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+def to_database_values(series):
+    if series.dtype.kind == 'M':
+        timestamps = series.dt.strftime(TIMESTAMP_FORMAT)
+        return timestamps.where(series.notna(), None).tolist()
+
+    # Missing values of nullable columns, eg the turbine_id of the cleaning statistics, are bound as NULL
+    if series.hasnans:
+        series = series.astype(object).where(series.notna(), None)
+
+    # tolist converts numpy scalars to python types the DBAPI drivers can bind
+    return series.tolist()
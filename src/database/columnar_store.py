@@ -0,0 +1,116 @@
+import glob
+import os
+from datetime import timedelta
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+COLUMNAR_FORMATS = ['arrow', 'parquet']
+
+CLEANED_READING_COLUMNS = ['turbine_id', 'timestamp', 'wind_speed', 'wind_direction', 'power_output', 'is_imputed']
+
+
+class ColumnarStore:
+    def __init__(self, root_directory, columnar_format='arrow'):
+        if pa is None:
+            raise ImportError("The columnar store needs pyarrow, install it with `pip install pyarrow`")
+        if columnar_format not in COLUMNAR_FORMATS:
+            raise ValueError(f"Unknown columnar format '{columnar_format}', expected one of: arrow, parquet")
+
+        self.root_directory = root_directory
+        self.columnar_format = columnar_format
+
+    def write_cleaned_readings(self, pipeline_version, cleaned_df, file_name, start_line_number):
+        # The readings of a chunk are written to one file per date partition, named after the input file & the first
+        # line of the chunk. A chunk replayed after a crash starts at the same line, so its files replace the files of
+        # the failed attempt. This is done before the chunk is committed to load_control
+        file_stem = f"{os.path.splitext(file_name)[0]}-{start_line_number:012d}"
+        pipeline_directory = os.path.join(self.root_directory, f"pipeline_version={pipeline_version}")
+        for stale_path in glob.glob(os.path.join(glob.escape(pipeline_directory), 'date=*', f"{file_stem}.*")):
+            os.remove(stale_path)
+
+        columns = [column for column in CLEANED_READING_COLUMNS if column in cleaned_df.columns]
+        dates = cleaned_df['timestamp'].dt.strftime('%Y-%m-%d')
+
+        for date, date_df in cleaned_df[columns].groupby(dates, sort=False):
+            date_directory = os.path.join(pipeline_directory, f"date={date}")
+            os.makedirs(date_directory, exist_ok=True)
+
+            # Sorted by turbine so the readings of a turbine are contiguous when the partition is read
+            table = pa.Table.from_pandas(date_df.sort_values(['turbine_id', 'timestamp'], kind='stable'),
+                                         preserve_index=False)
+            path = os.path.join(date_directory, f"{file_stem}.{self.columnar_format}")
+            self.write_table(table, path)
+
+    def write_table(self, table, path):
+        # Written to a temporary file first so a reader never sees a partially written file
+        temporary_path = f"{path}.tmp"
+        if self.columnar_format == 'arrow':
+            # Uncompressed Arrow IPC files can be memory-mapped & read without copying the data
+            with pa.OSFile(temporary_path, 'wb') as sink:
+                with ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+        else:
+            pq.write_table(table, temporary_path)
+        os.replace(temporary_path, path)
+
+    def read_table(self, path, columns):
+        # Columns missing from older files, eg is_imputed, are left out & filled with nulls when the tables are merged
+        if path.endswith('.arrow'):
+            # The memory map stays open as long as the arrays of the table reference it
+            table = ipc.open_file(pa.memory_map(path)).read_all()
+            return table.select([column for column in columns if column in table.schema.names])
+
+        schema = pq.read_schema(path)
+        return pq.read_table(path, columns=[column for column in columns if column in schema.names], memory_map=True)
+
+    def fetch_cleaned_readings(self, pipeline_version, from_date, to_date, columns=None):
+        # Only the date partitions in [from_date, to_date) & the requested columns are read
+        columns = columns or CLEANED_READING_COLUMNS
+        tables = list(self.iter_window_tables(pipeline_version, from_date, to_date, columns))
+
+        if not tables:
+            return pd.DataFrame(columns=columns)
+
+        table = pa.concat_tables(tables, promote_options='permissive')
+        return self.filter_window(table, from_date, to_date, columns).to_pandas(split_blocks=True)
+
+    def iter_cleaned_readings(self, pipeline_version, from_date, to_date, columns=None):
+        # Same as fetch_cleaned_readings one file at a time, a file holds the readings of one chunk of the ETL
+        columns = columns or CLEANED_READING_COLUMNS
+        for table in self.iter_window_tables(pipeline_version, from_date, to_date, columns):
+            yield self.filter_window(table, from_date, to_date, columns).to_pandas(split_blocks=True)
+
+    def iter_window_tables(self, pipeline_version, from_date, to_date, columns):
+        # The timestamp is always read as the partitions are by date & the window may start or end within a day
+        read_columns = columns if 'timestamp' in columns else columns + ['timestamp']
+        pipeline_directory = os.path.join(self.root_directory, f"pipeline_version={pipeline_version}")
+
+        date = from_date.date()
+        last_date = (to_date - timedelta(microseconds=1)).date()
+        while date <= last_date:
+            date_directory = os.path.join(pipeline_directory, f"date={date:%Y-%m-%d}")
+            for path in sorted(glob.glob(os.path.join(glob.escape(date_directory), f"*.{self.columnar_format}"))):
+                yield self.read_table(path, read_columns)
+            date += timedelta(days=1)
+
+    def filter_window(self, table, from_date, to_date, columns):
+        timestamps = table.column('timestamp')
+        in_window = pc.and_(pc.greater_equal(timestamps, pa.scalar(from_date, timestamps.type)),
+                            pc.less(timestamps, pa.scalar(to_date, timestamps.type)))
+        table = table.filter(in_window)
+        return table if 'timestamp' in columns else table.drop_columns(['timestamp'])
+
+
+def create_columnar_store(root_directory, columnar_format):
+    # The columnar store is optional, it is disabled when no directory is configured
+    if not root_directory:
+        return None
+    return ColumnarStore(root_directory, columnar_format)
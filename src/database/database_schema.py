@@ -1,6 +1,7 @@
 from datetime import datetime
 
-from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, DateTime, ForeignKey
+from sqlalchemy import create_engine, inspect, text, Column, Integer, BigInteger, String, Float, Boolean, DateTime, \
+    ForeignKey, Index, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 
 from src.config import AppConfig
@@ -14,8 +15,13 @@ class LoadControlEntity(Base):
     pipeline_version = Column(Integer)
     input_file_name = Column(String)
     last_loaded_line_number = Column(Integer)
+    last_loaded_byte_offset = Column(BigInteger)
     load_timestamp = Column(DateTime, default=datetime.now)
 
+    __table_args__ = (
+        Index('ix_load_control_input_file_name_pipeline_version', 'input_file_name', 'pipeline_version'),
+    )
+
 
 class CleaningStatisticsEntity(Base):
     __tablename__ = 'cleaning_statistics'
@@ -31,6 +37,7 @@ class CleanedReadingEntity(Base):
     __tablename__ = 'cleaned_reading'
     id = Column(Integer, primary_key=True)
     load_id = Column(Integer, ForeignKey('load_control.id'))
+    pipeline_version = Column(Integer)
     turbine_id = Column(Integer)
     timestamp = Column(DateTime)
     wind_speed = Column(Float)
@@ -38,6 +45,33 @@ class CleanedReadingEntity(Base):
     power_output = Column(Float)
     is_imputed = Column(Boolean)
 
+    # pipeline_version is copied from load_control so the stats window scans do not need to join it. The unique index
+    # serves the window scans & makes replayed readings conflict with the readings already loaded
+    __table_args__ = (
+        Index('uq_cleaned_reading_pipeline_version_timestamp_turbine_id', 'pipeline_version', 'timestamp',
+              'turbine_id', unique=True),
+    )
+
+
+class PendingReadingEntity(Base):
+    __tablename__ = 'pending_reading'
+    id = Column(Integer, primary_key=True)
+    pipeline_version = Column(Integer)
+    input_file_name = Column(String)
+    dropped_load_id = Column(Integer, ForeignKey('load_control.id'))
+    turbine_id = Column(Integer)
+    timestamp = Column(DateTime)
+    wind_speed = Column(Float)
+    wind_direction = Column(Float)
+    power_output = Column(Float)
+
+    # The readings of a file held back to be imputed with its next chunk, replaced in the same transaction as every
+    # load_control checkpoint of the file so a later run imputes them with the lines after the checkpoint. The readings
+    # still held back when the file ended are counted as dropped by the load dropped_load_id
+    __table_args__ = (
+        Index('ix_pending_reading_input_file_name_pipeline_version', 'input_file_name', 'pipeline_version'),
+    )
+
 
 class StatisticsControlEntity(Base):
     __tablename__ = 'statistics_control'
@@ -47,6 +81,10 @@ class StatisticsControlEntity(Base):
     pipeline_version = Column(Integer)
     stats_version = Column(Integer)
 
+    __table_args__ = (
+        Index('ix_statistics_control_pipeline_version_stats_version', 'pipeline_version', 'stats_version'),
+    )
+
 
 class StatisticsEntity(Base):
     __tablename__ = 'statistics'
@@ -59,14 +97,159 @@ class StatisticsEntity(Base):
     std_deviation = Column(Float)
     has_anomaly_reading = Column(Boolean)
 
+    __table_args__ = (
+        Index('uq_statistics_statistics_control_id_turbine_id', 'statistics_control_id', 'turbine_id', unique=True),
+    )
+
+
+class AnomalyReadingEntity(Base):
+    __tablename__ = 'anomaly_reading'
+    id = Column(Integer, primary_key=True)
+    statistics_control_id = Column(Integer, ForeignKey('statistics_control.id'))
+    turbine_id = Column(Integer)
+    timestamp = Column(DateTime)
+    power_output = Column(Float)
+    anomaly_engine = Column(String)
+    score = Column(Float)
+
+    # The readings flagged by the anomaly engine when the stats of a window were created, for drill-down from the
+    # has_anomaly_reading flag of the statistics
+    __table_args__ = (
+        Index('uq_anomaly_reading_statistics_control_id_turbine_id_timestamp', 'statistics_control_id', 'turbine_id',
+              'timestamp', unique=True),
+    )
+
+
+class StatisticsAccumulatorEntity(Base):
+    __tablename__ = 'statistics_accumulator'
+    id = Column(Integer, primary_key=True)
+    pipeline_version = Column(Integer)
+    turbine_id = Column(Integer)
+    window_start = Column(DateTime)
+    reading_count = Column(Integer)
+    power_sum = Column(Float)
+    power_m2 = Column(Float)
+    min_power = Column(Float)
+    max_power = Column(Float)
+
+    # One accumulator per turbine & day, the ETL merges the partial stats of every chunk into it
+    __table_args__ = (
+        UniqueConstraint('pipeline_version', 'window_start', 'turbine_id',
+                         name='uq_statistics_accumulator_pipeline_version_window_start_turbine_id'),
+    )
+
+
+class PowerCurveEntity(Base):
+    __tablename__ = 'power_curve'
+    id = Column(Integer, primary_key=True)
+    pipeline_version = Column(Integer)
+    turbine_id = Column(Integer)
+    wind_speed_bin = Column(Integer)
+    reading_count = Column(Integer)
+    power_sum = Column(Float)
+    power_m2 = Column(Float)
+    min_power = Column(Float)
+    max_power = Column(Float)
+
+    # The power output of every turbine by wind speed bin, merged from the partial stats of every chunk by the ETL like
+    # the statistics accumulators. wind_speed_bin is the wind speed divided by power_curve_bin_width rounded down
+    __table_args__ = (
+        UniqueConstraint('pipeline_version', 'turbine_id', 'wind_speed_bin',
+                         name='uq_power_curve_pipeline_version_turbine_id_wind_speed_bin'),
+    )
+
+
+class ReadingRollupEntity(Base):
+    __tablename__ = 'reading_rollup'
+    id = Column(Integer, primary_key=True)
+    pipeline_version = Column(Integer)
+    rollup_level = Column(String)
+    bucket_start = Column(DateTime)
+    turbine_id = Column(Integer)
+    reading_count = Column(Integer)
+    power_sum = Column(Float)
+    power_m2 = Column(Float)
+    min_power = Column(Float)
+    max_power = Column(Float)
+    wind_speed_sum = Column(Float)
+    wind_direction_n_count = Column(Integer)
+    wind_direction_ne_count = Column(Integer)
+    wind_direction_e_count = Column(Integer)
+    wind_direction_se_count = Column(Integer)
+    wind_direction_s_count = Column(Integer)
+    wind_direction_sw_count = Column(Integer)
+    wind_direction_w_count = Column(Integer)
+    wind_direction_nw_count = Column(Integer)
+
+    # The hourly, daily & monthly stats of every turbine for the dashboards, merged from the rollups of every chunk by
+    # the ETL like the statistics accumulators. The readings are counted per compass point of their wind direction so
+    # the dominant direction can be merged too
+    __table_args__ = (
+        UniqueConstraint('pipeline_version', 'rollup_level', 'bucket_start', 'turbine_id',
+                         name='uq_reading_rollup_pipeline_version_rollup_level_bucket_start_turbine_id'),
+    )
+
+
+# Indexes dropped when upgrading existing databases, the non unique indexes replaced by unique indexes on the same
+# columns & the cleaned_reading indexes no query used, every cleaned_reading query is served by its unique index
+DROPPED_INDEXES = ['ix_cleaned_reading_pipeline_version_timestamp', 'ix_statistics_statistics_control_id',
+                   'ix_cleaned_reading_load_id_timestamp', 'ix_cleaned_reading_timestamp_turbine_id']
+
+# Unique keys of the tables loaded with ON CONFLICT, duplicates loaded before the unique indexes existed are removed
+# keeping the latest row
+UNIQUE_KEYS = {
+    'cleaned_reading': ['pipeline_version', 'turbine_id', 'timestamp'],
+    'statistics': ['statistics_control_id', 'turbine_id'],
+}
+
 
 def create_tables(engine):
     Base.metadata.create_all(engine)
 
 
+def upgrade_tables(engine):
+    # create_all only creates missing tables, the columns & indexes added to existing tables since they were created
+    # are added here. Running it again is a no-op
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+
+        # Readings loaded before pipeline_version was denormalized take it from their load_control row
+        connection.execute(text("""
+            UPDATE cleaned_reading
+            SET pipeline_version = (SELECT lc.pipeline_version FROM load_control lc WHERE lc.id = cleaned_reading.load_id)
+            WHERE pipeline_version IS NULL
+        """))
+
+        for index_name in DROPPED_INDEXES:
+            connection.execute(text(f"DROP INDEX IF EXISTS {index_name}"))
+
+        for table_name, key_columns in UNIQUE_KEYS.items():
+            key = ', '.join(key_columns)
+            result = connection.execute(text(f"""
+                DELETE FROM {table_name}
+                WHERE id NOT IN (SELECT MAX(id) FROM {table_name} GROUP BY {key})
+            """))
+            if result.rowcount:
+                print(f"Removed {result.rowcount} duplicate rows from {table_name}")
+
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+
+
 def setup_db():
     engine = create_engine(AppConfig.DATABASE_URI, echo=True)
     create_tables(engine)
+    upgrade_tables(engine)
 
 
 if __name__ == "__main__":
@@ -1,15 +1,73 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 
-from sqlalchemy import create_engine, desc, text
+from sqlalchemy import create_engine, delete, desc, exists, func, insert, select, text, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import sessionmaker
 from contextlib import contextmanager
+import numpy as np
 import pandas as pd
 
-from src.database.database_schema import LoadControlEntity, CleanedReadingEntity, StatisticsControlEntity, \
-    StatisticsEntity
+from src.analysis.accumulators import calculate_accumulators, calculate_power_curve_accumulators
+from src.analysis.anomalies import parse_anomaly_engines
+from src.analysis.rollups import ROLLUP_LEVELS, ROLLUP_SUM_COLUMNS, calculate_all_rollups, calculate_hourly_rollups, \
+    roll_up, rollup_bucket_range
+from src.database.bulk_writer import create_bulk_writer, to_database_values
+from src.database.database_schema import LoadControlEntity, CleaningStatisticsEntity, CleanedReadingEntity, \
+    StatisticsControlEntity, StatisticsEntity, StatisticsAccumulatorEntity, AnomalyReadingEntity, PowerCurveEntity, \
+    ReadingRollupEntity, PendingReadingEntity, UNIQUE_KEYS
 from src.config import AppConfig
 from src.model.model import LoadControl, StatisticsControl
 
+# The pipeline_version is denormalized into cleaned_reading so the window scans are served by the
+# uq_cleaned_reading_pipeline_version_timestamp_turbine_id index without joining load_control
+MIN_MAX_CLEANED_READINGS_TIMESTAMP_QUERY = text("""
+    SELECT
+        MIN(cr.timestamp) AS min_timestamp,
+        MAX(cr.timestamp) AS max_timestamp
+    FROM cleaned_reading cr
+    WHERE cr.pipeline_version = :pipeline_version
+""")
+
+CLEANED_READINGS_QUERY = text("""
+    SELECT
+        cr.id,
+        cr.load_id,
+        cr.turbine_id,
+        cr.timestamp,
+        cr.wind_speed,
+        cr.wind_direction,
+        cr.power_output,
+        cr.is_imputed
+    FROM cleaned_reading cr
+    WHERE cr.pipeline_version = :pipeline_version
+        AND cr.timestamp >= :from_date
+        AND cr.timestamp < :to_date
+""")
+
+# The readings of one shard of the turbines, the stats of the shards of a window are computed in parallel
+CLEANED_READINGS_SHARD_QUERY = text(CLEANED_READINGS_QUERY.text + """        AND cr.turbine_id % :turbine_shards = :turbine_shard
+""")
+
+# Only the columns needed for the stats are streamed
+CLEANED_POWER_OUTPUTS_QUERY = text("""
+    SELECT
+        cr.turbine_id,
+        cr.power_output
+    FROM cleaned_reading cr
+    WHERE cr.pipeline_version = :pipeline_version
+        AND cr.timestamp >= :from_date
+        AND cr.timestamp < :to_date
+""")
+
+# The columns of the readings held back to be imputed with the next chunk, as parsed from the input file
+PENDING_COLUMNS = ['timestamp', 'turbine_id', 'wind_speed', 'wind_direction', 'power_output']
+
+HOT_QUERIES = {
+    'fetch_min_max_cleaned_readings_timestamp': MIN_MAX_CLEANED_READINGS_TIMESTAMP_QUERY,
+    'fetch_cleaned_readings': CLEANED_READINGS_QUERY,
+    'iter_cleaned_power_outputs': CLEANED_POWER_OUTPUTS_QUERY,
+}
+
 
 def singleton(cls):
     instances = {}
@@ -19,14 +77,48 @@ def singleton(cls):
             instances[cls] = cls(*args, **kwargs)
         return instances[cls]
 
+    # The class itself, eg for tests creating an instance per database
+    get_instance.__wrapped__ = cls
     return get_instance
 
 
 @singleton
 class DatabaseManager:
     def __init__(self, database_uri):
-        self.engine = create_engine(database_uri)
+        self.engine = create_engine(database_uri, **pool_settings())
         self.Session = sessionmaker(bind=self.engine)
+        self.bulk_writer = create_bulk_writer(self.engine, AppConfig.BULK_WRITER)
+        # The accumulators are only maintained for the stats finalized from them, the power curves for the power_curve
+        # anomaly engine & the rollups when they are switched on in the config. scripts/rebuild_accumulators.py fills
+        # them in from the readings loaded before they were switched on
+        self.accumulator_upsert = None
+        if AppConfig.USE_ACCUMULATORS:
+            self.accumulator_upsert = create_accumulator_upsert(self.engine.dialect.name,
+                                                                StatisticsAccumulatorEntity.__table__,
+                                                                ['pipeline_version', 'window_start', 'turbine_id'])
+        self.power_curve_upsert = None
+        if 'power_curve' in parse_anomaly_engines(AppConfig.ANOMALY_ENGINES).values():
+            self.power_curve_upsert = create_accumulator_upsert(self.engine.dialect.name, PowerCurveEntity.__table__,
+                                                                ['pipeline_version', 'turbine_id', 'wind_speed_bin'])
+        self.rollup_upsert = None
+        if AppConfig.READING_ROLLUPS:
+            self.rollup_upsert = create_accumulator_upsert(self.engine.dialect.name, ReadingRollupEntity.__table__,
+                                                           ['pipeline_version', 'rollup_level', 'bucket_start',
+                                                            'turbine_id'], ROLLUP_SUM_COLUMNS)
+        self.compiled_upserts = {}
+        self.statistics_listeners = []
+
+    def add_statistics_listener(self, listener):
+        # Called with the pipeline version, the stats version & the windows of the statistics stored once they are
+        # committed, eg to invalidate the windows cached by a StatisticsReader
+        self.statistics_listeners.append(listener)
+
+    def remove_statistics_listener(self, listener):
+        self.statistics_listeners.remove(listener)
+
+    def notify_statistics_listeners(self, pipeline_version, stats_version, windows):
+        for listener in list(self.statistics_listeners):
+            listener(pipeline_version, stats_version, windows)
 
     @contextmanager
     def session_scope(self, current_session):
@@ -69,22 +161,356 @@ class DatabaseManager:
                 '''
         return load_control
 
-    def load_cleaned_data(self, pipeline_version, cleaned_df, file_name, last_loaded_line_number):
-        session_factory = self.Session
-        new_session = session_factory()
+    @contextmanager
+    def load_batch(self, chunks_per_commit=1):
+        # Loads of several chunks share one connection & are committed together, see LoadBatch
+        load_batch = LoadBatch(self, chunks_per_commit)
+        try:
+            yield load_batch
+            load_batch.commit()
+        except Exception:
+            load_batch.rollback()
+            raise
 
-        with self.session_scope(new_session) as session:
-            load_control_entity = LoadControlEntity(
-                pipeline_version=pipeline_version,
-                input_file_name=file_name,
-                last_loaded_line_number=last_loaded_line_number
-            )
-            session.add(load_control_entity)
-            session.commit()
-            load_id = load_control_entity.id
-            cleaned_df['load_id'] = load_id
-            cleaned_df.to_sql(CleanedReadingEntity.__tablename__, con=self.engine, if_exists='append', index=False,
-                              method='multi', chunksize=1000)
+    def load_cleaned_data(self, pipeline_version, cleaned_df, file_name, last_loaded_line_number,
+                          last_loaded_byte_offset=None, cleaning_statistics_df=None, pending_df=None,
+                          pending_dropped=False):
+        with self.engine.begin() as connection:
+            self.write_cleaned_data(connection, pipeline_version, cleaned_df, file_name, last_loaded_line_number,
+                                    last_loaded_byte_offset, cleaning_statistics_df, pending_df, pending_dropped)
+
+    def write_cleaned_data(self, connection, pipeline_version, cleaned_df, file_name, last_loaded_line_number,
+                           last_loaded_byte_offset=None, cleaning_statistics_df=None, pending_df=None,
+                           pending_dropped=False):
+        # The load_control checkpoint, the cleaning statistics, the readings, the readings held back, the accumulators,
+        # the power curves & the rollups of a chunk are written on the same connection so they are committed in the
+        # same transaction, a checkpoint is never committed without its readings
+        result = connection.execute(insert(LoadControlEntity).values(
+            pipeline_version=pipeline_version,
+            input_file_name=file_name,
+            last_loaded_line_number=last_loaded_line_number,
+            last_loaded_byte_offset=last_loaded_byte_offset,
+            load_timestamp=datetime.now()
+        ))
+        load_id = result.inserted_primary_key[0]
+
+        if cleaning_statistics_df is not None:
+            self.bulk_writer.write(connection, CleaningStatisticsEntity.__tablename__,
+                                   cleaning_statistics_df.assign(load_id=load_id))
+        if pending_df is not None:
+            self.replace_pending_readings(connection, pipeline_version, file_name, pending_df,
+                                          load_id if pending_dropped else None)
+
+        # The upsert keeps the last reading of a key repeated in the chunk, the accumulators, power curves & rollups
+        # are calculated from the same readings
+        cleaned_df = cleaned_df.assign(load_id=load_id, pipeline_version=pipeline_version).drop_duplicates(
+            UNIQUE_KEYS[CleanedReadingEntity.__tablename__], keep='last')
+
+        # A replayed chunk updates the readings already loaded instead of duplicating them. Their partial stats can not
+        # be merged a second time, the accumulators, power curves & rollups of the turbines with replayed readings are
+        # recalculated while the readings of the other turbines are merged
+        replayed_df = self.fetch_replayed_readings(connection, pipeline_version, cleaned_df)
+        self.bulk_writer.write(connection, CleanedReadingEntity.__tablename__, cleaned_df,
+                               UNIQUE_KEYS[CleanedReadingEntity.__tablename__])
+
+        power_curve_df = None
+        if self.power_curve_upsert is not None:
+            power_curve_df = calculate_power_curve_accumulators(cleaned_df, AppConfig.POWER_CURVE_BIN_WIDTH)
+        is_replayed_turbine = cleaned_df['turbine_id'].isin(replayed_df['turbine_id'].unique())
+        if is_replayed_turbine.any():
+            replayed_turbines_df = cleaned_df[is_replayed_turbine]
+            self.recalculate_statistics_accumulators(connection, pipeline_version, replayed_turbines_df)
+            self.recalculate_reading_rollups(connection, pipeline_version, replayed_turbines_df)
+            cleaned_df = cleaned_df[~is_replayed_turbine]
+
+            if power_curve_df is not None:
+                # The wind speed bins of the replayed readings before & after the replay
+                replayed_keys_df = replayed_df[['turbine_id', 'timestamp']]
+                replayed_points_df = self.recalculate_power_curves(connection, pipeline_version, pd.concat([
+                    replayed_df, replayed_turbines_df.astype({'turbine_id': 'int64'}).merge(replayed_keys_df)]))
+                power_curve_df = power_curve_df.merge(replayed_points_df, how='left', indicator=True)
+                power_curve_df = power_curve_df[power_curve_df['_merge'] == 'left_only'].drop(columns='_merge')
+
+        if self.accumulator_upsert is not None:
+            self.merge_statistics_accumulators(connection, pipeline_version, calculate_accumulators(cleaned_df))
+        if power_curve_df is not None:
+            self.merge_power_curves(connection, pipeline_version, power_curve_df)
+        self.merge_all_reading_rollups(connection, pipeline_version, cleaned_df)
+
+    def replace_pending_readings(self, connection, pipeline_version, file_name, pending_df, dropped_load_id=None):
+        # The readings held back after the chunk replace the ones held back after the previous chunk of the file. The
+        # readings counted as dropped when the file ended are held back again by the next chunk, so their drop is
+        # withdrawn. With a dropped_load_id the readings are counted as dropped by that load
+        file_filters = [PendingReadingEntity.pipeline_version == pipeline_version,
+                        PendingReadingEntity.input_file_name == file_name]
+        dropped_filters = [*file_filters, PendingReadingEntity.dropped_load_id.is_not(None)]
+
+        # cleaning_statistics is not indexed by load_id, it is only scanned when the readings held back were dropped
+        if connection.execute(select(exists().where(*dropped_filters))).scalar():
+            connection.execute(delete(CleaningStatisticsEntity).where(
+                CleaningStatisticsEntity.load_id.in_(select(PendingReadingEntity.dropped_load_id).where(
+                    *dropped_filters)),
+                CleaningStatisticsEntity.action == 'DROPPED',
+                CleaningStatisticsEntity.reason == 'NOT_IMPUTABLE'
+            ))
+        connection.execute(delete(PendingReadingEntity).where(*file_filters))
+
+        # The turbine ids are parsed as floats, written as integers so COPY does not reject eg 2.0 for an INTEGER
+        if not pending_df.empty:
+            self.bulk_writer.write(connection, PendingReadingEntity.__tablename__, pending_df[PENDING_COLUMNS].astype(
+                {'turbine_id': 'Int64'}).assign(pipeline_version=pipeline_version, input_file_name=file_name,
+                                                dropped_load_id=dropped_load_id))
+
+    def fetch_pending_readings(self, pipeline_version, file_name):
+        query = select(*[PendingReadingEntity.__table__.c[column] for column in PENDING_COLUMNS]).where(
+            PendingReadingEntity.pipeline_version == pipeline_version,
+            PendingReadingEntity.input_file_name == file_name
+        ).order_by(PendingReadingEntity.id)
+
+        # The numeric columns have the types the reader parses them to, also when they are all null
+        with self.engine.connect() as connection:
+            pending_df = pd.read_sql_query(query, connection, parse_dates=['timestamp'])
+        return pending_df.astype({column: 'float64' for column in PENDING_COLUMNS if column != 'timestamp'})
+
+    def fetch_replayed_readings(self, connection, pipeline_version, cleaned_df):
+        # The stored readings with the same key as a reading of the chunk, ie the readings the upsert replaces. The
+        # readings of the turbines of the chunk within its time range are narrowed down to the keys of the chunk, so
+        # the readings of the previous chunk sharing a timestamp with this one are not taken for replayed readings.
+        # Without accumulators, power curves & rollups to recalculate the replayed readings are not looked up
+        if cleaned_df.empty or (self.accumulator_upsert is None and self.power_curve_upsert is None and
+                                self.rollup_upsert is None):
+            return pd.DataFrame(columns=['turbine_id', 'timestamp', 'wind_speed'])
+
+        query = select(CleanedReadingEntity.turbine_id, CleanedReadingEntity.timestamp,
+                       CleanedReadingEntity.wind_speed).where(
+            CleanedReadingEntity.pipeline_version == pipeline_version,
+            CleanedReadingEntity.timestamp >= cleaned_df['timestamp'].min(),
+            CleanedReadingEntity.timestamp <= cleaned_df['timestamp'].max(),
+            CleanedReadingEntity.turbine_id.in_(cleaned_df['turbine_id'].unique().tolist())
+        )
+        stored_df = pd.read_sql_query(query, connection, parse_dates=['timestamp'])
+        if stored_df.empty:
+            return stored_df
+
+        chunk_keys_df = cleaned_df[['turbine_id', 'timestamp']].astype({'turbine_id': 'int64'})
+        return stored_df.astype({'turbine_id': 'int64'}).merge(chunk_keys_df.drop_duplicates(),
+                                                               on=['turbine_id', 'timestamp'])
+
+    def recalculate_statistics_accumulators(self, connection, pipeline_version, cleaned_df):
+        if self.accumulator_upsert is None:
+            return
+
+        from_date = cleaned_df['timestamp'].min().normalize()
+        to_date = cleaned_df['timestamp'].max().normalize() + timedelta(days=1)
+        turbine_ids = cleaned_df['turbine_id'].unique().tolist()
+
+        readings_query = select(CleanedReadingEntity.turbine_id, CleanedReadingEntity.timestamp,
+                                CleanedReadingEntity.power_output).where(
+            CleanedReadingEntity.pipeline_version == pipeline_version,
+            CleanedReadingEntity.timestamp >= from_date,
+            CleanedReadingEntity.timestamp < to_date,
+            CleanedReadingEntity.turbine_id.in_(turbine_ids)
+        )
+        readings_df = pd.read_sql_query(readings_query, connection, parse_dates=['timestamp'])
+
+        connection.execute(delete(StatisticsAccumulatorEntity).where(
+            StatisticsAccumulatorEntity.pipeline_version == pipeline_version,
+            StatisticsAccumulatorEntity.window_start >= from_date,
+            StatisticsAccumulatorEntity.window_start < to_date,
+            StatisticsAccumulatorEntity.turbine_id.in_(turbine_ids)
+        ))
+        self.merge_statistics_accumulators(connection, pipeline_version, calculate_accumulators(readings_df))
+
+    def merge_statistics_accumulators(self, connection, pipeline_version, accumulators_df):
+        # Accumulators are only maintained on databases with an ON CONFLICT clause
+        if self.accumulator_upsert is None or accumulators_df.empty:
+            return
+
+        accumulators_df = accumulators_df.assign(pipeline_version=pipeline_version)
+        self.execute_upsert(connection, self.accumulator_upsert, accumulators_df)
+
+    def execute_upsert(self, connection, upsert, df):
+        # On SQLite the upsert is compiled once per set of columns & executed straight on the driver with the values
+        # converted column wise like the bulk writer, the per row parameter processing of SQLAlchemy costs more than
+        # the upsert itself. The other databases execute it through SQLAlchemy
+        if connection.dialect.name != 'sqlite':
+            connection.execute(upsert, df.to_dict('records'))
+            return
+
+        key = (upsert, tuple(df.columns))
+        if key not in self.compiled_upserts:
+            self.compiled_upserts[key] = upsert.compile(dialect=connection.dialect, column_keys=list(df.columns))
+        compiled = self.compiled_upserts[key]
+
+        rows = list(zip(*(to_database_values(df[column]) for column in compiled.positiontup)))
+        connection.exec_driver_sql(compiled.string, rows)
+
+    def recalculate_power_curves(self, connection, pipeline_version, replayed_df):
+        # The power curves span all the readings of a turbine, only the points with a replayed reading are recalculated
+        # from all their readings. Returns the turbine_id & wind_speed_bin of the recalculated points, the other
+        # readings of the chunk are merged into their points
+        bin_width = AppConfig.POWER_CURVE_BIN_WIDTH
+        points_df = pd.DataFrame({
+            'turbine_id': replayed_df['turbine_id'].astype('int64'),
+            'wind_speed_bin': np.floor(replayed_df['wind_speed'].astype('float64') / bin_width).astype('int64'),
+        }).drop_duplicates(ignore_index=True)
+        if self.power_curve_upsert is None or points_df.empty:
+            return points_df
+
+        # The readings of the bins of the points, narrowed down to the points
+        readings_query = select(CleanedReadingEntity.turbine_id, CleanedReadingEntity.wind_speed,
+                                CleanedReadingEntity.power_output).where(
+            CleanedReadingEntity.pipeline_version == pipeline_version,
+            CleanedReadingEntity.turbine_id.in_(points_df['turbine_id'].unique().tolist()),
+            CleanedReadingEntity.wind_speed >= points_df['wind_speed_bin'].min() * bin_width,
+            CleanedReadingEntity.wind_speed < (points_df['wind_speed_bin'].max() + 1) * bin_width
+        )
+        readings_df = pd.read_sql_query(readings_query, connection)
+        power_curve_df = calculate_power_curve_accumulators(readings_df, bin_width).merge(points_df)
+
+        point_keys = list(points_df.itertuples(index=False, name=None))
+        connection.execute(delete(PowerCurveEntity).where(
+            PowerCurveEntity.pipeline_version == pipeline_version,
+            tuple_(PowerCurveEntity.turbine_id, PowerCurveEntity.wind_speed_bin).in_(point_keys)
+        ))
+        self.merge_power_curves(connection, pipeline_version, power_curve_df)
+        return points_df
+
+    def merge_power_curves(self, connection, pipeline_version, power_curve_df):
+        # Same as the accumulators, only maintained on databases with an ON CONFLICT clause
+        if self.power_curve_upsert is None or power_curve_df.empty:
+            return
+
+        power_curve_df = power_curve_df.assign(pipeline_version=pipeline_version)
+        self.execute_upsert(connection, self.power_curve_upsert, power_curve_df)
+
+    def fetch_power_curves(self, pipeline_version, turbine_ids=None):
+        query = select(PowerCurveEntity.turbine_id, PowerCurveEntity.wind_speed_bin, PowerCurveEntity.reading_count,
+                       PowerCurveEntity.power_sum).where(PowerCurveEntity.pipeline_version == pipeline_version)
+        if turbine_ids is not None:
+            query = query.where(PowerCurveEntity.turbine_id.in_(turbine_ids))
+
+        with self.engine.connect() as connection:
+            return pd.read_sql_query(query, connection)
+
+    def merge_all_reading_rollups(self, connection, pipeline_version, cleaned_df):
+        # Only the hourly rollups are calculated from the readings, the daily ones are rolled up from the hourly ones &
+        # the monthly ones from the daily ones
+        if self.rollup_upsert is None or cleaned_df.empty:
+            return
+
+        for rollup_level, rollups_df in calculate_all_rollups(cleaned_df).items():
+            self.merge_reading_rollups(connection, pipeline_version, rollup_level, rollups_df)
+
+    def merge_reading_rollups(self, connection, pipeline_version, rollup_level, rollups_df):
+        if self.rollup_upsert is None or rollups_df.empty:
+            return
+
+        rollups_df = rollups_df.assign(pipeline_version=pipeline_version, rollup_level=rollup_level)
+        self.execute_upsert(connection, self.rollup_upsert, rollups_df)
+
+    def recalculate_reading_rollups(self, connection, pipeline_version, cleaned_df):
+        # The hours of a replayed chunk are recalculated from their readings, then the days from the recalculated hours
+        # & the months from the recalculated days
+        if self.rollup_upsert is None or cleaned_df.empty:
+            return
+
+        turbine_ids = cleaned_df['turbine_id'].unique().tolist()
+        for finer_level, rollup_level in zip([None, *ROLLUP_LEVELS], ROLLUP_LEVELS):
+            from_date, to_date = rollup_bucket_range(cleaned_df['timestamp'], rollup_level)
+
+            if finer_level is None:
+                readings_query = select(CleanedReadingEntity.turbine_id, CleanedReadingEntity.timestamp,
+                                        CleanedReadingEntity.wind_speed, CleanedReadingEntity.wind_direction,
+                                        CleanedReadingEntity.power_output).where(
+                    CleanedReadingEntity.pipeline_version == pipeline_version,
+                    CleanedReadingEntity.timestamp >= from_date,
+                    CleanedReadingEntity.timestamp < to_date,
+                    CleanedReadingEntity.turbine_id.in_(turbine_ids)
+                )
+                rollups_df = calculate_hourly_rollups(pd.read_sql_query(readings_query, connection,
+                                                                        parse_dates=['timestamp']))
+            else:
+                finer_rollups_df = pd.read_sql_query(
+                    reading_rollups_query(pipeline_version, finer_level, from_date, to_date, turbine_ids), connection,
+                    parse_dates=['bucket_start'])
+                rollups_df = roll_up(finer_rollups_df, rollup_level)
+
+            connection.execute(delete(ReadingRollupEntity).where(
+                ReadingRollupEntity.pipeline_version == pipeline_version,
+                ReadingRollupEntity.rollup_level == rollup_level,
+                ReadingRollupEntity.bucket_start >= from_date,
+                ReadingRollupEntity.bucket_start < to_date,
+                ReadingRollupEntity.turbine_id.in_(turbine_ids)
+            ))
+            self.merge_reading_rollups(connection, pipeline_version, rollup_level, rollups_df)
+
+    def fetch_reading_rollups(self, pipeline_version, rollup_level, from_date, to_date, turbine_ids=None):
+        with self.engine.connect() as connection:
+            return pd.read_sql_query(reading_rollups_query(pipeline_version, rollup_level, from_date, to_date,
+                                                           turbine_ids), connection, parse_dates=['bucket_start'])
+
+    def fetch_statistics_accumulators(self, pipeline_version, from_date, to_date):
+        query = select(StatisticsAccumulatorEntity.__table__).where(
+            StatisticsAccumulatorEntity.pipeline_version == pipeline_version,
+            StatisticsAccumulatorEntity.window_start >= from_date,
+            StatisticsAccumulatorEntity.window_start < to_date
+        )
+
+        with self.engine.connect() as connection:
+            return pd.read_sql_query(query, connection, parse_dates=['window_start'])
+
+    def rebuild_statistics_accumulators(self, pipeline_version, slice_days=7):
+        # Rebuilds the accumulators, the power curves & the rollups switched on in the config from the cleaned readings
+        # loaded before they were maintained by the ETL, or after power_curve_bin_width changed, reading slice_days of
+        # readings at a time. The ones switched off are only removed. The ETL must not be running at the same time
+        min_timestamp, max_timestamp = self.fetch_min_max_cleaned_readings_timestamp(pipeline_version)
+
+        with self.engine.begin() as connection:
+            connection.execute(delete(StatisticsAccumulatorEntity).where(
+                StatisticsAccumulatorEntity.pipeline_version == pipeline_version))
+            connection.execute(delete(PowerCurveEntity).where(PowerCurveEntity.pipeline_version == pipeline_version))
+            connection.execute(delete(ReadingRollupEntity).where(
+                ReadingRollupEntity.pipeline_version == pipeline_version))
+
+        if not min_timestamp:
+            return
+
+        from_date = min_timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+        while from_date <= max_timestamp:
+            to_date = from_date + timedelta(days=slice_days)
+            df = self.fetch_cleaned_readings(pipeline_version, from_date, to_date)
+            with self.engine.begin() as connection:
+                if self.accumulator_upsert is not None:
+                    self.merge_statistics_accumulators(connection, pipeline_version, calculate_accumulators(df))
+                if self.power_curve_upsert is not None:
+                    self.merge_power_curves(connection, pipeline_version,
+                                            calculate_power_curve_accumulators(df, AppConfig.POWER_CURVE_BIN_WIDTH))
+                self.merge_all_reading_rollups(connection, pipeline_version, df)
+            print(f"Rebuilt statistics accumulators, power curves & rollups from {from_date} to {to_date}")
+            from_date = to_date
+
+    def fetch_statistics_controls(self, pipeline_version, stats_version):
+        # The latest statistics_control row of every window of the versions
+        query = select(func.max(StatisticsControlEntity.id).label('statistics_control_id'),
+                       StatisticsControlEntity.from_date, StatisticsControlEntity.to_date).where(
+            StatisticsControlEntity.pipeline_version == pipeline_version,
+            StatisticsControlEntity.stats_version == stats_version
+        ).group_by(StatisticsControlEntity.from_date, StatisticsControlEntity.to_date).order_by(
+            StatisticsControlEntity.from_date, StatisticsControlEntity.to_date)
+
+        with self.engine.connect() as connection:
+            return pd.read_sql_query(query, connection, parse_dates=['from_date', 'to_date'])
+
+    def fetch_statistics(self, stats_control_ids):
+        query = select(StatisticsEntity.statistics_control_id, StatisticsEntity.turbine_id, StatisticsEntity.min_power,
+                       StatisticsEntity.max_power, StatisticsEntity.average, StatisticsEntity.std_deviation,
+                       StatisticsEntity.has_anomaly_reading).where(
+            StatisticsEntity.statistics_control_id.in_(stats_control_ids)
+        ).order_by(StatisticsEntity.statistics_control_id, StatisticsEntity.turbine_id)
+
+        with self.engine.connect() as connection:
+            return pd.read_sql_query(query, connection)
 
     def fetch_latest_statistics_control(self, pipeline_version, stats_version):
         session_factory = self.Session
@@ -105,61 +531,167 @@ class DatabaseManager:
 
     def fetch_min_max_cleaned_readings_timestamp(self, pipeline_version):
         with self.engine.connect() as connection:
-            query_to_fetch_min_max = text("""
-                SELECT
-                    MIN(cr.timestamp) AS min_timestamp,
-                    MAX(cr.timestamp) AS max_timestamp
-                FROM cleaned_reading cr
-                JOIN load_control lc ON cr.load_id = lc.id
-                WHERE lc.pipeline_version = :pipeline_version
-            """)
-            result = connection.execute(query_to_fetch_min_max, {'pipeline_version': pipeline_version})
+            result = connection.execute(MIN_MAX_CLEANED_READINGS_TIMESTAMP_QUERY,
+                                        {'pipeline_version': pipeline_version})
             row = result.first()
 
             return tuple(map_to_timestamp(value) for value in row)
 
-    def fetch_cleaned_readings(self, pipeline_version, from_date, to_date):
-        with self.engine.connect() as connection:
-            query = text("""
-                    SELECT
-                        cr.id,
-                        cr.load_id,
-                        cr.turbine_id,
-                        cr.timestamp,
-                        cr.wind_speed,
-                        cr.wind_direction,
-                        cr.power_output,
-                        cr.is_imputed
-                    FROM cleaned_reading cr
-                    JOIN load_control lc ON cr.load_id = lc.id
-                    WHERE cr.timestamp >= :from_date
-                        AND cr.timestamp < :to_date
-                        AND lc.pipeline_version = :pipeline_version
-                """)
+    def fetch_cleaned_readings(self, pipeline_version, from_date, to_date, turbine_shard=None, turbine_shards=1):
+        # With a turbine_shard only the readings of the turbines with turbine_id % turbine_shards == turbine_shard
+        params = {'from_date': from_date, 'to_date': to_date, 'pipeline_version': pipeline_version}
+        query = CLEANED_READINGS_QUERY
+        if turbine_shard is not None:
+            query = CLEANED_READINGS_SHARD_QUERY
+            params.update(turbine_shard=turbine_shard, turbine_shards=turbine_shards)
 
+        with self.engine.connect() as connection:
             # Execute the query and fetch the result as a pandas DataFrame
-            result_df = pd.read_sql_query(query, self.engine, params={'from_date': from_date, 'to_date': to_date,
-                                                                      'pipeline_version': pipeline_version})
+            result_df = pd.read_sql_query(query, connection, params=params)
 
             return result_df
 
-    def store_stats(self, pipeline_version, stats_version, from_date, to_date, stats_df):
-        session_factory = self.Session
-        new_session = session_factory()
+    def iter_cleaned_power_outputs(self, pipeline_version, from_date, to_date, chunk_size):
+        # Yields the turbine & power output of the readings of the window in DataFrames of at most chunk_size rows.
+        # stream_results makes PostgreSQL use a server-side cursor instead of buffering the whole result, SQLite steps
+        # through the result as it is read
+        with self.engine.connect() as connection:
+            connection = connection.execution_options(stream_results=True, max_row_buffer=chunk_size)
+            yield from pd.read_sql_query(CLEANED_POWER_OUTPUTS_QUERY, connection, chunksize=chunk_size,
+                                         params={'from_date': from_date, 'to_date': to_date,
+                                                 'pipeline_version': pipeline_version})
 
-        with self.session_scope(new_session) as session:
-            stats_control_entity = StatisticsControlEntity(
-                pipeline_version=pipeline_version,
-                stats_version=stats_version,
-                from_date=from_date,
-                to_date=to_date
-            )
-            session.add(stats_control_entity)
-            session.commit()
-            stats_id = stats_control_entity.id
-            stats_df['statistics_control_id'] = stats_id
-            stats_df.to_sql(StatisticsEntity.__tablename__, con=self.engine, if_exists='append', index=False,
-                            method='multi', chunksize=1000)
+    def explain_hot_queries(self, pipeline_version, from_date, to_date):
+        # SQLite describes the plan with EXPLAIN QUERY PLAN, the other databases use EXPLAIN
+        explain = 'EXPLAIN QUERY PLAN' if self.engine.dialect.name == 'sqlite' else 'EXPLAIN'
+        params = {'pipeline_version': pipeline_version, 'from_date': from_date, 'to_date': to_date}
+
+        query_plans = {}
+        with self.engine.connect() as connection:
+            for query_name, query in HOT_QUERIES.items():
+                result = connection.execute(text(f"{explain} {query.text}"), params)
+                query_plans[query_name] = [' | '.join(str(value) for value in row) for row in result]
+
+        return query_plans
+
+    def store_stats(self, pipeline_version, stats_version, from_date, to_date, stats_df, anomalies_df=None):
+        # The statistics_control row, the statistics & the anomaly readings of the window are committed in the same
+        # transaction
+        with self.engine.begin() as connection:
+            stats_control_id = self.store_statistics_control(connection, pipeline_version, stats_version, from_date,
+                                                             to_date)
+            stats_df['statistics_control_id'] = stats_control_id
+            self.bulk_writer.write(connection, StatisticsEntity.__tablename__, stats_df,
+                                   UNIQUE_KEYS[StatisticsEntity.__tablename__])
+
+            if anomalies_df is not None:
+                self.replace_anomaly_readings(connection, [stats_control_id],
+                                              anomalies_df.assign(statistics_control_id=stats_control_id))
+
+        self.notify_statistics_listeners(pipeline_version, stats_version, [(from_date, to_date)])
+
+    def replace_anomaly_readings(self, connection, stats_control_ids, anomalies_df):
+        # The anomalies of a window created again replace the ones found before, which may be of another engine
+        connection.execute(delete(AnomalyReadingEntity).where(
+            AnomalyReadingEntity.statistics_control_id.in_(stats_control_ids)))
+        if not anomalies_df.empty:
+            self.bulk_writer.write(connection, AnomalyReadingEntity.__tablename__, anomalies_df)
+
+    def store_statistics_control(self, connection, pipeline_version, stats_version, from_date, to_date):
+        # The stats of a window created again, eg when a failed run is repeated, reuse its statistics_control row & the
+        # statistics of its turbines are updated
+        stats_control_id = connection.execute(select(StatisticsControlEntity.id).where(
+            StatisticsControlEntity.pipeline_version == pipeline_version,
+            StatisticsControlEntity.stats_version == stats_version,
+            StatisticsControlEntity.from_date == from_date,
+            StatisticsControlEntity.to_date == to_date
+        ).order_by(desc(StatisticsControlEntity.id)).limit(1)).scalar()
+        if stats_control_id is not None:
+            return stats_control_id
+
+        result = connection.execute(insert(StatisticsControlEntity).values(
+            pipeline_version=pipeline_version,
+            stats_version=stats_version,
+            from_date=from_date,
+            to_date=to_date
+        ))
+        return result.inserted_primary_key[0]
+
+    def store_window_stats(self, pipeline_version, stats_version, windows, stats_df, anomalies_df=None):
+        # The statistics_control rows of all the windows, their statistics & anomaly readings are written in one
+        # transaction. The window_index column of stats_df & anomalies_df is the position of the window of each row in
+        # windows
+        with self.engine.begin() as connection:
+            stats_control_ids = [self.store_statistics_control(connection, pipeline_version, stats_version, from_date,
+                                                               to_date)
+                                 for from_date, to_date in windows]
+
+            stats_df['statistics_control_id'] = np.asarray(stats_control_ids)[stats_df['window_index'].to_numpy()]
+            self.bulk_writer.write(connection, StatisticsEntity.__tablename__, stats_df.drop(columns='window_index'),
+                                   UNIQUE_KEYS[StatisticsEntity.__tablename__])
+
+            if anomalies_df is not None:
+                self.replace_anomaly_readings(connection, stats_control_ids, anomalies_df.assign(
+                    statistics_control_id=np.asarray(stats_control_ids)[anomalies_df['window_index'].to_numpy()]
+                ).drop(columns='window_index'))
+
+        self.notify_statistics_listeners(pipeline_version, stats_version, windows)
+
+
+class LoadBatch:
+    # Commits the loads of chunks_per_commit chunks in one transaction, saving a commit & its fsync per chunk. A crash
+    # rolls back the whole batch, the checkpoints in load_control only move with the readings so the chunks of the
+    # batch are replayed by the next run
+    def __init__(self, db_manager, chunks_per_commit=1):
+        self.db_manager = db_manager
+        self.chunks_per_commit = max(chunks_per_commit, 1)
+        self.connection = None
+        self.transaction = None
+        self.chunk_count = 0
+
+    def load_cleaned_data(self, pipeline_version, cleaned_df, file_name, last_loaded_line_number,
+                          last_loaded_byte_offset=None, cleaning_statistics_df=None, pending_df=None,
+                          pending_dropped=False):
+        if self.connection is None:
+            self.connection = self.db_manager.engine.connect()
+            self.transaction = self.connection.begin()
+
+        self.db_manager.write_cleaned_data(self.connection, pipeline_version, cleaned_df, file_name,
+                                           last_loaded_line_number, last_loaded_byte_offset, cleaning_statistics_df,
+                                           pending_df, pending_dropped)
+        self.chunk_count += 1
+        if self.chunk_count >= self.chunks_per_commit:
+            self.commit()
+
+    def commit(self):
+        if self.connection is not None:
+            self.transaction.commit()
+        self.close()
+
+    def rollback(self):
+        if self.connection is not None:
+            self.transaction.rollback()
+        self.close()
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+        self.connection = None
+        self.transaction = None
+        self.chunk_count = 0
+
+
+def pool_settings():
+    # Only the pool settings set in the config are passed to create_engine, the others keep the defaults of the pool
+    # SQLAlchemy picks for the database
+    settings = {
+        'pool_size': AppConfig.POOL_SIZE,
+        'max_overflow': AppConfig.MAX_OVERFLOW,
+        'pool_timeout': AppConfig.POOL_TIMEOUT,
+        'pool_recycle': AppConfig.POOL_RECYCLE,
+        'pool_pre_ping': AppConfig.POOL_PRE_PING,
+    }
+    return {name: value for name, value in settings.items() if value is not None}
 
 
 def load_control_to_entity(load_control):
@@ -168,6 +700,7 @@ def load_control_to_entity(load_control):
         pipeline_version=load_control.pipeline_version,
         input_file_name=load_control.input_file_name,
         last_loaded_line_number=load_control.last_loaded_line_number,
+        last_loaded_byte_offset=load_control.last_loaded_byte_offset,
         load_timestamp=load_control.load_timestamp
     )
 
@@ -178,6 +711,7 @@ def entity_to_load_control(load_control_entity):
         pipeline_version=load_control_entity.pipeline_version,
         input_file_name=load_control_entity.input_file_name,
         last_loaded_line_number=load_control_entity.last_loaded_line_number,
+        last_loaded_byte_offset=load_control_entity.last_loaded_byte_offset,
         load_timestamp=load_control_entity.load_timestamp
     )
 
@@ -202,7 +736,52 @@ def entity_to_stats_control(stats_control_entity):
     )
 
 
+def reading_rollups_query(pipeline_version, rollup_level, from_date, to_date, turbine_ids=None):
+    query = select(ReadingRollupEntity.__table__).where(
+        ReadingRollupEntity.pipeline_version == pipeline_version,
+        ReadingRollupEntity.rollup_level == rollup_level,
+        ReadingRollupEntity.bucket_start >= from_date,
+        ReadingRollupEntity.bucket_start < to_date
+    )
+    if turbine_ids is not None:
+        query = query.where(ReadingRollupEntity.turbine_id.in_(turbine_ids))
+    return query
+
+
+def create_accumulator_upsert(dialect_name, table, key_columns, summed_columns=()):
+    # Merging into an existing accumulator uses the same formulas as merge_accumulators, the summed_columns are added
+    dialect_functions = {
+        'sqlite': (sqlite.insert, func.min, func.max),
+        'postgresql': (postgresql.insert, func.least, func.greatest),
+    }
+    if dialect_name not in dialect_functions:
+        return None
+
+    dialect_insert, least, greatest = dialect_functions[dialect_name]
+    statement = dialect_insert(table)
+    new = statement.excluded
+
+    reading_count = table.c.reading_count + new.reading_count
+    mean_difference = new.power_sum / new.reading_count - table.c.power_sum / table.c.reading_count
+
+    return statement.on_conflict_do_update(
+        index_elements=[table.c[column] for column in key_columns],
+        set_={
+            **{column: table.c[column] + new[column] for column in summed_columns},
+            'reading_count': reading_count,
+            'power_sum': table.c.power_sum + new.power_sum,
+            'power_m2': (table.c.power_m2 + new.power_m2 +
+                         mean_difference * mean_difference * table.c.reading_count * new.reading_count / reading_count),
+            'min_power': least(table.c.min_power, new.min_power),
+            'max_power': greatest(table.c.max_power, new.max_power),
+        }
+    )
+
+
 def map_to_timestamp(time_in_str):
+    # MIN & MAX are NULL when there are no readings
+    if time_in_str is None:
+        return None
     return datetime.strptime(time_in_str, "%Y-%m-%d %H:%M:%S.%f")
 
 
@@ -0,0 +1,172 @@
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import delete, func, select, text, union
+
+from src.database.database_schema import LoadControlEntity, CleaningStatisticsEntity, CleanedReadingEntity, \
+    StatisticsControlEntity, StatisticsEntity, AnomalyReadingEntity, StatisticsAccumulatorEntity, PowerCurveEntity, \
+    ReadingRollupEntity, PendingReadingEntity
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Zstandard compresses the readings far better than the default Snappy for a similar speed
+ARCHIVE_COMPRESSION = 'zstd'
+
+
+def pipeline_version_filters(pipeline_version):
+    # The rows of every table belonging to a pipeline version, the children before their parents so no foreign key is
+    # left dangling between two batches
+    stats_control_ids = select(StatisticsControlEntity.id).where(
+        StatisticsControlEntity.pipeline_version == pipeline_version)
+    load_ids = select(LoadControlEntity.id).where(LoadControlEntity.pipeline_version == pipeline_version)
+
+    return [
+        (AnomalyReadingEntity.__table__, AnomalyReadingEntity.statistics_control_id.in_(stats_control_ids)),
+        (StatisticsEntity.__table__, StatisticsEntity.statistics_control_id.in_(stats_control_ids)),
+        (StatisticsControlEntity.__table__, StatisticsControlEntity.pipeline_version == pipeline_version),
+        (StatisticsAccumulatorEntity.__table__, StatisticsAccumulatorEntity.pipeline_version == pipeline_version),
+        (PowerCurveEntity.__table__, PowerCurveEntity.pipeline_version == pipeline_version),
+        (ReadingRollupEntity.__table__, ReadingRollupEntity.pipeline_version == pipeline_version),
+        (CleanedReadingEntity.__table__, CleanedReadingEntity.pipeline_version == pipeline_version),
+        (PendingReadingEntity.__table__, PendingReadingEntity.pipeline_version == pipeline_version),
+        (CleaningStatisticsEntity.__table__, CleaningStatisticsEntity.load_id.in_(load_ids)),
+        (LoadControlEntity.__table__, LoadControlEntity.pipeline_version == pipeline_version),
+    ]
+
+
+def superseded_pipeline_versions(db_manager, pipeline_version, keep_versions=0):
+    # The versions loaded before the current one, except the keep_versions latest of them
+    query = union(select(LoadControlEntity.pipeline_version), select(CleanedReadingEntity.pipeline_version),
+                  select(StatisticsControlEntity.pipeline_version))
+    with db_manager.engine.connect() as connection:
+        versions = sorted(int(version) for version, in connection.execute(query) if version is not None)
+
+    superseded_versions = [version for version in versions if version < int(pipeline_version)]
+    return superseded_versions[:max(len(superseded_versions) - keep_versions, 0)]
+
+
+def count_pipeline_version_rows(db_manager, pipeline_version):
+    with db_manager.engine.connect() as connection:
+        return {table.name: connection.execute(select(func.count()).select_from(table).where(row_filter)).scalar()
+                for table, row_filter in pipeline_version_filters(pipeline_version)}
+
+
+def compact_pipeline_versions(db_manager, pipeline_versions, archive_directory=None, batch_rows=50000,
+                              columnar_store_directory=None):
+    # Removes the rows of the pipeline versions from every table, batch_rows rows per transaction in id order so the
+    # database is never locked for long & an interrupted compaction is resumed by running it again. With an
+    # archive_directory every batch is first written to a compressed file. The space is then reclaimed & the planner
+    # statistics refreshed for the live rows
+    report = {'tables': {}, 'archived_bytes': 0, 'columnar_store_bytes': 0,
+              'database_bytes_before': database_size_bytes(db_manager.engine)}
+
+    for pipeline_version in pipeline_versions:
+        for table, row_filter in pipeline_version_filters(pipeline_version):
+            table_directory = None
+            if archive_directory:
+                table_directory = os.path.join(archive_directory, f"pipeline_version={pipeline_version}", table.name)
+
+            rows, archived_bytes = compact_table(db_manager.engine, table, row_filter, table_directory, batch_rows)
+            report['tables'][table.name] = report['tables'].get(table.name, 0) + rows
+            report['archived_bytes'] += archived_bytes
+            if rows:
+                print(f"Removed {rows} rows of pipeline version {pipeline_version} from {table.name}")
+
+        if columnar_store_directory:
+            report['columnar_store_bytes'] += compact_columnar_store(columnar_store_directory, pipeline_version,
+                                                                     archive_directory)
+
+    reclaim_space(db_manager.engine)
+    report['database_bytes_after'] = database_size_bytes(db_manager.engine)
+    return report
+
+
+def compact_table(engine, table, row_filter, table_directory=None, batch_rows=50000):
+    # The rows of a batch are the next batch_rows rows matching the filter by id, so the batch is deleted by its id
+    # range without a list of ids
+    rows = 0
+    archived_bytes = 0
+    while True:
+        with engine.begin() as connection:
+            batch_df = pd.read_sql_query(select(table).where(row_filter).order_by(table.c.id).limit(batch_rows),
+                                         connection)
+            if batch_df.empty:
+                return rows, archived_bytes
+
+            first_id, last_id = int(batch_df['id'].iloc[0]), int(batch_df['id'].iloc[-1])
+            if table_directory:
+                archived_bytes += archive_batch(batch_df, table_directory, f"part-{first_id:012d}-{last_id:012d}")
+
+            connection.execute(delete(table).where(row_filter, table.c.id >= first_id, table.c.id <= last_id))
+            rows += len(batch_df)
+
+
+def archive_batch(batch_df, table_directory, file_stem):
+    # Parquet when pyarrow is installed, compressed NumPy archives otherwise. Written to a temporary file first so an
+    # archive file is always complete, a batch archived again after an interrupted compaction replaces its file
+    os.makedirs(table_directory, exist_ok=True)
+    if pa is not None:
+        path = os.path.join(table_directory, f"{file_stem}.parquet")
+        temporary_path = f"{path}.tmp"
+        pq.write_table(pa.Table.from_pandas(batch_df, preserve_index=False), temporary_path,
+                       compression=ARCHIVE_COMPRESSION)
+    else:
+        path = os.path.join(table_directory, f"{file_stem}.npz")
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, 'wb') as archive_file:
+            np.savez_compressed(archive_file, **{
+                column: batch_df[column].to_numpy(dtype=str if batch_df[column].dtype == object else None)
+                for column in batch_df.columns})
+    os.replace(temporary_path, path)
+
+    return os.path.getsize(path)
+
+
+def compact_columnar_store(columnar_store_directory, pipeline_version, archive_directory=None):
+    # The partitions of the version are already compressed columnar files, they are moved to the archive as they are
+    pipeline_directory = os.path.join(columnar_store_directory, f"pipeline_version={pipeline_version}")
+    if not os.path.isdir(pipeline_directory):
+        return 0
+
+    directory_bytes = sum(os.path.getsize(os.path.join(directory, file_name))
+                          for directory, _, file_names in os.walk(pipeline_directory) for file_name in file_names)
+    if archive_directory:
+        archived_directory = os.path.join(archive_directory, f"pipeline_version={pipeline_version}", 'columnar_store')
+        shutil.rmtree(archived_directory, ignore_errors=True)
+        os.makedirs(os.path.dirname(archived_directory), exist_ok=True)
+        shutil.move(pipeline_directory, archived_directory)
+    else:
+        shutil.rmtree(pipeline_directory)
+
+    print(f"Removed {directory_bytes} bytes of pipeline version {pipeline_version} from the columnar store")
+    return directory_bytes
+
+
+def reclaim_space(engine):
+    # VACUUM can not run in a transaction. SQLite only returns the freed pages to the file system on VACUUM,
+    # PostgreSQL makes them reusable, and both refresh the planner statistics on ANALYZE
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        if engine.dialect.name == 'sqlite':
+            connection.execute(text("VACUUM"))
+            connection.execute(text("ANALYZE"))
+        elif engine.dialect.name == 'postgresql':
+            connection.execute(text("VACUUM ANALYZE"))
+        else:
+            connection.execute(text("ANALYZE"))
+
+
+def database_size_bytes(engine):
+    # None for the databases the size is not known of
+    with engine.connect() as connection:
+        if engine.dialect.name == 'sqlite':
+            page_count = connection.execute(text("PRAGMA page_count")).scalar()
+            return page_count * connection.execute(text("PRAGMA page_size")).scalar()
+        if engine.dialect.name == 'postgresql':
+            return connection.execute(text("SELECT pg_database_size(current_database())")).scalar()
+    return None
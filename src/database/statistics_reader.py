@@ -0,0 +1,114 @@
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from src.config import AppConfig
+
+STATISTICS_COLUMNS = ['from_date', 'to_date', 'turbine_id', 'min_power', 'max_power', 'average', 'std_deviation',
+                      'has_anomaly_reading']
+
+
+class StatisticsReader:
+    # Reads the statistics of turbines & date ranges for the dashboards. The statistics of every window read are cached
+    # by (pipeline_version, stats_version, window) & the least recently read windows are evicted once more than
+    # cache_windows are cached, so repeated queries are served from memory. The windows of the versions are cached
+    # too. The statistics stored by the DatabaseManager of this process invalidate the cached windows of their versions,
+    # the statistics stored by other processes are only read after clear()
+    def __init__(self, db_manager, cache_windows=None):
+        self.db_manager = db_manager
+        self.cache_windows = AppConfig.READER_CACHE_WINDOWS if cache_windows is None else cache_windows
+        self.lock = threading.Lock()
+        self.windows = {}
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        db_manager.add_statistics_listener(self.invalidate)
+
+    def close(self):
+        self.db_manager.remove_statistics_listener(self.invalidate)
+        self.clear()
+
+    def read_statistics(self, pipeline_version, stats_version, from_date, to_date, turbine_ids=None):
+        # The statistics of the windows starting from from_date & before to_date, of all the turbines or of
+        # turbine_ids, ordered by window & turbine
+        versions = (str(pipeline_version), str(stats_version))
+        windows_df = self.fetch_windows(versions)
+        windows_df = windows_df[(windows_df['from_date'] >= pd.Timestamp(from_date)) &
+                                (windows_df['from_date'] < pd.Timestamp(to_date))]
+
+        window_stats = self.fetch_window_stats(versions, windows_df)
+        if not window_stats:
+            return pd.DataFrame(columns=STATISTICS_COLUMNS)
+
+        stats_df = pd.concat(window_stats, ignore_index=True)
+        if turbine_ids is not None:
+            stats_df = stats_df[stats_df['turbine_id'].isin(turbine_ids)].reset_index(drop=True)
+        return stats_df
+
+    def read_statistics_arrays(self, pipeline_version, stats_version, from_date, to_date, turbine_ids=None):
+        # Same as read_statistics as one NumPy array per column
+        stats_df = self.read_statistics(pipeline_version, stats_version, from_date, to_date, turbine_ids)
+        return {column: stats_df[column].to_numpy() for column in STATISTICS_COLUMNS}
+
+    def fetch_windows(self, versions):
+        with self.lock:
+            windows_df = self.windows.get(versions)
+        if windows_df is None:
+            windows_df = self.db_manager.fetch_statistics_controls(*versions)
+            with self.lock:
+                self.windows[versions] = windows_df
+        return windows_df
+
+    def fetch_window_stats(self, versions, windows_df):
+        # The cached windows are moved to the end of the cache, the others are fetched with one query
+        window_stats = {}
+        missing_windows = []
+        with self.lock:
+            for window in windows_df.itertuples(index=False):
+                key = (*versions, window.from_date, window.to_date)
+                if key in self.cache:
+                    self.cache.move_to_end(key)
+                    window_stats[key] = self.cache[key]
+                    self.hits += 1
+                else:
+                    missing_windows.append(window)
+                    self.misses += 1
+
+        if missing_windows:
+            missing_windows_df = pd.DataFrame(missing_windows)
+            stats_df = self.db_manager.fetch_statistics(missing_windows_df['statistics_control_id'].tolist())
+            stats_df['has_anomaly_reading'] = stats_df['has_anomaly_reading'].astype(bool)
+            stats_df = missing_windows_df.merge(stats_df, on='statistics_control_id')
+
+            grouped = dict(list(stats_df.groupby('statistics_control_id', sort=False)))
+            with self.lock:
+                for window in missing_windows_df.itertuples(index=False):
+                    key = (*versions, window.from_date, window.to_date)
+                    window_df = grouped.get(window.statistics_control_id, stats_df.iloc[:0])
+                    window_stats[key] = window_df[STATISTICS_COLUMNS].reset_index(drop=True)
+                    self.cache[key] = window_stats[key]
+                    self.cache.move_to_end(key)
+                while len(self.cache) > self.cache_windows:
+                    self.cache.popitem(last=False)
+
+        return [window_stats[(*versions, window.from_date, window.to_date)]
+                for window in windows_df.itertuples(index=False)]
+
+    def invalidate(self, pipeline_version, stats_version, windows):
+        # New windows change the windows of the versions, windows created again change their statistics
+        versions = (str(pipeline_version), str(stats_version))
+        with self.lock:
+            self.windows.pop(versions, None)
+            for from_date, to_date in windows:
+                self.cache.pop((*versions, pd.Timestamp(from_date), pd.Timestamp(to_date)), None)
+
+    def clear(self):
+        with self.lock:
+            self.windows = {}
+            self.cache.clear()
+
+    def cache_info(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'windows': len(self.cache),
+                    'cache_windows': self.cache_windows}
@@ -10,6 +10,7 @@ class LoadControl:
     last_loaded_line_number: int
     id: Optional[int] = None
     load_timestamp: Optional[datetime] = None
+    last_loaded_byte_offset: Optional[int] = None
 
 
 @dataclass(frozen=True)
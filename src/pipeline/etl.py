@@ -1,75 +1,440 @@
 import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
 from src.config import AppConfig
+from src.database.columnar_store import create_columnar_store
 from src.database.persistence import DatabaseManager
+from src.pipeline.reader import iter_raw_chunks, parse_chunk
+from src.util.instrumentation import METRICS, instrumented, timed_stage
+from src.util.resources import peak_rss_bytes
+
+
+NUMERIC_COLUMNS = ['turbine_id', 'wind_speed', 'wind_direction', 'power_output']
+IMPUTED_COLUMNS = ['wind_speed', 'wind_direction', 'power_output']
+
+# Compact types of the cleaned readings. The speeds & power stay float64, as float32 they would not round trip to the
+# values of the input file, eg 11.8 would be stored as 11.800000190734863
+CLEANED_DTYPES = {
+    'timestamp': 'datetime64[ns]',
+    'turbine_id': 'int32',
+    'wind_speed': 'float64',
+    'wind_direction': 'int16',
+    'power_output': 'float64',
+}
+
+# Put in the queues of the pipelined ETL after the last chunk
+END_OF_CHUNKS = object()
+
+# Valid ranges of the readings (which can be set & retrieved from config)
+VALID_RANGES = {
+    'wind_speed': (0.00, 100.00),
+    'wind_direction': (0, 360),
+    'power_output': (0.00, 50.00),
+}
+
+
+class StageFailure:
+    # Passed down the queues of the pipelined ETL when a stage fails, the writer raises the exception
+    def __init__(self, exception):
+        self.exception = exception
+
+
+class ImputationState:
+    # Readings at the end of a chunk with missing values that no later reading of the same turbine in the chunk could
+    # fill. They are held back & imputed together with the next chunk of the same file. They are stored with the
+    # load_control checkpoint of every chunk, so the next run of the file resumes with them. Readings still held back
+    # when the file ends are counted as dropped, see drop_pending_readings
+    def __init__(self):
+        self.pending_df = None
+
+
+def clean_data(df, imputation_state=None):
+    return clean_data_with_statistics(df, imputation_state)[0]
+
+
+def clean_data_with_statistics(df, imputation_state=None):
+    return impute_and_validate_with_statistics(coerce_types(df), imputation_state)
+
+
+def coerce_types(df, timestamp_format=None):
+    # Convert 'timestamp' column to datetime format & the numeric columns, invalid values become NaT/NaN
+    # With a fixed timestamp format pandas does not have to infer the format of the chunk first. Columns already parsed
+    # as numbers by the reader are returned as they are by to_numeric
+    # The rows with invalid timestamp or invalid turbine id are dropped & counted when the readings are validated
+    timestamps = pd.to_datetime(df['timestamp'], format=timestamp_format, errors='coerce')
+    numeric_values = {column: pd.to_numeric(df[column], errors='coerce') for column in NUMERIC_COLUMNS}
+
+    return pd.DataFrame({'timestamp': timestamps, **numeric_values})
+
+
+def impute_and_validate(df, imputation_state=None):
+    return impute_and_validate_with_statistics(df, imputation_state)[0]
+
+
+@instrumented('clean', rows_in=lambda df, *args: len(df), rows_out=lambda result: len(result[0]))
+def impute_and_validate_with_statistics(df, imputation_state=None):
+    # Returns the cleaned readings & the number of readings dropped or imputed per turbine, action & reason
+    # The readings held back from the previous chunk were validated with that chunk, their imputation is counted with
+    # this one
+    if imputation_state is not None and imputation_state.pending_df is not None and \
+            not imputation_state.pending_df.empty:
+        df = pd.concat([imputation_state.pending_df, df], ignore_index=True)
+    else:
+        df = df.reset_index(drop=True)
 
+    # Every check is a boolean mask over all the readings of the chunk. A dropped reading is only counted for the first
+    # check it fails. Readings with values out of range are dropped before imputing so they are never used to fill
+    # other readings, missing values are imputed below
+    drop_masks = {
+        'INVALID_DATE_TIME': df['timestamp'].isna(),
+        'INVALID_TURBINE_ID': df['turbine_id'].isna(),
+    }
+    for column, (min_value, max_value) in VALID_RANGES.items():
+        drop_masks[f"OUT_OF_RANGE_{column.upper()}"] = ~(df[column].isna() | df[column].between(min_value, max_value))
 
-def clean_data(df):
-    # Convert 'timestamp' column to datetime format
-    df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce')
-    # Drop rows with invalid timestamp
-    df = df.dropna(subset=['timestamp'])
+    action_masks = {}
+    is_dropped = pd.Series(False, index=df.index)
+    for reason, mask in drop_masks.items():
+        action_masks[('DROPPED', reason)] = mask & ~is_dropped
+        is_dropped |= mask
 
-    # Convert numeric columns
-    numeric_columns = ['turbine_id', 'wind_speed', 'wind_direction', 'power_output']
-    df[numeric_columns] = df[numeric_columns].apply(pd.to_numeric, errors='coerce')
-    # Drop rows with invalid turbine id
-    df = df.dropna(subset=['turbine_id'], how='any', axis=0)
-    df['turbine_id'] = df['turbine_id'].astype(int)
+    is_missing_value = df[IMPUTED_COLUMNS].isna() & ~is_dropped.to_numpy()[:, None]
+    valid_df = df[~is_dropped]
 
     # Impute any missing data in wind_speed, wind_direction & power_output
-    # If data is missing, because this is time series data, it makes sense to use the same value for the
-    # previous reading for the same turbine
+    # If data is missing, because this is time series data, it makes sense to use the value of the next reading for
+    # the same turbine
     # For eg: If wind_direction is missing for turbine 5 at 09:00:00, then it makes sense to impute the missing
     # field with value from the next reading for turbine 5 at 10:00:00
-    # For this to work the data for the same turbines
-    df = df.sort_values(by='turbine_id')
-    df = df.bfill()
+    # The readings are sorted once by turbine & timestamp, the sort is stable so readings with the same timestamp keep
+    # the order of the file. The values are only back-filled within the readings of the same turbine
+    valid_df = valid_df.sort_values(by=['turbine_id', 'timestamp'], kind='stable')
+    is_missing = valid_df[IMPUTED_COLUMNS].isna().any(axis=1)
+    valid_df[IMPUTED_COLUMNS] = valid_df.groupby('turbine_id', sort=False)[IMPUTED_COLUMNS].bfill()
+
+    is_unfilled = valid_df[IMPUTED_COLUMNS].isna().any(axis=1)
+    if imputation_state is not None:
+        imputation_state.pending_df = valid_df[is_unfilled]
+    else:
+        # Without a next chunk to wait for, the readings that could not be imputed are dropped
+        action_masks[('DROPPED', 'NOT_IMPUTABLE')] = is_unfilled.reindex(df.index, fill_value=False)
+
+    # Readings held back for the next chunk are neither dropped nor imputed yet
+    is_imputed_value = is_missing_value & ~is_unfilled.reindex(df.index, fill_value=False).to_numpy()[:, None]
+    for column in IMPUTED_COLUMNS:
+        action_masks[('IMPUTED', f"MISSING_{column.upper()}")] = is_imputed_value[column]
 
     # Drop any remaining rows that are unfilled
-    df = df.dropna()
+    cleaned_df = valid_df[~is_unfilled].astype(CLEANED_DTYPES)
+    cleaned_df['is_imputed'] = is_missing[~is_unfilled]
+
+    return cleaned_df, count_cleaning_actions(df['turbine_id'], action_masks)
+
+
+def count_cleaning_actions(turbine_ids, action_masks):
+    # All the masks are summed per turbine in a single groupby, readings with an invalid turbine id are counted under
+    # a null turbine_id
+    counts = pd.DataFrame(action_masks).groupby(turbine_ids, dropna=False).sum()
+    counts = counts.stack([0, 1], future_stack=True).rename_axis(['turbine_id', 'action', 'reason'])
+
+    cleaning_statistics_df = counts[counts > 0].reset_index(name='count')
+    cleaning_statistics_df['turbine_id'] = cleaning_statistics_df['turbine_id'].astype('Int64')
+    return cleaning_statistics_df
+
+
+def coerce_raw_chunk(raw_chunk, csv_engine='c', timestamp_format=None):
+    # Parsing & converting the types are the CPU heavy part of the ETL, this is what runs in the worker processes in
+    # parallel mode. The imputation is done by the writer as it carries readings over from one chunk to the next
+    started = time.perf_counter()
+    df, coercion_errors = parse_chunk(raw_chunk, csv_engine)
+    df = coerce_types(df, timestamp_format)
+    parse_seconds = time.perf_counter() - started
+
+    # Measured in the process that parsed the chunk, ie the worker in parallel mode
+    parse_metrics = {
+        'parse_seconds': parse_seconds,
+        'rows': len(df),
+        'bytes': len(raw_chunk.data),
+        'memory_bytes': int(df.memory_usage(deep=True).sum()),
+        'peak_rss_bytes': peak_rss_bytes(),
+        'coercion_errors': {column: count for column, count in coercion_errors.items() if count},
+    }
+    return df, parse_metrics
+
+
+def format_parse_metrics(raw_chunk, parse_metrics):
+    lines = raw_chunk.end_line_number - raw_chunk.start_line_number + 1
+    parse_seconds = parse_metrics['parse_seconds']
+    lines_per_second = lines / parse_seconds if parse_seconds > 0 else 0.0
+    megabytes_per_second = parse_metrics['bytes'] / 1e6 / parse_seconds if parse_seconds > 0 else 0.0
+
+    message = (f"parsed in {parse_seconds * 1000:.1f}ms ({lines_per_second:.0f} lines/s, "
+               f"{megabytes_per_second:.1f} MB/s), chunk memory {parse_metrics['memory_bytes'] / 1e6:.2f} MB")
+    if parse_metrics['peak_rss_bytes'] is not None:
+        message += f", peak RSS {parse_metrics['peak_rss_bytes'] / 1e6:.1f} MB"
+    if parse_metrics['coercion_errors']:
+        message += f", coercion errors {parse_metrics['coercion_errors']}"
+    return message
+
+
+def fetch_resume_position(db_manager, input_file_name, pipeline_version):
+    load_control_latest = db_manager.fetch_latest_load_control(input_file_name, pipeline_version)
+
+    start_row = 1
+    start_byte_offset = None
+    if load_control_latest:
+        start_row = load_control_latest.last_loaded_line_number + 1
+        start_byte_offset = load_control_latest.last_loaded_byte_offset
+
+    return start_row, start_byte_offset
+
+
+def resume_imputation_state(db_manager, input_file_name, pipeline_version, imputation_state=None):
+    # The readings held back at the last checkpoint of the file, unless they are already held in memory
+    if imputation_state is None:
+        imputation_state = ImputationState()
+    if imputation_state.pending_df is None:
+        imputation_state.pending_df = db_manager.fetch_pending_readings(pipeline_version, input_file_name)
+    return imputation_state
+
+
+def drop_pending_readings(load_batch, pipeline_version, input_file_name, raw_chunk, pending_df):
+    # The readings still held back at the end of a file, ie the last chunk of the run was raw_chunk, are counted as
+    # dropped with a checkpoint at the same line. They stay stored, a later run of the file with lines appended to it
+    # holds them back again & withdraws their drop. Nothing is dropped when no chunk was read by the run
+    if raw_chunk is None or pending_df is None or pending_df.empty:
+        return
 
-    df = df.astype({
-        "timestamp": "datetime64[ns]",
-        "turbine_id": "int64",
-        "wind_speed": "float64",
-        "wind_direction": "int64",
-        "power_output": "float64",
-    })
+    cleaning_statistics_df = count_cleaning_actions(pending_df['turbine_id'], {
+        ('DROPPED', 'NOT_IMPUTABLE'): pd.Series(True, index=pending_df.index)})
+    cleaned_df = pending_df.iloc[:0].astype(CLEANED_DTYPES)
+    cleaned_df['is_imputed'] = pd.Series(dtype=bool)
 
-    # Validate 'wind_speed', wind_direction & power_output values within the specified range(which can be set &
-    # retrieved from config)
-    valid_wind_speed = (df['wind_speed'] >= 0.00) & (df['wind_speed'] <= 100.00)
-    valid_wind_direction = (df['wind_direction'] >= 0) & (df['wind_direction'] <= 360)
-    valid_power_output = (df['power_output'] >= 0.00) & (df['power_output'] <= 50.00)
+    load_batch.load_cleaned_data(pipeline_version, cleaned_df, input_file_name, raw_chunk.end_line_number,
+                                 raw_chunk.end_byte_offset, cleaning_statistics_df, pending_df, pending_dropped=True)
+    print(f"Dropped {len(pending_df)} readings at the end of {input_file_name} that could not be imputed")
 
-    # Filter the DataFrame to include only rows with valid 'wind_speed'
-    df = df[valid_wind_speed & valid_wind_direction & valid_power_output]
 
-    return df
+def load_chunk(load_batch, pipeline_version, input_file_name, raw_chunk, cleaned_df, cleaning_statistics_df,
+               parse_metrics, pending_df=None):
+    # The columnar files are written before load_control is updated, a replayed chunk overwrites them
+    columnar_store = create_columnar_store(AppConfig.COLUMNAR_STORE_DIRECTORY, AppConfig.COLUMNAR_FORMAT)
+    if columnar_store:
+        columnar_store.write_cleaned_readings(pipeline_version, cleaned_df, input_file_name,
+                                              raw_chunk.start_line_number)
+
+    with timed_stage('write', len(cleaned_df)):
+        load_batch.load_cleaned_data(pipeline_version, cleaned_df, input_file_name, raw_chunk.end_line_number,
+                                     raw_chunk.end_byte_offset, cleaning_statistics_df, pending_df)
+
+    # The chunk may have been parsed in a worker process, its read is recorded here from the metrics sent back
+    METRICS.record('read', parse_metrics['parse_seconds'], raw_chunk.end_line_number - raw_chunk.start_line_number + 1,
+                   parse_metrics['rows'])
+
+    print(f"Processed {input_file_name} with rows from {raw_chunk.start_line_number} "
+          f"to {raw_chunk.end_line_number}, {format_parse_metrics(raw_chunk, parse_metrics)}")
 
 
 # TODO Get chunk_size from config
-def do_etl(db_manager, input_file_name, pipeline_version, file_path, chunk_size=1000):
-    while True:
-        load_control_latest = db_manager.fetch_latest_load_control(input_file_name, pipeline_version)
+def do_etl(db_manager, input_file_name, pipeline_version, file_path, chunk_size=1000, chunks_per_commit=1,
+           imputation_state=None, complete_lines_only=False, drop_pending=True):
+    # Returns the min & max timestamp of the readings loaded, None when no reading was loaded. Without drop_pending the
+    # readings held back at the end of the file are left for the lines appended later
+    start_row, start_byte_offset = fetch_resume_position(db_manager, input_file_name, pipeline_version)
+
+    # The watch mode passes the same imputation state for every read of a file, so readings held back at the end of
+    # the file are imputed with the readings appended later without reading them back from the database
+    imputation_state = resume_imputation_state(db_manager, input_file_name, pipeline_version, imputation_state)
+
+    loaded_time_range = None
+    raw_chunk = None
+
+    # The file is only opened once, chunks are streamed from where the last run stopped
+    with db_manager.load_batch(chunks_per_commit) as load_batch:
+        for raw_chunk in iter_raw_chunks(file_path, chunk_size, start_row, start_byte_offset, complete_lines_only):
+            coerced_df, parse_metrics = coerce_raw_chunk(raw_chunk, AppConfig.CSV_ENGINE, AppConfig.TIMESTAMP_FORMAT)
+            cleaned_df, cleaning_statistics_df = impute_and_validate_with_statistics(coerced_df, imputation_state)
+            load_chunk(load_batch, pipeline_version, input_file_name, raw_chunk, cleaned_df, cleaning_statistics_df,
+                       parse_metrics, imputation_state.pending_df)
+
+            if not cleaned_df.empty:
+                loaded_time_range = merge_time_ranges(loaded_time_range,
+                                                      (cleaned_df['timestamp'].min(), cleaned_df['timestamp'].max()))
+
+        if drop_pending:
+            drop_pending_readings(load_batch, pipeline_version, input_file_name, raw_chunk, imputation_state.pending_df)
+
+    return loaded_time_range
+
+
+def do_pipelined_etl(db_manager, input_file_name, pipeline_version, file_path, chunk_size=1000, chunks_per_commit=1,
+                     queue_size=2):
+    # Same as do_etl with the reading, the cleaning & the writing of the chunks overlapped. The reader & the cleaner
+    # each run in a thread & hand the chunks over in bounded queues, so they block when they are queue_size chunks
+    # ahead of the writer. The writer runs in this thread & is the only stage using the database, it gets the chunks in
+    # the order they were read so the load_control checkpoints are committed in order. Parsing, the database drivers &
+    # the file reads release the GIL for most of their work
+    start_row, start_byte_offset = fetch_resume_position(db_manager, input_file_name, pipeline_version)
+    imputation_state = resume_imputation_state(db_manager, input_file_name, pipeline_version)
+
+    raw_chunks = queue.Queue(maxsize=queue_size)
+    cleaned_chunks = queue.Queue(maxsize=queue_size)
+    stopped = threading.Event()
+
+    def read_chunks():
+        for raw_chunk in iter_raw_chunks(file_path, chunk_size, start_row, start_byte_offset):
+            if not put_unless_stopped(raw_chunks, raw_chunk, stopped):
+                return
+        put_unless_stopped(raw_chunks, END_OF_CHUNKS, stopped)
+
+    def clean_chunks():
+        # pending_df is replaced by every chunk, the one handed to the writer with a chunk is not changed afterwards
+        while True:
+            raw_chunk = get_unless_stopped(raw_chunks, stopped)
+            if raw_chunk is None:
+                return
+            if raw_chunk is END_OF_CHUNKS or isinstance(raw_chunk, StageFailure):
+                put_unless_stopped(cleaned_chunks, raw_chunk, stopped)
+                return
+
+            coerced_df, parse_metrics = coerce_raw_chunk(raw_chunk, AppConfig.CSV_ENGINE, AppConfig.TIMESTAMP_FORMAT)
+            cleaned_df, cleaning_statistics_df = impute_and_validate_with_statistics(coerced_df, imputation_state)
+            cleaned_chunk = (raw_chunk, cleaned_df, cleaning_statistics_df, parse_metrics, imputation_state.pending_df)
+            if not put_unless_stopped(cleaned_chunks, cleaned_chunk, stopped):
+                return
+
+    stages = [threading.Thread(target=run_stage, args=(stage, output_queue, stopped), daemon=True)
+              for stage, output_queue in [(read_chunks, raw_chunks), (clean_chunks, cleaned_chunks)]]
+    for stage in stages:
+        stage.start()
+
+    loaded_time_range = None
+    raw_chunk = pending_df = None
+    try:
+        with db_manager.load_batch(chunks_per_commit) as load_batch:
+            while True:
+                cleaned_chunk = cleaned_chunks.get()
+                if cleaned_chunk is END_OF_CHUNKS:
+                    drop_pending_readings(load_batch, pipeline_version, input_file_name, raw_chunk, pending_df)
+                    break
+                if isinstance(cleaned_chunk, StageFailure):
+                    raise cleaned_chunk.exception
+
+                raw_chunk, cleaned_df, cleaning_statistics_df, parse_metrics, pending_df = cleaned_chunk
+                load_chunk(load_batch, pipeline_version, input_file_name, raw_chunk, cleaned_df,
+                           cleaning_statistics_df, parse_metrics, pending_df)
+
+                if not cleaned_df.empty:
+                    loaded_time_range = merge_time_ranges(
+                        loaded_time_range, (cleaned_df['timestamp'].min(), cleaned_df['timestamp'].max()))
+    finally:
+        # Stops the reader & the cleaner when the writer failed
+        stopped.set()
+        for stage in stages:
+            stage.join()
 
-        start_row = 1
-        if load_control_latest:
-            start_row = load_control_latest.last_loaded_line_number + 1
+    return loaded_time_range
 
-        df = pd.read_csv(file_path, skiprows=list(range(1, start_row)), nrows=chunk_size)
-        total_rows = len(df)
 
-        if total_rows < 1:
-            break
+def run_stage(stage, output_queue, stopped):
+    try:
+        stage()
+    except Exception as e:
+        put_unless_stopped(output_queue, StageFailure(e), stopped)
+
+
+def put_unless_stopped(stage_queue, item, stopped):
+    # Waits for room in the queue until the pipeline is stopped, returns False when it was stopped
+    while not stopped.is_set():
+        try:
+            stage_queue.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def get_unless_stopped(stage_queue, stopped):
+    # Waits for the next item until the pipeline is stopped, returns None when it was stopped
+    while not stopped.is_set():
+        try:
+            return stage_queue.get(timeout=0.1)
+        except queue.Empty:
+            pass
+    return None
+
+
+def merge_time_ranges(time_range, other_time_range):
+    if time_range is None:
+        return other_time_range
+    if other_time_range is None:
+        return time_range
+    return min(time_range[0], other_time_range[0]), max(time_range[1], other_time_range[1])
+
+
+def do_parallel_etl(db_manager, input_files, pipeline_version, workers, chunk_size=1000, chunks_per_commit=1):
+    # Chunks are parsed & cleaned in a pool of worker processes while this process stays the only writer. Results are
+    # written in the order the chunks were read, so the load_control checkpoints of every file only ever move forward
+    throughput = {}
+    imputation_states = {}
+    last_raw_chunks = {}
+    pending = deque()
+
+    def write_next_chunk(load_batch):
+        # The end of a file is queued after its last chunk
+        input_file_name, raw_chunk, future = pending.popleft()
+        if raw_chunk is END_OF_CHUNKS:
+            drop_pending_readings(load_batch, pipeline_version, input_file_name, last_raw_chunks.get(input_file_name),
+                                  imputation_states[input_file_name].pending_df)
+            return
 
-        cleaned_df = clean_data(df)
+        last_raw_chunks[input_file_name] = raw_chunk
+        coerced_df, parse_metrics = future.result()
+        imputation_state = imputation_states[input_file_name]
+        cleaned_df, cleaning_statistics_df = impute_and_validate_with_statistics(coerced_df, imputation_state)
+        load_chunk(load_batch, pipeline_version, input_file_name, raw_chunk, cleaned_df, cleaning_statistics_df,
+                   parse_metrics, imputation_state.pending_df)
 
-        last_processed_line_number = start_row + total_rows - 1
-        db_manager.load_cleaned_data(pipeline_version, cleaned_df, input_file_name, last_processed_line_number)
+        file_throughput = throughput[input_file_name]
+        file_throughput['lines'] += raw_chunk.end_line_number - raw_chunk.start_line_number + 1
+        file_throughput['rows'] += len(cleaned_df)
+        file_throughput['finished'] = time.perf_counter()
 
-        print(f"Processed {input_file_name} with rows from {start_row} to {last_processed_line_number}")
+    with ProcessPoolExecutor(max_workers=workers) as executor, db_manager.load_batch(chunks_per_commit) as load_batch:
+        for input_file_name, file_path in input_files:
+            start_row, start_byte_offset = fetch_resume_position(db_manager, input_file_name, pipeline_version)
+            now = time.perf_counter()
+            throughput[input_file_name] = {'lines': 0, 'rows': 0, 'started': now, 'finished': now}
+            imputation_states[input_file_name] = resume_imputation_state(db_manager, input_file_name, pipeline_version)
+
+            for raw_chunk in iter_raw_chunks(file_path, chunk_size, start_row, start_byte_offset):
+                future = executor.submit(coerce_raw_chunk, raw_chunk, AppConfig.CSV_ENGINE, AppConfig.TIMESTAMP_FORMAT)
+                pending.append((input_file_name, raw_chunk, future))
+
+                # Bound the chunks in flight so the reader does not run ahead of the writer and fill up the memory
+                if len(pending) >= workers * 2:
+                    write_next_chunk(load_batch)
+
+            pending.append((input_file_name, END_OF_CHUNKS, None))
+
+        while pending:
+            write_next_chunk(load_batch)
+
+    print_throughput_summary(throughput)
+
+
+def print_throughput_summary(throughput):
+    print("ETL throughput per file:")
+    for input_file_name, file_throughput in throughput.items():
+        elapsed = file_throughput['finished'] - file_throughput['started']
+        lines_per_second = file_throughput['lines'] / elapsed if elapsed > 0 else 0.0
+        print(f"{input_file_name}: {file_throughput['lines']} lines read, {file_throughput['rows']} rows loaded "
+              f"in {elapsed:.2f}s ({lines_per_second:.0f} lines/s)")
 
 
 def files_in_input_directory(directory_path):
@@ -84,10 +449,27 @@ def trigger_etl():
 
     print(f"Files in directory '{AppConfig.INPUT_DIRECTORY_PATH}':")
 
+    db_manager = DatabaseManager(AppConfig.DATABASE_URI)
+
+    if AppConfig.ETL_WORKERS > 1:
+        print(f"Running parallel ETL with {AppConfig.ETL_WORKERS} workers")
+        input_files = [(file_name, os.path.join(AppConfig.INPUT_DIRECTORY_PATH, file_name)) for file_name in file_names]
+        do_parallel_etl(db_manager, input_files, AppConfig.PIPELINE_VERSION, AppConfig.ETL_WORKERS,
+                        chunks_per_commit=AppConfig.CHUNKS_PER_COMMIT)
+        return
+
+    if AppConfig.PIPELINED_ETL:
+        for file_name in file_names:
+            print(f"CSV {file_name}, pipelined")
+            do_pipelined_etl(db_manager, file_name, AppConfig.PIPELINE_VERSION,
+                             os.path.join(AppConfig.INPUT_DIRECTORY_PATH, file_name),
+                             chunks_per_commit=AppConfig.CHUNKS_PER_COMMIT, queue_size=AppConfig.PIPELINE_QUEUE_SIZE)
+        return
+
     for file_name in file_names:
         print(f"CSV {file_name}")
-        do_etl(DatabaseManager(AppConfig.DATABASE_URI), file_name, AppConfig.PIPELINE_VERSION,
-               os.path.join(AppConfig.INPUT_DIRECTORY_PATH, file_name))
+        do_etl(db_manager, file_name, AppConfig.PIPELINE_VERSION,
+               os.path.join(AppConfig.INPUT_DIRECTORY_PATH, file_name), chunks_per_commit=AppConfig.CHUNKS_PER_COMMIT)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,81 @@
+import io
+from dataclasses import dataclass
+from itertools import islice
+from typing import Optional
+
+import pandas as pd
+
+CSV_COLUMNS = ['timestamp', 'turbine_id', 'wind_speed', 'wind_direction', 'power_output']
+NUMERIC_CSV_COLUMNS = ['turbine_id', 'wind_speed', 'wind_direction', 'power_output']
+CSV_DTYPES = {
+    'timestamp': 'str',
+    'turbine_id': 'float64',
+    'wind_speed': 'float64',
+    'wind_direction': 'float64',
+    'power_output': 'float64',
+}
+
+
+@dataclass(frozen=True)
+class RawChunk:
+    header: bytes
+    data: bytes
+    start_line_number: int
+    end_line_number: int
+    end_byte_offset: int
+
+
+def iter_raw_chunks(file_path, chunk_size, start_line_number=1, start_byte_offset: Optional[int] = None,
+                    complete_lines_only=False):
+    # The file is opened once and streamed line by line. Every chunk carries the byte offset of the end of its last
+    # line so a resumed run can seek straight to it instead of re-reading the file from the start.
+    # Line numbers exclude the header, ie the first data row is line 1
+    # With complete_lines_only a last line without a line break, ie a line still being appended to the file, is left
+    # for the next read
+    with open(file_path, 'rb') as file:
+        header = file.readline()
+
+        if start_byte_offset:
+            file.seek(start_byte_offset)
+        else:
+            # Checkpoints written before byte offsets were recorded only have a line number, skip to it once
+            for _ in islice(file, start_line_number - 1):
+                pass
+
+        line_number = start_line_number
+        while True:
+            lines = list(islice(file, chunk_size))
+            if complete_lines_only and lines and not lines[-1].endswith(b'\n'):
+                file.seek(-len(lines.pop()), io.SEEK_CUR)
+            if not lines:
+                break
+
+            end_line_number = line_number + len(lines) - 1
+            yield RawChunk(header=header, data=b''.join(lines), start_line_number=line_number,
+                           end_line_number=end_line_number, end_byte_offset=file.tell())
+            line_number = end_line_number + 1
+
+
+def parse_chunk(raw_chunk, engine='c'):
+    # The numeric columns are parsed straight into float64 by the CSV parser, missing values become NaN. They are
+    # narrowed to their compact types once the readings are cleaned
+    try:
+        return read_csv_chunk(raw_chunk, engine, CSV_DTYPES), {}
+    except ValueError:
+        # A value that is not a number in one of the numeric columns, the chunk is parsed as text once and the values
+        # that can not be converted are recorded as coercion errors per column. The C parser is used for this as it
+        # keeps missing values as NaN when reading text, pyarrow turns them into the string 'nan'
+        df = read_csv_chunk(raw_chunk, 'c', {column: 'str' for column in CSV_COLUMNS})
+
+        coercion_errors = {}
+        for column in NUMERIC_CSV_COLUMNS:
+            values = pd.to_numeric(df[column], errors='coerce').astype('float64')
+            coercion_errors[column] = int((values.isna() & df[column].notna()).sum())
+            df[column] = values
+
+        return df, coercion_errors
+
+
+def read_csv_chunk(raw_chunk, engine, dtype):
+    return pd.read_csv(io.BytesIO(raw_chunk.header + raw_chunk.data), usecols=CSV_COLUMNS, dtype=dtype,
+                       engine=engine)
@@ -0,0 +1,67 @@
+import os
+import time
+
+from src.analysis.stats import refresh_summary_stats
+from src.config import AppConfig
+from src.database.persistence import DatabaseManager
+from src.pipeline.etl import ImputationState, do_etl, files_in_input_directory, merge_time_ranges
+from src.util.instrumentation import METRICS
+
+
+def snapshot_file(file_path):
+    # The size & modification time of a file, a file only appended to changes both when lines are added
+    file_stat = os.stat(file_path)
+    return file_stat.st_size, file_stat.st_mtime_ns
+
+
+def ingest_changed_files(db_manager, file_snapshots, imputation_states):
+    # Loads the lines appended since the last poll to the files whose size or modification time changed. Returns the
+    # min & max timestamp of the readings loaded, None when nothing was loaded
+    changed_time_range = None
+
+    for file_name in files_in_input_directory(AppConfig.INPUT_DIRECTORY_PATH) or []:
+        file_path = os.path.join(AppConfig.INPUT_DIRECTORY_PATH, file_name)
+        file_snapshot = snapshot_file(file_path)
+
+        previous_snapshot = file_snapshots.get(file_name)
+        if previous_snapshot == file_snapshot:
+            continue
+        if previous_snapshot and file_snapshot[0] < previous_snapshot[0]:
+            print(f"Warning: {file_name} is smaller than before, files are expected to only be appended to")
+        file_snapshots[file_name] = file_snapshot
+
+        # do_etl resumes from the byte offset of the last loaded line, so only the appended lines are read. A line
+        # still being written is left for the next poll & so are the readings held back at the end of the file
+        loaded_time_range = do_etl(db_manager, file_name, AppConfig.PIPELINE_VERSION, file_path,
+                                   chunks_per_commit=AppConfig.CHUNKS_PER_COMMIT,
+                                   imputation_state=imputation_states.setdefault(file_name, ImputationState()),
+                                   complete_lines_only=True, drop_pending=False)
+        changed_time_range = merge_time_ranges(changed_time_range, loaded_time_range)
+
+    return changed_time_range
+
+
+def watch_input_directory(poll_interval_seconds, max_polls=None):
+    # Long running alternative to running the ETL & the stats from cron. The engine, the config & the imputation state
+    # of the files are kept between polls & a poll without changed files does not query the database
+    db_manager = DatabaseManager(AppConfig.DATABASE_URI)
+    file_snapshots = {}
+    imputation_states = {}
+
+    print(f"Watching '{AppConfig.INPUT_DIRECTORY_PATH}' every {poll_interval_seconds}s")
+    poll_count = 0
+    while max_polls is None or poll_count < max_polls:
+        changed_time_range = ingest_changed_files(db_manager, file_snapshots, imputation_states)
+
+        # Only the windows with new readings get their stats created again
+        if changed_time_range:
+            refresh_summary_stats(*changed_time_range)
+
+            # The metrics are totals since the watch started, the textfile is rewritten when they changed
+            METRICS.log_summary()
+            if AppConfig.METRICS_TEXTFILE:
+                METRICS.write_prometheus_textfile(AppConfig.METRICS_TEXTFILE)
+
+        poll_count += 1
+        if max_polls is None or poll_count < max_polls:
+            time.sleep(poll_interval_seconds)
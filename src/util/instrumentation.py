@@ -0,0 +1,141 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from src.util.resources import peak_rss_bytes
+
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = 'wind_turbines'
+
+
+class StageMetrics:
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.rows_in = 0
+        self.rows_out = 0
+
+
+class MetricsRegistry:
+    # Totals per stage of the run. Stages are recorded from the threads of the pipelined ETL, so updates are locked
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.listeners = []
+
+    def add_listener(self, listener):
+        # Called with the stage, seconds, rows in & rows out of every call, eg to sample the memory per chunk
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self.listeners.remove(listener)
+
+    def record(self, stage, seconds, rows_in=None, rows_out=None):
+        with self.lock:
+            stage_metrics = self.stages.setdefault(stage, StageMetrics())
+            stage_metrics.calls += 1
+            stage_metrics.seconds += seconds
+            stage_metrics.rows_in += rows_in or 0
+            stage_metrics.rows_out += rows_out or 0
+
+            for listener in self.listeners:
+                listener(stage, seconds, rows_in, rows_out)
+
+        # One structured log line per call, logged at debug as there is one per chunk
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(json.dumps({'event': 'stage', 'stage': stage, 'seconds': round(seconds, 6),
+                                     'rows_in': rows_in, 'rows_out': rows_out, 'peak_rss_bytes': peak_rss_bytes()}))
+
+    def reset(self):
+        with self.lock:
+            self.stages = {}
+
+    def summary(self):
+        with self.lock:
+            return [{
+                'stage': stage,
+                'calls': stage_metrics.calls,
+                'seconds': round(stage_metrics.seconds, 6),
+                'rows_in': stage_metrics.rows_in,
+                'rows_out': stage_metrics.rows_out,
+                # A fetch has no rows in, its rate is of the rows out
+                'rows_per_second': round((stage_metrics.rows_in or stage_metrics.rows_out) / stage_metrics.seconds)
+                if stage_metrics.seconds > 0 else None,
+            } for stage, stage_metrics in self.stages.items()]
+
+    def log_summary(self):
+        for stage_summary in self.summary():
+            logger.info(json.dumps({'event': 'stage_summary', **stage_summary}))
+        logger.info(json.dumps({'event': 'run_summary', 'peak_rss_bytes': peak_rss_bytes()}))
+
+    def write_prometheus_textfile(self, file_path):
+        # Text format of the Prometheus node exporter textfile collector. The file is replaced atomically so the
+        # collector never reads a partially written file
+        metrics = [
+            ('stage_calls_total', 'counter', 'Number of calls of the stage', 'calls'),
+            ('stage_seconds_total', 'counter', 'Seconds spent in the stage', 'seconds'),
+            ('stage_rows_in_total', 'counter', 'Rows passed to the stage', 'rows_in'),
+            ('stage_rows_out_total', 'counter', 'Rows returned by the stage', 'rows_out'),
+        ]
+        stage_summaries = self.summary()
+
+        lines = []
+        for metric_name, metric_type, metric_help, field in metrics:
+            lines.append(f"# HELP {METRIC_PREFIX}_{metric_name} {metric_help}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{metric_name} {metric_type}")
+            for stage_summary in stage_summaries:
+                lines.append(f"{METRIC_PREFIX}_{metric_name}{{stage=\"{stage_summary['stage']}\"}} "
+                             f"{stage_summary[field]}")
+
+        rss_bytes = peak_rss_bytes()
+        if rss_bytes is not None:
+            lines.append(f"# HELP {METRIC_PREFIX}_peak_rss_bytes Peak resident set size of the run")
+            lines.append(f"# TYPE {METRIC_PREFIX}_peak_rss_bytes gauge")
+            lines.append(f"{METRIC_PREFIX}_peak_rss_bytes {rss_bytes}")
+
+        temporary_path = f"{file_path}.tmp"
+        with open(temporary_path, 'w') as textfile:
+            textfile.write('\n'.join(lines) + '\n')
+        os.replace(temporary_path, file_path)
+
+
+METRICS = MetricsRegistry()
+
+
+class StageTimer:
+    def __init__(self, rows_in=None):
+        self.rows_in = rows_in
+        self.rows_out = None
+
+
+@contextmanager
+def timed_stage(stage, rows_in=None, registry=METRICS):
+    # Times the block & records it for the stage, the block can set rows_in & rows_out of the yielded timer
+    stage_timer = StageTimer(rows_in)
+    start = time.perf_counter()
+    try:
+        yield stage_timer
+    finally:
+        registry.record(stage, time.perf_counter() - start, stage_timer.rows_in, stage_timer.rows_out)
+
+
+def instrumented(stage, rows_in=None, rows_out=None):
+    # Decorator timing every call of the function as the stage. rows_in is called with the arguments of the function &
+    # rows_out with its result to count the rows
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with timed_stage(stage, rows_in(*args, **kwargs) if rows_in else None) as stage_timer:
+                result = function(*args, **kwargs)
+                if rows_out:
+                    stage_timer.rows_out = rows_out(result)
+            return result
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,92 @@
+import cProfile
+import csv
+import os
+import pstats
+import tracemalloc
+from datetime import datetime
+
+from src.util.instrumentation import METRICS
+from src.util.resources import peak_rss_bytes
+
+PROFILERS = ['cprofile', 'tracemalloc']
+
+# Stages sampled per call with --profile-chunks, ie impute_and_validate_with_statistics (the cleaning of clean_data) &
+# calculate_stats
+SAMPLED_STAGES = ['clean', 'compute']
+
+
+def create_run_directory(profile_directory):
+    run_directory = os.path.join(profile_directory, f"run-{datetime.now():%Y%m%d-%H%M%S}")
+    os.makedirs(run_directory, exist_ok=True)
+    return run_directory
+
+
+def profile_step(profiler, run_directory, name, step, top_n=20):
+    # Runs the step under the profiler, the profile is written to the run directory & its top entries are printed
+    if profiler not in PROFILERS:
+        raise ValueError(f"Unknown profiler '{profiler}', expected one of: {', '.join(PROFILERS)}")
+
+    if profiler == 'cprofile':
+        profile = cProfile.Profile()
+        result = profile.runcall(step)
+
+        profile_path = os.path.join(run_directory, f"{name}.prof")
+        profile.dump_stats(profile_path)
+        print(f"Top {top_n} functions of {name} by cumulative time, full profile in {profile_path}")
+        pstats.Stats(profile).sort_stats('cumulative').print_stats(top_n)
+        return result
+
+    # Tracing may already be on when the chunks are sampled, it is then left on for the next step
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    try:
+        result = step()
+        snapshot = tracemalloc.take_snapshot()
+        _, traced_peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+
+    # The allocations of tracemalloc itself & of the imports are not of interest
+    snapshot = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    ])
+    snapshot_path = os.path.join(run_directory, f"{name}.tracemalloc")
+    snapshot.dump(snapshot_path)
+    print(f"Top {top_n} allocation sites of {name} still allocated at the end, peak traced memory "
+          f"{traced_peak_bytes / 1e6:.1f} MB, full snapshot in {snapshot_path}")
+    for statistic in snapshot.statistics('lineno')[:top_n]:
+        print(statistic)
+    return result
+
+
+class ChunkSampler:
+    # Writes a line per call of the sampled stages with the memory after the call, so a growth of the memory from one
+    # chunk to the next shows up. The traced memory is only known while tracemalloc is tracing
+    def __init__(self, samples_path):
+        self.samples_file = open(samples_path, 'w', newline='')
+        self.writer = csv.writer(self.samples_file)
+        self.writer.writerow(['stage', 'call', 'seconds', 'rows_in', 'rows_out', 'traced_bytes', 'traced_peak_bytes',
+                              'peak_rss_bytes'])
+        self.calls = {}
+
+    def __call__(self, stage, seconds, rows_in, rows_out):
+        if stage not in SAMPLED_STAGES:
+            return
+
+        self.calls[stage] = self.calls.get(stage, 0) + 1
+        traced_bytes, traced_peak_bytes = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (None, None)
+        self.writer.writerow([stage, self.calls[stage], round(seconds, 6), rows_in, rows_out, traced_bytes,
+                              traced_peak_bytes, peak_rss_bytes()])
+
+    def __enter__(self):
+        METRICS.add_listener(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        METRICS.remove_listener(self)
+        self.samples_file.close()
@@ -0,0 +1,17 @@
+import sys
+
+try:
+    import resource
+except ImportError:
+    # The resource module is only available on Unix
+    resource = None
+
+
+def peak_rss_bytes():
+    # Peak resident set size of this process so far, None when it can not be measured on the platform
+    if resource is None:
+        return None
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS & in kilobytes on Linux
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
@@ -0,0 +1,47 @@
+import unittest
+
+import pandas as pd
+
+import src.analysis.accumulators as accumulators
+import src.analysis.stats as stats
+
+
+class TestAccumulators(unittest.TestCase):
+
+    def test_merged_accumulators_of_chunks_match_stats_of_readings(self):
+        # Given cleaned readings loaded in two chunks
+        input_df = pd.DataFrame({
+            'timestamp': pd.to_datetime(['2023-01-01', '2023-01-01', '2023-01-01', '2023-01-02', '2023-01-02',
+                                         '2023-01-02', '2023-01-02', '2023-01-02', '2023-01-02', '2023-01-02',
+                                         '2023-01-02']),
+            'turbine_id': [1, 1, 2, 2, 2, 3, 3, 3, 3, 3, 3],
+            'power_output': [1.00, 1.20, .80, 1.50, 1.40, 1.898753, -1.22217336, -1.05931412, 15.13199601,
+                             -0.07501486, 0.14636453]
+        })
+        first_chunk_df, second_chunk_df = input_df.iloc[:7], input_df.iloc[7:]
+
+        # The accumulators of each chunk are calculated separately
+        accumulators_df = pd.concat([accumulators.calculate_accumulators(first_chunk_df),
+                                     accumulators.calculate_accumulators(second_chunk_df)])
+
+        # Merging them gives the same stats as the readings, including the anomaly of turbine 3
+        stats_df = accumulators.calculate_stats_from_accumulators(accumulators_df, ['turbine_id'])
+        pd.testing.assert_frame_equal(stats_df, stats.calculate_stats(input_df))
+
+    def test_accumulators_are_kept_per_day(self):
+        input_df = pd.DataFrame({
+            'timestamp': pd.to_datetime(['2023-01-01 01:00:00', '2023-01-01 23:00:00', '2023-01-02 00:00:00']),
+            'turbine_id': [1, 1, 1],
+            'power_output': [1.0, 2.0, 4.0]
+        })
+
+        accumulators_df = accumulators.calculate_accumulators(input_df)
+
+        self.assertEqual([pd.Timestamp('2023-01-01'), pd.Timestamp('2023-01-02')],
+                         accumulators_df['window_start'].tolist())
+        self.assertEqual([2, 1], accumulators_df['reading_count'].tolist())
+        self.assertEqual([0.5, 0.0], accumulators_df['power_m2'].tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import src.analysis.accumulators as accumulators
+import src.analysis.anomalies as anomalies
+import src.analysis.stats as stats
+
+
+class TestAnomalies(unittest.TestCase):
+
+    def test_robust_scores_flag_the_outlier_of_each_group(self):
+        values = np.array([1.0, 1.1, 0.9, 1.0, 9.0, 2.0, 2.0, 2.0, 2.0, 2.5])
+        group_codes = np.array([0, 0, 0, 0, 0, 1, 1, 1, 1, 1])
+
+        scores = anomalies.robust_scores(values, group_codes)
+
+        # The MAD of the second group is 0, it is scaled by its mean absolute deviation instead
+        self.assertEqual([False, False, False, False, True, False, False, False, False, True],
+                         anomalies.is_anomaly('mad', scores).tolist())
+
+    def test_rolling_scores_only_use_the_readings_before(self):
+        values = np.array([1.0, 1.2, 0.8, 1.0, 5.0, 1.1, 1.0])
+        group_codes = np.zeros(7, dtype='int64')
+        timestamps = np.arange(7)
+
+        # The readings are scored in time order whatever their order in the window
+        order = np.array([6, 0, 5, 1, 4, 2, 3])
+        scores = np.empty(7)
+        scores[order] = anomalies.rolling_scores(values[order], group_codes, timestamps[order], 3)
+
+        self.assertTrue(np.isnan(scores[:3]).all())
+        self.assertEqual([False, True, False, False], anomalies.is_anomaly('rolling', scores[3:]).tolist())
+
+    def test_power_curve_scores_follow_the_wind_speed(self):
+        # The power follows the wind speed except for one reading producing far less than at the same wind speed
+        wind_speed = np.array([4.2, 4.5, 4.7, 4.1, 8.1, 8.3, 8.5, 8.7, 8.2, 8.4])
+        power_output = np.array([0.5, 0.6, 0.5, 0.6, 2.5, 2.4, 2.6, 2.5, 0.4, 2.5])
+        group_codes = np.zeros(10, dtype='int64')
+
+        scores = anomalies.power_curve_scores(power_output, wind_speed, group_codes, 1.0)
+
+        self.assertEqual([8], np.flatnonzero(anomalies.is_anomaly('power_curve', scores)).tolist())
+        # Scored against the readings of the turbine alone the low readings of the low winds are not anomalies
+        self.assertFalse(anomalies.is_anomaly('mad', anomalies.robust_scores(power_output, group_codes))[8])
+
+    def test_power_curve_lookup_of_the_merged_chunks(self):
+        # Given the power curve points of readings loaded in two chunks, merged like the ETL does
+        readings_df = pd.DataFrame({
+            'turbine_id': [1, 1, 1, 2, 1, 2],
+            'wind_speed': [4.2, 4.8, 8.1, 4.5, 8.9, 12.0],
+            'power_output': [0.5, 0.7, 2.4, 0.6, 2.6, 3.0],
+        })
+        power_curve_df = accumulators.merge_accumulators(pd.concat([
+            accumulators.calculate_power_curve_accumulators(readings_df.iloc[:3], 1.0),
+            accumulators.calculate_power_curve_accumulators(readings_df.iloc[3:], 1.0),
+        ]), ['turbine_id', 'wind_speed_bin'])
+        power_curve = anomalies.PowerCurve(power_curve_df, 1.0)
+
+        # The expected power is the mean power of the turbine in the wind speed bin, NaN for a bin without readings
+        expected_power = power_curve.lookup(np.array([1, 1, 2, 2, 3]), np.array([4.0, 8.5, 4.9, 8.0, 4.0]))
+        np.testing.assert_allclose([0.6, 2.5, 0.6, np.nan, np.nan], expected_power)
+
+    def test_stats_with_anomalies_return_the_flagged_readings(self):
+        input_df = pd.DataFrame({
+            'timestamp': pd.date_range('2023-01-01', periods=12, freq='h'),
+            'turbine_id': [1] * 6 + [2] * 6,
+            'wind_speed': [8.0] * 12,
+            'power_output': [1.0, 1.1, 0.9, 1.0, 1.05, 6.0, 2.0, 2.1, 1.9, 2.0, 2.05, 1.95],
+        })
+
+        for anomaly_engine in anomalies.ANOMALY_ENGINES:
+            stats_df, anomalies_df = stats.calculate_stats_with_anomalies(input_df, anomaly_engine)
+
+            self.assertEqual([True, False], stats_df['has_anomaly_reading'].tolist())
+            self.assertEqual([1], anomalies_df['turbine_id'].tolist())
+            self.assertEqual([pd.Timestamp('2023-01-01 05:00:00')], anomalies_df['timestamp'].tolist())
+            self.assertEqual([anomaly_engine], anomalies_df['anomaly_engine'].tolist())
+
+    def test_anomaly_engines_of_the_stats_versions(self):
+        self.assertEqual({'1': 'zscore', '2': 'power_curve'}, anomalies.parse_anomaly_engines('1:zscore, 2:power_curve'))
+        with self.assertRaises(ValueError):
+            anomalies.parse_anomaly_engines('1:isolation_forest')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+
+import pandas as pd
+from sqlalchemy import create_engine
+
+from src.database.bulk_writer import PandasBulkWriter, SqliteBulkWriter, create_bulk_writer
+from src.database.database_schema import CleanedReadingEntity, UNIQUE_KEYS, create_tables
+
+
+class TestBulkWriter(unittest.TestCase):
+
+    def write_and_read_back(self, bulk_writer, df):
+        engine = create_engine('sqlite://')
+        bulk_writer.prepare(engine)
+        create_tables(engine)
+
+        with engine.begin() as connection:
+            bulk_writer.write(connection, CleanedReadingEntity.__tablename__, df)
+
+        with engine.connect() as connection:
+            return pd.read_sql_query('SELECT load_id, turbine_id, timestamp, wind_speed, wind_direction, power_output '
+                                     'FROM cleaned_reading ORDER BY id', connection)
+
+    def test_sqlite_writer_stores_the_same_rows_as_pandas(self):
+        df = pd.DataFrame({
+            'timestamp': pd.to_datetime(['2022-03-01 00:00:00', '2022-03-01 01:00:00']),
+            'turbine_id': [1, 2],
+            'wind_speed': [11.8, 11.6],
+            'wind_direction': [169, 24],
+            'power_output': [2.7, 2.2],
+            'load_id': [1, 1],
+        })
+
+        pd.testing.assert_frame_equal(self.write_and_read_back(PandasBulkWriter(), df),
+                                      self.write_and_read_back(SqliteBulkWriter(), df))
+
+    def test_replayed_rows_update_the_rows_already_loaded(self):
+        df = pd.DataFrame({
+            'timestamp': pd.to_datetime(['2022-03-01 00:00:00', '2022-03-01 00:00:00']),
+            'turbine_id': [1, 2],
+            'power_output': [2.7, 2.2],
+            'load_id': [1, 1],
+            'pipeline_version': [1, 1],
+        })
+        replayed_df = df.assign(power_output=[2.8, 2.3], load_id=2)
+
+        for bulk_writer in [PandasBulkWriter(), SqliteBulkWriter()]:
+            engine = create_engine('sqlite://')
+            bulk_writer.prepare(engine)
+            create_tables(engine)
+
+            for chunk_df in [df, replayed_df]:
+                with engine.begin() as connection:
+                    bulk_writer.write(connection, CleanedReadingEntity.__tablename__, chunk_df,
+                                      UNIQUE_KEYS[CleanedReadingEntity.__tablename__])
+
+            with engine.connect() as connection:
+                result_df = pd.read_sql_query('SELECT load_id, turbine_id, power_output FROM cleaned_reading '
+                                              'ORDER BY turbine_id', connection)
+
+            self.assertEqual([2, 2], result_df['load_id'].tolist())
+            self.assertEqual([2.8, 2.3], result_df['power_output'].tolist())
+
+    def test_writer_is_selected_from_the_dialect(self):
+        self.assertIsInstance(create_bulk_writer(create_engine('sqlite://')), SqliteBulkWriter)
+        self.assertIsInstance(create_bulk_writer(create_engine('sqlite://'), 'pandas'), PandasBulkWriter)
+        with self.assertRaises(ValueError):
+            create_bulk_writer(create_engine('sqlite://'), 'unknown')
+
+
+if __name__ == '__main__':
+    unittest.main()
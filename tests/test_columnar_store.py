@@ -0,0 +1,58 @@
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+
+import pandas as pd
+
+import src.database.columnar_store as columnar_store
+
+
+@unittest.skipIf(columnar_store.pa is None, "pyarrow is not installed")
+class TestColumnarStore(unittest.TestCase):
+
+    def setUp(self):
+        self.root_directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root_directory)
+
+    def cleaned_readings(self, timestamps, power_output):
+        return pd.DataFrame({
+            'timestamp': pd.to_datetime(timestamps),
+            'turbine_id': [2, 1, 1][:len(timestamps)],
+            'wind_speed': [10.0, 12.0, 8.0][:len(timestamps)],
+            'wind_direction': [180, 185, 200][:len(timestamps)],
+            'power_output': power_output
+        })
+
+    def test_readings_are_read_back_for_the_window(self):
+        for columnar_format in columnar_store.COLUMNAR_FORMATS:
+            store = columnar_store.ColumnarStore(self.root_directory, columnar_format)
+            store.write_cleaned_readings(1, self.cleaned_readings(
+                ['2023-01-01 00:00:00', '2023-01-01 23:00:00', '2023-01-02 00:00:00'], [1.0, 1.2, 0.8]),
+                'data_group_1.csv', 1)
+
+            df = store.fetch_cleaned_readings(1, datetime(2023, 1, 1), datetime(2023, 1, 2),
+                                              columns=['turbine_id', 'timestamp', 'power_output'])
+
+            # Only the readings of the first day are returned, sorted by turbine within the partition
+            self.assertEqual(['turbine_id', 'timestamp', 'power_output'], list(df.columns))
+            self.assertEqual([1, 2], df['turbine_id'].tolist())
+            self.assertEqual([1.2, 1.0], df['power_output'].tolist())
+
+    def test_replayed_chunk_replaces_the_files_of_the_failed_attempt(self):
+        store = columnar_store.ColumnarStore(self.root_directory)
+        store.write_cleaned_readings(1, self.cleaned_readings(
+            ['2023-01-01 00:00:00', '2023-01-02 00:00:00'], [1.0, 1.2]), 'data_group_1.csv', 1001)
+
+        # The replay of the chunk starting at line 1001 only has readings for the first day
+        store.write_cleaned_readings(1, self.cleaned_readings(['2023-01-01 00:00:00'], [1.5]),
+                                     'data_group_1.csv', 1001)
+
+        df = store.fetch_cleaned_readings(1, datetime(2023, 1, 1), datetime(2023, 1, 3))
+        self.assertEqual([1.5], df['power_output'].tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
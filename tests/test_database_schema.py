@@ -0,0 +1,79 @@
+import unittest
+
+from sqlalchemy import create_engine, inspect, text
+
+from src.database.database_schema import create_tables, upgrade_tables
+
+# The tables as created before the pipeline_version of the readings, the indexes & the unique keys, with an index
+# added by an earlier upgrade
+BASELINE_TABLES = [
+    """CREATE TABLE load_control (id INTEGER PRIMARY KEY, pipeline_version INTEGER, input_file_name VARCHAR,
+                                  last_loaded_line_number INTEGER, load_timestamp DATETIME)""",
+    """CREATE TABLE cleaning_statistics (id INTEGER PRIMARY KEY, load_id INTEGER REFERENCES load_control (id),
+                                         turbine_id INTEGER, action VARCHAR, reason VARCHAR, count INTEGER)""",
+    """CREATE TABLE cleaned_reading (id INTEGER PRIMARY KEY, load_id INTEGER REFERENCES load_control (id),
+                                     turbine_id INTEGER, timestamp DATETIME, wind_speed FLOAT, wind_direction FLOAT,
+                                     power_output FLOAT, is_imputed BOOLEAN)""",
+    """CREATE TABLE statistics_control (id INTEGER PRIMARY KEY, from_date DATETIME, to_date DATETIME,
+                                        pipeline_version INTEGER, stats_version INTEGER)""",
+    """CREATE TABLE statistics (id INTEGER PRIMARY KEY,
+                                statistics_control_id INTEGER REFERENCES statistics_control (id), turbine_id INTEGER,
+                                min_power FLOAT, max_power FLOAT, average FLOAT, std_deviation FLOAT,
+                                has_anomaly_reading BOOLEAN)""",
+    "CREATE INDEX ix_cleaned_reading_load_id_timestamp ON cleaned_reading (load_id, timestamp)",
+]
+
+
+class TestDatabaseSchema(unittest.TestCase):
+
+    def setUp(self):
+        # Given a database of the baseline schema where a replayed load duplicated a reading & its stats, and a second
+        # pipeline version loaded the same reading
+        self.engine = create_engine('sqlite://')
+        with self.engine.begin() as connection:
+            for statement in BASELINE_TABLES:
+                connection.execute(text(statement))
+            connection.execute(text("INSERT INTO load_control (id, pipeline_version, input_file_name) "
+                                    "VALUES (1, 1, 'data.csv'), (2, 1, 'data.csv'), (3, 2, 'data.csv')"))
+            connection.execute(text("INSERT INTO cleaned_reading (id, load_id, turbine_id, timestamp, power_output) "
+                                    "VALUES (1, 1, 1, '2023-01-01 00:00:00.000000', 1.0), "
+                                    "(2, 1, 2, '2023-01-01 00:00:00.000000', 2.0), "
+                                    "(3, 2, 1, '2023-01-01 00:00:00.000000', 3.0), "
+                                    "(4, 3, 1, '2023-01-01 00:00:00.000000', 4.0)"))
+            connection.execute(text("INSERT INTO statistics_control (id, pipeline_version, stats_version) "
+                                    "VALUES (1, 1, 1)"))
+            connection.execute(text("INSERT INTO statistics (id, statistics_control_id, turbine_id, average) "
+                                    "VALUES (1, 1, 1, 1.0), (2, 1, 1, 3.0), (3, 1, 2, 2.0)"))
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def query(self, sql):
+        with self.engine.connect() as connection:
+            return [tuple(row) for row in connection.execute(text(sql))]
+
+    def index_names(self, table_name):
+        return sorted(index['name'] for index in inspect(self.engine).get_indexes(table_name))
+
+    def test_upgrade_removes_the_duplicate_keys_of_the_baseline_schema(self):
+        # Upgraded as by scripts/setup_database.py, a second run is a no-op
+        for _ in range(2):
+            create_tables(self.engine)
+            upgrade_tables(self.engine)
+
+        # The readings take the pipeline version of their load & only the latest reading of a key is kept
+        self.assertEqual([(2, 2, 1, 2.0), (3, 1, 1, 3.0), (4, 1, 2, 4.0)], self.query(
+            "SELECT id, turbine_id, pipeline_version, power_output FROM cleaned_reading ORDER BY id"))
+        self.assertEqual([(2, 1, 3.0), (3, 2, 2.0)], self.query(
+            "SELECT id, turbine_id, average FROM statistics ORDER BY id"))
+
+        self.assertEqual(['uq_cleaned_reading_pipeline_version_timestamp_turbine_id'],
+                         self.index_names('cleaned_reading'))
+        self.assertEqual(['uq_statistics_statistics_control_id_turbine_id'], self.index_names('statistics'))
+        self.assertEqual(['ix_load_control_input_file_name_pipeline_version'], self.index_names('load_control'))
+        self.assertEqual(['ix_statistics_control_pipeline_version_stats_version'],
+                         self.index_names('statistics_control'))
+
+
+if __name__ == '__main__':
+    unittest.main()
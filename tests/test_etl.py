@@ -1,6 +1,29 @@
+import os
+import tempfile
+import threading
 import unittest
+from unittest import mock
 import pandas as pd
+from sqlalchemy import text
 import src.pipeline.etl as etl
+from tests.test_persistence import create_database_manager
+
+CSV_HEADER = 'timestamp,turbine_id,wind_speed,wind_direction,power_output\n'
+
+# Readings with values to impute within & across chunks, dropped readings & a reading still held back at the end
+CSV_LINES = [
+    '2022-01-01 00:00:00,1,10,180,1.0',
+    '2022-01-01 00:00:00,2,11,,1.5',
+    '2022-01-01 00:00:00,3,12,200,',
+    '2022-01-01 01:00:00,1,13,190,1.1',
+    '2022-01-01 01:00:00,2,14,170,1.6',
+    'invalid,3,12,200,2.0',
+    '2022-01-01 01:00:00,3,12,200,2.1',
+    '2022-01-01 02:00:00,1,,190,1.2',
+    '2022-01-01 02:00:00,2,150,170,1.6',
+    '2022-01-01 03:00:00,1,9,190,1.3',
+    '2022-01-01 03:00:00,3,9,190,',
+]
 
 
 class TestCleanDataFrame(unittest.TestCase):
@@ -22,13 +45,14 @@ class TestCleanDataFrame(unittest.TestCase):
             'turbine_id': [1, 3],
             'wind_speed': [10, 12],
             'wind_direction': [180, 220],
-            'power_output': [1.0, 1.2]
+            'power_output': [1.0, 1.2],
+            'is_imputed': [False, False]
         }).reset_index(drop=True)
         expected_result = expected_result.astype({
             "timestamp": "datetime64[ns]",
-            "turbine_id": "int64",
+            "turbine_id": "int32",
             "wind_speed": "float64",
-            "wind_direction": "int64",
+            "wind_direction": "int16",
             "power_output": "float64",
         })
 
@@ -59,13 +83,14 @@ class TestCleanDataFrame(unittest.TestCase):
             'turbine_id': [1, 3],
             'wind_speed': [10, 12],
             'wind_direction': [180, 220],
-            'power_output': [1.0, 1.2]
+            'power_output': [1.0, 1.2],
+            'is_imputed': [False, False]
         }).reset_index(drop=True)
         expected_result = expected_result.astype({
             "timestamp": "datetime64[ns]",
-            "turbine_id": "int64",
+            "turbine_id": "int32",
             "wind_speed": "float64",
-            "wind_direction": "int64",
+            "wind_direction": "int16",
             "power_output": "float64",
         })
 
@@ -99,13 +124,14 @@ class TestCleanDataFrame(unittest.TestCase):
             'turbine_id': [1, 1, 2, 3],
             'wind_speed': [10, 14, 15, 12],
             'wind_direction': [220, 220, 180, 200],
-            'power_output': [1.0, 1.8, 1.5, 1.2]
+            'power_output': [1.0, 1.8, 1.5, 1.2],
+            'is_imputed': [True, False, False, False]
         }).reset_index(drop=True)
         expected_result = expected_result.astype({
             "timestamp": "datetime64[ns]",
-            "turbine_id": "int64",
+            "turbine_id": "int32",
             "wind_speed": "float64",
-            "wind_direction": "int64",
+            "wind_direction": "int16",
             "power_output": "float64",
         })
 
@@ -140,13 +166,14 @@ class TestCleanDataFrame(unittest.TestCase):
             'turbine_id': [1, 2, 3],
             'wind_speed': [14, 15, 12],
             'wind_direction': [220, 180, 200],
-            'power_output': [1.8, 1.5, 1.2]
+            'power_output': [1.8, 1.5, 1.2],
+            'is_imputed': [False, False, False]
         }).reset_index(drop=True)
         expected_result = expected_result.astype({
             "timestamp": "datetime64[ns]",
-            "turbine_id": "int64",
+            "turbine_id": "int32",
             "wind_speed": "float64",
-            "wind_direction": "int64",
+            "wind_direction": "int16",
             "power_output": "float64",
         })
 
@@ -163,6 +190,239 @@ class TestCleanDataFrame(unittest.TestCase):
         print(expected_result)
         pd.testing.assert_frame_equal(cleaned_df, expected_result)
 
+    def test_imputing_within_turbine(self):
+        # Turbine 1 is missing its wind direction at its last reading, the next reading in the chunk is for turbine 2
+        data = {
+            'timestamp': ['2022-01-03 01:00:00', '2022-01-03 00:00:00', '2022-01-03 01:00:00'],
+            'turbine_id': [1, 1, 2],
+            'wind_speed': [10, 15, 12],
+            'wind_direction': ['', 180, 200],
+            'power_output': [1.0, 1.5, 1.2]
+        }
+        input_df = pd.DataFrame(data)
+
+        cleaned_df = etl.clean_data(input_df).reset_index(drop=True)
+
+        # The readings are ordered by time within the turbine, so turbine 1 has no later reading to impute from and
+        # the value of turbine 2 is not used
+        self.assertEqual([1, 2], cleaned_df['turbine_id'].tolist())
+        self.assertEqual([180, 200], cleaned_df['wind_direction'].tolist())
+        self.assertEqual([False, False], cleaned_df['is_imputed'].tolist())
+
+    def test_imputing_across_chunks(self):
+        imputation_state = etl.ImputationState()
+        first_chunk_df = pd.DataFrame({
+            'timestamp': ['2022-01-03 00:00:00', '2022-01-03 00:00:00'],
+            'turbine_id': [1, 2],
+            'wind_speed': [10, 15],
+            'wind_direction': ['', 180],
+            'power_output': [1.0, 1.5]
+        })
+        second_chunk_df = pd.DataFrame({
+            'timestamp': ['2022-01-03 01:00:00'],
+            'turbine_id': [1],
+            'wind_speed': [12],
+            'wind_direction': [200],
+            'power_output': [1.2]
+        })
+
+        # The reading of turbine 1 at the end of the first chunk is held back
+        first_cleaned_df = etl.clean_data(first_chunk_df, imputation_state)
+        self.assertEqual([2], first_cleaned_df['turbine_id'].tolist())
+
+        # And imputed from the next reading of turbine 1 in the second chunk
+        second_cleaned_df = etl.clean_data(second_chunk_df, imputation_state).reset_index(drop=True)
+        self.assertEqual([1, 1], second_cleaned_df['turbine_id'].tolist())
+        self.assertEqual([200, 200], second_cleaned_df['wind_direction'].tolist())
+        self.assertEqual([True, False], second_cleaned_df['is_imputed'].tolist())
+        self.assertTrue(imputation_state.pending_df.empty)
+
+    def test_cleaning_statistics(self):
+        data = {
+            'timestamp': ['2022-01-01 00:00:00', 'invalid', '2022-01-01 00:00:00', '2022-01-01 00:00:00',
+                          '2022-01-01 01:00:00', '2022-01-01 01:00:00'],
+            'turbine_id': [1, 1, 'some_id', 2, 1, 2],
+            'wind_speed': [10, 15, 12, 150, 14, ''],
+            'wind_direction': ['', 180, 200, 400, 220, 190],
+            'power_output': [1.0, 1.5, 1.2, 1.8, 2.2, 1.1]
+        }
+
+        cleaned_df, cleaning_statistics_df = etl.clean_data_with_statistics(pd.DataFrame(data))
+
+        # The turbine 2 reading out of range for both wind speed & direction is only counted once, the turbine 2
+        # reading missing its wind speed has no later reading to impute from
+        self.assertEqual(2, len(cleaned_df))
+        self.assertEqual([
+            (1, 'DROPPED', 'INVALID_DATE_TIME', 1),
+            (1, 'IMPUTED', 'MISSING_WIND_DIRECTION', 1),
+            (2, 'DROPPED', 'OUT_OF_RANGE_WIND_SPEED', 1),
+            (2, 'DROPPED', 'NOT_IMPUTABLE', 1),
+            (None, 'DROPPED', 'INVALID_TURBINE_ID', 1),
+        ], [(None if pd.isna(turbine_id) else turbine_id, action, reason, count)
+            for turbine_id, action, reason, count in cleaning_statistics_df.itertuples(index=False)])
+
+
+class TestEtlLoads(unittest.TestCase):
+    # The ETL of csv files into a database of its own for every test
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db_manager = create_database_manager(self.directory.name)
+        self.file_path = os.path.join(self.directory.name, 'data.csv')
+
+    def tearDown(self):
+        self.db_manager.engine.dispose()
+        self.directory.cleanup()
+
+    def write_lines(self, lines, mode='w', file_path=None):
+        with open(file_path or self.file_path, mode) as file:
+            file.write((CSV_HEADER if mode == 'w' else '') + ''.join(f"{line}\n" for line in lines))
+
+    def query(self, sql, db_manager=None):
+        with (db_manager or self.db_manager).engine.connect() as connection:
+            return [tuple(row) for row in connection.execute(text(sql))]
+
+    def create_other_database_manager(self):
+        directory = os.path.join(self.directory.name, 'other')
+        os.makedirs(directory)
+        db_manager = create_database_manager(directory)
+        self.addCleanup(db_manager.engine.dispose)
+        return db_manager
+
+    def loaded_data(self, db_manager=None):
+        # What a load leaves in the database, without the generated ids
+        return {
+            'cleaned_reading': self.query("SELECT turbine_id, timestamp, wind_speed, wind_direction, power_output, "
+                                          "is_imputed FROM cleaned_reading ORDER BY timestamp, turbine_id", db_manager),
+            'load_control': self.query("SELECT input_file_name, last_loaded_line_number, last_loaded_byte_offset "
+                                       "FROM load_control ORDER BY id", db_manager),
+            'cleaning_statistics': self.query(
+                "SELECT lc.input_file_name, cs.turbine_id, cs.action, cs.reason, SUM(cs.count) "
+                "FROM cleaning_statistics cs JOIN load_control lc ON lc.id = cs.load_id "
+                "GROUP BY lc.input_file_name, cs.turbine_id, cs.action, cs.reason "
+                "ORDER BY lc.input_file_name, cs.turbine_id, cs.action, cs.reason", db_manager),
+            'pending_reading': self.query("SELECT input_file_name, turbine_id, timestamp FROM pending_reading "
+                                          "ORDER BY input_file_name, turbine_id", db_manager),
+        }
+
+    def assert_stopped_and_rolled_back(self, load, threads_before):
+        with self.assertRaises(RuntimeError):
+            load()
+
+        self.assertEqual([], [thread for thread in threading.enumerate() if thread not in threads_before])
+        self.assertEqual([], self.query("SELECT * FROM load_control"))
+        self.assertEqual([], self.query("SELECT * FROM cleaned_reading"))
+
+    def test_readings_held_back_at_the_end_of_a_run_are_imputed_by_the_next_run(self):
+        # Given a file ending with a reading of turbine 2 missing its power output
+        self.write_lines(['2022-01-01 00:00:00,1,10,180,1.0', '2022-01-01 00:00:00,2,11,190,',
+                          '2022-01-01 01:00:00,1,12,200,1.2'])
+        etl.do_etl(self.db_manager, 'data.csv', '1', self.file_path, chunk_size=2)
+
+        # The reading is held back with the checkpoint of the file & counted as dropped by a load at the same line
+        self.assertEqual([(1,), (1,)], self.query("SELECT turbine_id FROM cleaned_reading"))
+        self.assertEqual([(2, None, 3)], self.query(
+            "SELECT turbine_id, power_output, dropped_load_id FROM pending_reading"))
+        self.assertEqual([(1, 2), (2, 3), (3, 3)], self.query(
+            "SELECT id, last_loaded_line_number FROM load_control ORDER BY id"))
+        self.assertEqual([(3, 2, 'DROPPED', 'NOT_IMPUTABLE', 1)], self.query(
+            "SELECT load_id, turbine_id, action, reason, count FROM cleaning_statistics"))
+
+        # And imputed by a later run from the next reading of turbine 2 appended to the file
+        self.write_lines(['2022-01-01 01:00:00,2,13,210,2.5'], mode='a')
+        etl.do_etl(self.db_manager, 'data.csv', '1', self.file_path, chunk_size=2)
+        self.assertEqual([(2.5, 1), (2.5, 0)], self.query(
+            "SELECT power_output, is_imputed FROM cleaned_reading WHERE turbine_id = 2 ORDER BY timestamp"))
+        self.assertEqual([], self.query("SELECT * FROM pending_reading"))
+
+        # The drop is withdrawn
+        self.assertEqual([(2, 'IMPUTED', 'MISSING_POWER_OUTPUT', 1)], self.query(
+            "SELECT turbine_id, action, reason, count FROM cleaning_statistics"))
+
+    def test_readings_held_back_are_only_dropped_at_the_end_of_a_file_not_watched(self):
+        self.write_lines(['2022-01-01 00:00:00,1,10,180,', '2022-01-01 00:00:00,2,11,190,'])
+
+        # A watched file keeps them held back for the lines appended later
+        etl.do_etl(self.db_manager, 'data.csv', '1', self.file_path, imputation_state=etl.ImputationState(),
+                   complete_lines_only=True, drop_pending=False)
+        self.assertEqual([], self.query("SELECT * FROM cleaning_statistics"))
+        self.assertEqual([(None,), (None,)], self.query("SELECT dropped_load_id FROM pending_reading"))
+
+        # A run without new lines does not drop them, a run with new lines drops the readings still held back
+        etl.do_etl(self.db_manager, 'data.csv', '1', self.file_path)
+        self.assertEqual([], self.query("SELECT * FROM cleaning_statistics"))
+        self.write_lines(['2022-01-01 01:00:00,1,12,200,1.2'], mode='a')
+        etl.do_etl(self.db_manager, 'data.csv', '1', self.file_path)
+        self.assertEqual([(1, 'IMPUTED', 'MISSING_POWER_OUTPUT', 1), (2, 'DROPPED', 'NOT_IMPUTABLE', 1)], self.query(
+            "SELECT turbine_id, action, reason, count FROM cleaning_statistics ORDER BY turbine_id"))
+
+    def test_pipelined_etl_loads_the_same_as_the_etl(self):
+        self.write_lines(CSV_LINES)
+        etl.do_etl(self.db_manager, 'data.csv', '1', self.file_path, chunk_size=3)
+
+        other_db_manager = self.create_other_database_manager()
+        etl.do_pipelined_etl(other_db_manager, 'data.csv', '1', self.file_path, chunk_size=3, queue_size=1)
+
+        loaded_data = self.loaded_data()
+        self.assertEqual(8, len(loaded_data['cleaned_reading']))
+        self.assertEqual(5, len(loaded_data['load_control']))
+        self.assertEqual(loaded_data, self.loaded_data(other_db_manager))
+
+    def test_pipelined_etl_failures_stop_the_stages_and_roll_back(self):
+        self.write_lines(CSV_LINES)
+        threads_before = threading.enumerate()
+
+        # The writer fails on the second chunk of the batch, while the reader is blocked on the full queue
+        write_cleaned_data = self.db_manager.write_cleaned_data
+        written_chunks = []
+
+        def fail_on_second_chunk(*args):
+            written_chunks.append(args[3])
+            if len(written_chunks) == 2:
+                raise RuntimeError('write failed')
+            write_cleaned_data(*args)
+
+        with mock.patch.object(self.db_manager, 'write_cleaned_data', side_effect=fail_on_second_chunk):
+            self.assert_stopped_and_rolled_back(lambda: etl.do_pipelined_etl(
+                self.db_manager, 'data.csv', '1', self.file_path, chunk_size=1, chunks_per_commit=3, queue_size=1),
+                threads_before)
+
+        # The cleaner fails on the second chunk
+        coerce_raw_chunk = etl.coerce_raw_chunk
+
+        def fail_on_second_raw_chunk(raw_chunk, *args):
+            if raw_chunk.start_line_number == 2:
+                raise RuntimeError('clean failed')
+            return coerce_raw_chunk(raw_chunk, *args)
+
+        with mock.patch.object(etl, 'coerce_raw_chunk', side_effect=fail_on_second_raw_chunk):
+            self.assert_stopped_and_rolled_back(lambda: etl.do_pipelined_etl(
+                self.db_manager, 'data.csv', '1', self.file_path, chunk_size=1, chunks_per_commit=3, queue_size=1),
+                threads_before)
+
+    def test_parallel_etl_loads_the_same_as_the_etl_with_checkpoints_in_file_order(self):
+        # Given two files with the readings of other turbines
+        other_file_path = os.path.join(self.directory.name, 'other.csv')
+        self.write_lines(CSV_LINES)
+        self.write_lines([line.replace(',1,', ',4,').replace(',2,', ',5,').replace(',3,', ',6,') for line in CSV_LINES],
+                         file_path=other_file_path)
+        input_files = [('data.csv', self.file_path), ('other.csv', other_file_path)]
+
+        for input_file_name, file_path in input_files:
+            etl.do_etl(self.db_manager, input_file_name, '1', file_path, chunk_size=2)
+        other_db_manager = self.create_other_database_manager()
+        etl.do_parallel_etl(other_db_manager, input_files, '1', workers=2, chunk_size=2)
+
+        loaded_data = self.loaded_data()
+        self.assertEqual(16, len(loaded_data['cleaned_reading']))
+        self.assertEqual(loaded_data, self.loaded_data(other_db_manager))
+
+        # The checkpoints of every file are committed in the order of its lines
+        self.assertEqual([('data.csv', line_number) for line_number in [2, 4, 6, 8, 10, 11, 11]] +
+                         [('other.csv', line_number) for line_number in [2, 4, 6, 8, 10, 11, 11]],
+                         self.query("SELECT input_file_name, last_loaded_line_number FROM load_control ORDER BY id",
+                                    other_db_manager))
+
 
 def run_unit_tests():
     unittest.main()
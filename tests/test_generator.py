@@ -0,0 +1,30 @@
+import unittest
+
+import src.benchmark.generator as generator
+import src.pipeline.etl as etl
+
+
+class TestGenerator(unittest.TestCase):
+
+    def test_readings_of_every_turbine_every_hour(self):
+        df = generator.generate_raw_readings(turbines=3, days=2)
+
+        self.assertEqual(3 * 48, len(df))
+        self.assertEqual(['timestamp', 'turbine_id', 'wind_speed', 'wind_direction', 'power_output'], list(df.columns))
+        self.assertEqual(['2022-03-01 00:00:00'] * 3, df['timestamp'].iloc[:3].tolist())
+        self.assertEqual([1, 2, 3], df['turbine_id'].iloc[:3].tolist())
+        self.assertEqual(0, df.isna().sum().sum())
+
+    def test_missing_and_invalid_readings_are_cleaned_by_the_etl(self):
+        df = generator.generate_raw_readings(turbines=10, days=10, missing_rate=0.1, invalid_rate=0.1)
+
+        cleaned_df, cleaning_statistics_df = etl.clean_data_with_statistics(df)
+
+        counts = cleaning_statistics_df.groupby('action')['count'].sum()
+        self.assertGreater(counts['IMPUTED'], 0)
+        self.assertGreater(counts['DROPPED'], 0)
+        self.assertEqual(len(df), len(cleaned_df) + counts['DROPPED'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import os
+import tempfile
+import unittest
+
+import src.util.instrumentation as instrumentation
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def test_stages_are_totalled(self):
+        registry = instrumentation.MetricsRegistry()
+
+        with instrumentation.timed_stage('clean', 10, registry) as stage:
+            stage.rows_out = 8
+        with instrumentation.timed_stage('clean', 5, registry) as stage:
+            stage.rows_out = 5
+
+        [clean_summary] = registry.summary()
+        self.assertEqual('clean', clean_summary['stage'])
+        self.assertEqual(2, clean_summary['calls'])
+        self.assertEqual(15, clean_summary['rows_in'])
+        self.assertEqual(13, clean_summary['rows_out'])
+
+    def test_decorated_function_counts_rows(self):
+        instrumentation.METRICS.reset()
+
+        @instrumentation.instrumented('compute', rows_in=lambda values: len(values), rows_out=len)
+        def evens(values):
+            return [value for value in values if value % 2 == 0]
+
+        self.assertEqual([0, 2], evens([0, 1, 2, 3]))
+        [compute_summary] = instrumentation.METRICS.summary()
+        self.assertEqual((1, 4, 2), (compute_summary['calls'], compute_summary['rows_in'], compute_summary['rows_out']))
+        instrumentation.METRICS.reset()
+
+    def test_prometheus_textfile(self):
+        registry = instrumentation.MetricsRegistry()
+        registry.record('write', 0.5, 100, 100)
+
+        with tempfile.TemporaryDirectory() as directory:
+            textfile_path = os.path.join(directory, 'wind_turbines.prom')
+            registry.write_prometheus_textfile(textfile_path)
+            with open(textfile_path) as textfile:
+                lines = textfile.read().splitlines()
+
+        self.assertIn('# TYPE wind_turbines_stage_seconds_total counter', lines)
+        self.assertIn('wind_turbines_stage_seconds_total{stage="write"} 0.5', lines)
+        self.assertIn('wind_turbines_stage_rows_in_total{stage="write"} 100', lines)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,205 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+from sqlalchemy import event, text
+
+from src.config import AppConfig
+from src.database.bulk_writer import copy_from_dataframe
+from src.database.database_schema import create_tables
+from src.database.persistence import DatabaseManager
+
+
+def create_database_manager(directory):
+    # A DatabaseManager of its own for every test instead of the singleton
+    db_manager = DatabaseManager.__wrapped__(f"sqlite:///{os.path.join(directory, 'wind-turbines.db')}")
+    create_tables(db_manager.engine)
+    return db_manager
+
+
+def readings_df(turbine_ids, timestamps, power_outputs):
+    return pd.DataFrame({
+        'timestamp': pd.to_datetime(timestamps),
+        'turbine_id': turbine_ids,
+        'wind_speed': 10.0,
+        'wind_direction': 180,
+        'power_output': power_outputs,
+        'is_imputed': False,
+    })
+
+
+class TestPersistence(unittest.TestCase):
+
+    def setUp(self):
+        # The accumulators & power curves are maintained by the ETL
+        patch = mock.patch.multiple(AppConfig, USE_ACCUMULATORS=True, ANOMALY_ENGINES='1:power_curve')
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.directory = tempfile.TemporaryDirectory()
+        self.db_manager = create_database_manager(self.directory.name)
+
+    def tearDown(self):
+        self.db_manager.engine.dispose()
+        self.directory.cleanup()
+
+    def fetch_accumulators(self):
+        return self.db_manager.fetch_statistics_accumulators('1', '2023-01-01', '2023-01-03')[
+            ['turbine_id', 'reading_count', 'power_sum']].sort_values('turbine_id').values.tolist()
+
+    def test_only_readings_with_a_stored_key_are_replayed(self):
+        # Given two chunks sharing a timestamp, the second chunk has no reading with the key of a stored reading
+        first_chunk_df = readings_df([1, 2], ['2023-01-01 00:00:00', '2023-01-01 00:00:00'], [1.0, 2.0])
+        second_chunk_df = readings_df([1, 2], ['2023-01-01 00:00:00', '2023-01-01 01:00:00'], [1.0, 3.0])
+        recalculated_turbines = []
+        recalculate = self.db_manager.recalculate_statistics_accumulators
+        self.db_manager.recalculate_statistics_accumulators = lambda connection, pipeline_version, df: (
+            recalculated_turbines.append(sorted(df['turbine_id'].unique().tolist())),
+            recalculate(connection, pipeline_version, df))
+
+        self.db_manager.load_cleaned_data('1', first_chunk_df.iloc[1:].copy(), 'data.csv', 1)
+        self.db_manager.load_cleaned_data('1', second_chunk_df.iloc[1:].copy(), 'data.csv', 2)
+        self.assertEqual([], recalculated_turbines)
+
+        # Replaying the first chunk with the reading of turbine 1 only recalculates turbine 2
+        self.db_manager.load_cleaned_data('1', first_chunk_df.copy(), 'data.csv', 1)
+        self.assertEqual([[2]], recalculated_turbines)
+        self.assertEqual([[1, 1, 1.0], [2, 2, 5.0]], self.fetch_accumulators())
+
+    def test_only_the_power_curve_points_of_replayed_readings_are_recalculated(self):
+        # Given turbine 1 readings in the 5 & 10 m/s bins and a reading of turbine 2
+        first_chunk_df = readings_df([1, 1, 2], ['2023-01-01 00:00:00', '2023-01-01 01:00:00', '2023-01-01 00:00:00'],
+                                     [1.0, 2.0, 4.0])
+        first_chunk_df['wind_speed'] = [5.0, 10.0, 10.0]
+        second_chunk_df = readings_df([1], ['2023-01-01 02:00:00'], [3.0])
+        self.db_manager.load_cleaned_data('1', first_chunk_df.copy(), 'data.csv', 3)
+        self.db_manager.load_cleaned_data('1', second_chunk_df.copy(), 'data.csv', 4)
+
+        recalculated_points = []
+        recalculate = self.db_manager.recalculate_power_curves
+
+        def recalculate_power_curves(connection, pipeline_version, df):
+            points_df = recalculate(connection, pipeline_version, df)
+            recalculated_points.append(points_df.sort_values('wind_speed_bin').values.tolist())
+            return points_df
+        self.db_manager.recalculate_power_curves = recalculate_power_curves
+
+        # Replaying the first reading of turbine 1 with a wind speed of 6 m/s only recalculates its old & new bins,
+        # the reading of turbine 2 with no stored key is merged
+        replayed_df = readings_df([1, 2], ['2023-01-01 00:00:00', '2023-01-01 01:00:00'], [1.0, 5.0])
+        replayed_df['wind_speed'] = [6.0, 10.0]
+        self.db_manager.load_cleaned_data('1', replayed_df, 'data.csv', 1)
+        self.assertEqual([[[1, 5], [1, 6]]], recalculated_points)
+
+        power_curves_df = self.db_manager.fetch_power_curves('1').sort_values(['turbine_id', 'wind_speed_bin'])
+        self.assertEqual([[1, 6, 1, 1.0], [1, 10, 2, 5.0], [2, 10, 2, 9.0]],
+                         power_curves_df[['turbine_id', 'wind_speed_bin', 'reading_count', 'power_sum']].values.tolist())
+
+    def test_a_key_repeated_in_a_chunk_is_counted_once(self):
+        # Given a chunk with two readings of turbine 1 at the same timestamp, the last one is stored
+        chunk_df = readings_df([1, 1, 2], ['2023-01-01 00:00:00', '2023-01-01 00:00:00', '2023-01-01 00:00:00'],
+                               [1.0, 3.0, 2.0])
+        with mock.patch.object(AppConfig, 'READING_ROLLUPS', True):
+            db_manager = create_database_manager(self.directory.name)
+        self.addCleanup(db_manager.engine.dispose)
+        db_manager.load_cleaned_data('1', chunk_df, 'data.csv', 3)
+
+        with db_manager.engine.connect() as connection:
+            self.assertEqual([(1, 3.0), (2, 2.0)], connection.execute(text(
+                "SELECT turbine_id, power_output FROM cleaned_reading ORDER BY turbine_id")).all())
+            self.assertEqual([(1, 1, 3.0), (2, 1, 2.0)], connection.execute(text(
+                "SELECT turbine_id, reading_count, power_sum FROM statistics_accumulator ORDER BY turbine_id")).all())
+            self.assertEqual([(1, 1, 3.0), (2, 1, 2.0)], connection.execute(text(
+                "SELECT turbine_id, reading_count, power_sum FROM power_curve ORDER BY turbine_id")).all())
+            self.assertEqual([('day', 1, 1), ('day', 2, 1), ('hour', 1, 1), ('hour', 2, 1), ('month', 1, 1),
+                              ('month', 2, 1)], connection.execute(text(
+                "SELECT rollup_level, turbine_id, reading_count FROM reading_rollup "
+                "ORDER BY rollup_level, turbine_id")).all())
+
+    def test_pending_readings_are_copied_with_integer_turbine_ids(self):
+        # Given readings held back as parsed, with a float turbine id & a missing wind direction
+        pending_df = pd.DataFrame({'timestamp': pd.to_datetime(['2022-01-01']), 'turbine_id': [2.0],
+                                   'wind_speed': [11.0], 'wind_direction': [float('nan')], 'power_output': [2.0]})
+        written_dfs = {}
+        write = self.db_manager.bulk_writer.write
+
+        def record_write(connection, table_name, df, conflict_columns=None):
+            written_dfs[table_name] = df
+            write(connection, table_name, df, conflict_columns)
+
+        with mock.patch.object(self.db_manager.bulk_writer, 'write', side_effect=record_write):
+            self.db_manager.load_cleaned_data('1', readings_df([1], ['2021-12-31 23:00:00'], [1.0]), 'data.csv', 1,
+                                              pending_df=pending_df)
+
+        # The CSV copied into pending_reading has an integer turbine id, PostgreSQL rejects 2.0 for an INTEGER
+        copy_cursor = mock.MagicMock()
+        copy_from_dataframe(mock.MagicMock(**{'connection.cursor.return_value': copy_cursor}), 'pending_reading',
+                            written_dfs['pending_reading'])
+        copied_csv = copy_cursor.copy_expert.call_args.args[1].getvalue()
+        self.assertEqual('2022-01-01 00:00:00.000000,2,11.0,,2.0,1,data.csv,\n', copied_csv)
+
+        fetched_df = self.db_manager.fetch_pending_readings('1', 'data.csv')
+        self.assertEqual([2.0], fetched_df['turbine_id'].tolist())
+
+    def test_cleaning_statistics_are_only_scanned_after_a_drop(self):
+        pending_df = readings_df([1], ['2023-01-01 01:00:00'], [None]).drop(columns='is_imputed')
+        statements = []
+        event.listen(self.db_manager.engine, 'before_cursor_execute',
+                     lambda connection, cursor, statement, *args: statements.append(statement))
+
+        def count_cleaning_statistics_deletes():
+            return sum(statement.startswith('DELETE FROM cleaning_statistics') for statement in statements)
+
+        # The chunks holding back readings do not touch the cleaning statistics
+        for line_number in [1, 2]:
+            self.db_manager.load_cleaned_data('1', readings_df([1], ['2023-01-01 00:00:00'], [1.0]), 'data.csv',
+                                              line_number, pending_df=pending_df)
+        self.assertEqual(0, count_cleaning_statistics_deletes())
+
+        # The chunk after the readings held back were dropped withdraws their drop
+        self.db_manager.load_cleaned_data('1', readings_df([1], ['2023-01-01 00:00:00'], [1.0]).iloc[:0], 'data.csv',
+                                          2, cleaning_statistics_df=pd.DataFrame({
+                                              'turbine_id': [1], 'action': ['DROPPED'], 'reason': ['NOT_IMPUTABLE'],
+                                              'count': [1]}), pending_df=pending_df, pending_dropped=True)
+        self.db_manager.load_cleaned_data('1', readings_df([1], ['2023-01-01 02:00:00'], [1.0]), 'data.csv', 3,
+                                          pending_df=pending_df.iloc[:0])
+        self.assertEqual(1, count_cleaning_statistics_deletes())
+        with self.db_manager.engine.connect() as connection:
+            self.assertEqual(0, connection.execute(text("SELECT COUNT(*) FROM cleaning_statistics")).scalar())
+
+    def test_switched_off_partial_stats_are_filled_in_by_a_rebuild(self):
+        with mock.patch.multiple(AppConfig, USE_ACCUMULATORS=False, ANOMALY_ENGINES='1:zscore'):
+            db_manager = create_database_manager(self.directory.name)
+        self.addCleanup(db_manager.engine.dispose)
+
+        # Without stats using them the ETL neither maintains the accumulators nor the power curves
+        db_manager.load_cleaned_data('1', readings_df([1, 2], ['2023-01-01 00:00:00'] * 2, [1.0, 2.0]), 'data.csv', 2)
+        self.assertEqual([], self.fetch_accumulators())
+        self.assertTrue(self.db_manager.fetch_power_curves('1').empty)
+
+        # Once switched on they are rebuilt from the readings
+        self.db_manager.rebuild_statistics_accumulators('1')
+        self.assertEqual([[1, 1, 1.0], [2, 1, 2.0]], self.fetch_accumulators())
+        self.assertEqual([[1, 1, 1.0], [2, 1, 2.0]], self.db_manager.fetch_power_curves('1')[
+            ['turbine_id', 'reading_count', 'power_sum']].values.tolist())
+
+    def test_a_failure_mid_batch_rolls_back_the_uncommitted_chunks(self):
+        chunk_dfs = [readings_df([1, 2], [f"2023-01-01 0{hour}:00:00"] * 2, [1.0, 2.0]) for hour in range(3)]
+
+        # The first two chunks are committed together, the load of the third one fails before its batch is full
+        with self.assertRaises(RuntimeError):
+            with self.db_manager.load_batch(chunks_per_commit=2) as load_batch:
+                for line_number, chunk_df in enumerate(chunk_dfs, start=1):
+                    load_batch.load_cleaned_data('1', chunk_df, 'data.csv', line_number * 2)
+                    if line_number == 3:
+                        raise RuntimeError('load failed')
+
+        self.assertEqual(4, self.db_manager.fetch_latest_load_control('data.csv', '1').last_loaded_line_number)
+        with self.db_manager.engine.connect() as connection:
+            self.assertEqual(4, connection.execute(text("SELECT COUNT(*) FROM cleaned_reading")).scalar())
+        self.assertEqual([[1, 2, 2.0], [2, 2, 4.0]], self.fetch_accumulators())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import contextlib
+import csv
+import io
+import os
+import tempfile
+import unittest
+
+import src.util.instrumentation as instrumentation
+import src.util.profiling as profiling
+
+
+class TestProfiling(unittest.TestCase):
+
+    def test_profiles_are_written_to_the_run_directory(self):
+        with tempfile.TemporaryDirectory() as directory, contextlib.redirect_stdout(io.StringIO()):
+            for profiler in profiling.PROFILERS:
+                result = profiling.profile_step(profiler, directory, f"sum_{profiler}", lambda: sum(range(1000)), 5)
+                self.assertEqual(499500, result)
+
+            self.assertEqual(['sum_cprofile.prof', 'sum_tracemalloc.tracemalloc'], sorted(os.listdir(directory)))
+
+    def test_chunk_sampler_samples_clean_and_compute(self):
+        with tempfile.TemporaryDirectory() as directory:
+            samples_path = os.path.join(directory, 'chunk_samples.csv')
+            with profiling.ChunkSampler(samples_path):
+                for stage in ['read', 'clean', 'write', 'clean', 'compute']:
+                    with instrumentation.timed_stage(stage, 10):
+                        pass
+
+            with open(samples_path) as samples_file:
+                samples = list(csv.DictReader(samples_file))
+        instrumentation.METRICS.reset()
+
+        self.assertEqual([('clean', '1'), ('clean', '2'), ('compute', '1')],
+                         [(sample['stage'], sample['call']) for sample in samples])
+        self.assertEqual([], instrumentation.METRICS.listeners)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import tempfile
+import unittest
+
+import src.pipeline.reader as reader
+
+CSV_CONTENT = (b"timestamp,turbine_id,wind_speed,wind_direction,power_output\r\n"
+               b"2022-03-01 00:00:00,1,11.8,169,2.7\r\n"
+               b"2022-03-01 00:00:00,2,11.6,24,2.2\r\n"
+               b"2022-03-01 01:00:00,1,13.8,335,2.3\r\n"
+               b"2022-03-01 01:00:00,2,12.8,238,1.9\r\n"
+               b"2022-03-01 02:00:00,1,10.1,120,1.5\r\n")
+
+
+class TestReader(unittest.TestCase):
+
+    def setUp(self):
+        file_descriptor, self.file_path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(file_descriptor, 'wb') as file:
+            file.write(CSV_CONTENT)
+
+    def tearDown(self):
+        os.remove(self.file_path)
+
+    def test_chunks_are_streamed_with_line_numbers_and_offsets(self):
+        chunks = list(reader.iter_raw_chunks(self.file_path, chunk_size=2))
+
+        self.assertEqual([(1, 2), (3, 4), (5, 5)],
+                         [(chunk.start_line_number, chunk.end_line_number) for chunk in chunks])
+        self.assertEqual(len(CSV_CONTENT), chunks[-1].end_byte_offset)
+
+        df, coercion_errors = reader.parse_chunk(chunks[1])
+        self.assertEqual({}, coercion_errors)
+        self.assertEqual(['timestamp', 'turbine_id', 'wind_speed', 'wind_direction', 'power_output'],
+                         list(df.columns))
+        self.assertEqual([1, 2], df['turbine_id'].tolist())
+        self.assertEqual([13.8, 12.8], df['wind_speed'].tolist())
+
+    def test_resume_from_byte_offset_matches_resume_from_line_number(self):
+        first_chunk = next(reader.iter_raw_chunks(self.file_path, chunk_size=2))
+
+        from_offset = list(reader.iter_raw_chunks(self.file_path, 2, first_chunk.end_line_number + 1,
+                                                  first_chunk.end_byte_offset))
+        from_line_number = list(reader.iter_raw_chunks(self.file_path, 2, first_chunk.end_line_number + 1))
+
+        self.assertEqual(from_line_number, from_offset)
+        self.assertEqual(3, from_offset[0].start_line_number)
+
+    def test_line_being_appended_is_left_for_the_next_read(self):
+        with open(self.file_path, 'ab') as file:
+            file.write(b"2022-03-01 02:00:00,2,9.")
+
+        chunks = list(reader.iter_raw_chunks(self.file_path, chunk_size=3, complete_lines_only=True))
+
+        # The last chunk ends at the last line break, a resumed read starts with the incomplete line
+        self.assertEqual([(1, 3), (4, 5)], [(chunk.start_line_number, chunk.end_line_number) for chunk in chunks])
+        self.assertEqual(len(CSV_CONTENT), chunks[-1].end_byte_offset)
+
+    def test_values_that_are_not_numbers_are_counted_as_coercion_errors(self):
+        raw_chunk = reader.RawChunk(header=CSV_CONTENT.splitlines(keepends=True)[0],
+                                    data=(b"2022-03-01 00:00:00,some_id,11.8,,2.7\r\n"
+                                          b"2022-03-01 00:00:00,2,fast,24,2.2\r\n"),
+                                    start_line_number=1, end_line_number=2, end_byte_offset=0)
+
+        df, coercion_errors = reader.parse_chunk(raw_chunk)
+
+        # The missing wind direction is not an error, it is imputed when the readings are cleaned
+        self.assertEqual({'turbine_id': 1, 'wind_speed': 1, 'wind_direction': 0, 'power_output': 0}, coercion_errors)
+        self.assertTrue(df['turbine_id'].isna().iloc[0])
+        self.assertEqual('float64', df['wind_speed'].dtype)
+
+
+if __name__ == '__main__':
+    unittest.main()
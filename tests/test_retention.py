@@ -0,0 +1,76 @@
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+import src.database.retention as retention
+from src.database.bulk_writer import PandasBulkWriter
+from src.database.database_schema import create_tables
+
+
+class TestRetention(unittest.TestCase):
+
+    def setUp(self):
+        # Given the readings of 3 pipeline versions, with the stats of the first one
+        engine = create_engine('sqlite://')
+        create_tables(engine)
+        with engine.begin() as connection:
+            writer = PandasBulkWriter()
+            writer.write(connection, 'load_control', pd.DataFrame({
+                'id': [1, 2, 3], 'pipeline_version': [1, 2, 3], 'input_file_name': 'data_group_1.csv'}))
+            writer.write(connection, 'cleaned_reading', pd.DataFrame({
+                'load_id': [1] * 5 + [2] * 5 + [3] * 5,
+                'pipeline_version': [1] * 5 + [2] * 5 + [3] * 5,
+                'turbine_id': [1, 2, 3, 4, 5] * 3,
+                'timestamp': pd.Timestamp('2023-01-01'),
+                'power_output': np.arange(15, dtype='float64'),
+            }))
+            writer.write(connection, 'statistics_control', pd.DataFrame({
+                'id': [1], 'pipeline_version': [1], 'stats_version': [1]}))
+            writer.write(connection, 'statistics', pd.DataFrame({
+                'statistics_control_id': [1, 1], 'turbine_id': [1, 2], 'average': [1.0, 2.0]}))
+        self.db_manager = SimpleNamespace(engine=engine)
+
+    def count_rows(self, table_name):
+        with self.db_manager.engine.connect() as connection:
+            return connection.execute(text(f"SELECT pipeline_version, COUNT(*) FROM {table_name} "
+                                           f"GROUP BY pipeline_version")).all()
+
+    def test_superseded_pipeline_versions(self):
+        self.assertEqual([1, 2], retention.superseded_pipeline_versions(self.db_manager, '3'))
+        self.assertEqual([1], retention.superseded_pipeline_versions(self.db_manager, '3', keep_versions=1))
+        self.assertEqual([], retention.superseded_pipeline_versions(self.db_manager, '1'))
+
+    def test_compacted_versions_are_archived_in_batches(self):
+        for parquet in [True, False]:
+            self.setUp()
+            with tempfile.TemporaryDirectory() as archive_directory, \
+                    mock.patch.object(retention, 'pa', retention.pa if parquet else None):
+                report = retention.compact_pipeline_versions(self.db_manager, [1, 2], archive_directory, batch_rows=2)
+
+                # Only the rows of the live version are left
+                self.assertEqual([(3, 5)], self.count_rows('cleaned_reading'))
+                self.assertEqual([(3, 1)], self.count_rows('load_control'))
+                self.assertEqual([], self.count_rows('statistics_control'))
+                self.assertEqual(10, report['tables']['cleaned_reading'])
+                self.assertEqual(2, report['tables']['statistics'])
+
+                # The 5 readings of the version are archived in 3 batches
+                readings_directory = os.path.join(archive_directory, 'pipeline_version=1', 'cleaned_reading')
+                archive_files = sorted(os.listdir(readings_directory))
+                self.assertEqual(3, len(archive_files))
+                if parquet:
+                    archived_df = pd.read_parquet(readings_directory)
+                    self.assertEqual([0.0, 1.0, 2.0, 3.0, 4.0], archived_df['power_output'].tolist())
+                else:
+                    with np.load(os.path.join(readings_directory, archive_files[0])) as archive:
+                        self.assertEqual([0.0, 1.0], archive['power_output'].tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import src.analysis.rollups as rollups
+import src.analysis.stats as stats
+
+
+class TestRollups(unittest.TestCase):
+
+    def test_monthly_rollups_of_chunks_match_stats_of_readings(self):
+        # Given the readings of 2 turbines over 2 months loaded in two chunks
+        input_df = pd.DataFrame({
+            'timestamp': pd.to_datetime(['2023-01-01 00:10:00', '2023-01-01 00:50:00', '2023-01-31 23:00:00',
+                                         '2023-02-01 00:00:00', '2023-01-01 00:10:00', '2023-01-15 12:00:00',
+                                         '2023-02-10 08:00:00', '2023-02-28 23:59:00']),
+            'turbine_id': [1, 1, 1, 1, 2, 2, 2, 2],
+            'wind_speed': [10.0, 12.0, 8.0, 6.0, 9.0, 11.0, 13.0, 7.0],
+            'wind_direction': [350.0, 10.0, 100.0, 180.0, 200.0, 190.0, 181.0, 90.0],
+            'power_output': [1.0, 1.2, 0.8, 1.5, 1.4, 2.0, 1.1, 0.9]
+        })
+        chunk_rollups = [rollups.calculate_all_rollups(chunk_df) for chunk_df in [input_df.iloc[::2],
+                                                                                 input_df.iloc[1::2]]]
+
+        # The rollups of each level of the chunks are merged like the ETL does
+        merged = {rollup_level: rollups.merge_rollups(pd.concat([chunk[rollup_level] for chunk in chunk_rollups],
+                                                                ignore_index=True))
+                  for rollup_level in rollups.ROLLUP_LEVELS}
+        self.assertEqual([3, 2, 1, 2], merged['month']['reading_count'].tolist())
+        self.assertEqual(7, len(merged['hour']))
+
+        # The totals of the months are the stats of the readings
+        rollup_stats = rollups.calculate_rollup_stats(merged['month'], ['turbine_id'])
+        stats_df = stats.calculate_stats(input_df)
+        pd.testing.assert_frame_equal(rollup_stats[['turbine_id', 'min_power', 'max_power', 'average',
+                                                    'std_deviation']], stats_df.drop(columns='has_anomaly_reading'))
+        self.assertEqual([9.0, 10.0], rollup_stats['mean_wind_speed'].tolist())
+        self.assertEqual(['n', 's'], rollup_stats['dominant_wind_direction'].tolist())
+
+    def test_levels_grouped_from_the_readings_match_the_finer_levels_rolled_up(self):
+        rng = np.random.default_rng(0)
+        input_df = pd.DataFrame({
+            'timestamp': pd.Timestamp('2023-01-30') + pd.to_timedelta(rng.integers(0, 5 * 24 * 60, 500), unit='min'),
+            'turbine_id': rng.integers(1, 4, 500),
+            'wind_speed': rng.uniform(0, 20, 500),
+            'wind_direction': rng.integers(0, 360, 500),
+            'power_output': rng.uniform(0, 5, 500),
+        })
+
+        all_rollups = rollups.calculate_all_rollups(input_df)
+        for finer_level, rollup_level in zip(rollups.ROLLUP_LEVELS, rollups.ROLLUP_LEVELS[1:]):
+            pd.testing.assert_frame_equal(rollups.roll_up(all_rollups[finer_level], rollup_level),
+                                          all_rollups[rollup_level])
+        self.assertEqual(500, all_rollups['month']['reading_count'].sum())
+
+    def test_coarsest_rollup_level_covering_the_range(self):
+        self.assertEqual('month', rollups.coarsest_rollup_level(datetime(2023, 1, 1), datetime(2023, 3, 1)))
+        self.assertEqual('day', rollups.coarsest_rollup_level(datetime(2023, 1, 1), datetime(2023, 1, 15)))
+        self.assertEqual('hour', rollups.coarsest_rollup_level(datetime(2023, 1, 1, 6), datetime(2023, 1, 15)))
+        with self.assertRaises(ValueError):
+            rollups.coarsest_rollup_level(datetime(2023, 1, 1, 6, 30), datetime(2023, 1, 15))
+
+
+if __name__ == '__main__':
+    unittest.main()
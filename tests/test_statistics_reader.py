@@ -0,0 +1,79 @@
+import unittest
+
+import pandas as pd
+
+from src.database.statistics_reader import StatisticsReader
+
+
+class StatisticsDatabase:
+    # The statistics of 3 daily windows of 2 turbines, counting the queries of the reader
+    def __init__(self):
+        self.windows_df = pd.DataFrame({
+            'statistics_control_id': [1, 2, 3],
+            'from_date': pd.to_datetime(['2023-01-01', '2023-01-02', '2023-01-03']),
+            'to_date': pd.to_datetime(['2023-01-02', '2023-01-03', '2023-01-04']),
+        })
+        self.stats_df = pd.DataFrame({
+            'statistics_control_id': [1, 1, 2, 2, 3, 3],
+            'turbine_id': [1, 2, 1, 2, 1, 2],
+            'min_power': [1.0, 1.1, 1.2, 1.3, 1.4, 1.5],
+            'max_power': [2.0, 2.1, 2.2, 2.3, 2.4, 2.5],
+            'average': [1.5, 1.6, 1.7, 1.8, 1.9, 2.0],
+            'std_deviation': [0.1, 0.2, 0.3, 0.4, 0.5, 0.6],
+            'has_anomaly_reading': [0, 1, 0, 0, 0, 1],
+        })
+        self.listeners = []
+        self.queried_stats_control_ids = []
+
+    def add_statistics_listener(self, listener):
+        self.listeners.append(listener)
+
+    def remove_statistics_listener(self, listener):
+        self.listeners.remove(listener)
+
+    def fetch_statistics_controls(self, pipeline_version, stats_version):
+        return self.windows_df
+
+    def fetch_statistics(self, stats_control_ids):
+        self.queried_stats_control_ids.append(stats_control_ids)
+        return self.stats_df[self.stats_df['statistics_control_id'].isin(stats_control_ids)].copy()
+
+
+class TestStatisticsReader(unittest.TestCase):
+
+    def test_repeated_reads_are_served_from_the_cache(self):
+        database = StatisticsDatabase()
+        reader = StatisticsReader(database, cache_windows=2)
+
+        stats_df = reader.read_statistics(1, 1, '2023-01-01', '2023-01-03', turbine_ids=[2])
+        self.assertEqual([1.6, 1.8], stats_df['average'].tolist())
+        self.assertEqual([True, False], stats_df['has_anomaly_reading'].tolist())
+
+        # The second read only queries the window that was not read before, the first window is then evicted
+        arrays = reader.read_statistics_arrays('1', '1', '2023-01-02', '2023-01-04')
+        self.assertEqual([1, 2, 1, 2], arrays['turbine_id'].tolist())
+        self.assertEqual([[1, 2], [3]], database.queried_stats_control_ids)
+        self.assertEqual({'hits': 1, 'misses': 3, 'windows': 2, 'cache_windows': 2}, reader.cache_info())
+
+        reader.read_statistics(1, 1, '2023-01-01', '2023-01-02')
+        self.assertEqual([[1, 2], [3], [1]], database.queried_stats_control_ids)
+
+    def test_stored_statistics_invalidate_their_window(self):
+        database = StatisticsDatabase()
+        reader = StatisticsReader(database)
+        reader.read_statistics(1, 1, '2023-01-01', '2023-01-04')
+
+        database.stats_df.loc[database.stats_df['statistics_control_id'] == 2, 'average'] = 9.0
+        for listener in database.listeners:
+            listener('1', '1', [(pd.Timestamp('2023-01-02'), pd.Timestamp('2023-01-03'))])
+
+        self.assertEqual([1.5, 1.6, 9.0, 9.0, 1.9, 2.0],
+                         reader.read_statistics(1, 1, '2023-01-01', '2023-01-04')['average'].tolist())
+        self.assertEqual([[1, 2, 3], [2]], database.queried_stats_control_ids)
+
+        reader.close()
+        self.assertEqual([], database.listeners)
+
+
+if __name__ == '__main__':
+    unittest.main()
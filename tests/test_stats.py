@@ -1,6 +1,13 @@
 import unittest
+from datetime import datetime, timedelta
+
 import pandas as pd
+from sqlalchemy import create_engine
+
 import src.analysis.stats as stats
+from src.database.bulk_writer import PandasBulkWriter
+from src.database.database_schema import CleanedReadingEntity, create_tables
+from src.database.persistence import CLEANED_READINGS_SHARD_QUERY
 
 
 class TestStats(unittest.TestCase):
@@ -29,6 +36,7 @@ class TestStats(unittest.TestCase):
             'min_power': [1.00, 0.80, -1.22],
             'max_power': [1.20, 1.50, 15.13],
             'average': [1.10, 1.23, 2.47],
+            'std_deviation': [0.14, 0.38, 6.30],
             'has_anomaly_reading': [False, False, True]
         })
 
@@ -37,6 +45,7 @@ class TestStats(unittest.TestCase):
             "min_power": "float64",
             "max_power": "float64",
             "average": "float64",
+            "std_deviation": "float64",
         }).round(2)
 
         # Check if the stats DataFrame is as expected
@@ -52,6 +61,93 @@ class TestStats(unittest.TestCase):
         pd.testing.assert_frame_equal(stats_df.reset_index(drop=True),
                                       expected_result.reset_index(drop=True))
 
+    def test_stats_for_single_reading_and_constant_readings(self):
+        # Given a turbine with a single reading & a turbine with readings that are all equal
+        input_df = pd.DataFrame({
+            'timestamp': pd.to_datetime(['2023-01-01', '2023-01-01', '2023-01-01', '2023-01-01']),
+            'turbine_id': [2, 1, 1, 1],
+            'wind_speed': [10, 12, 8, 15],
+            'wind_direction': [180, 185, 200, 220],
+            'power_output': [1.00, 1.50, 1.50, 1.50]
+        })
+
+        stats_df = stats.calculate_stats(input_df)
+
+        # The standard deviation of the single reading is undefined & neither turbine has an anomaly
+        self.assertEqual([1, 2], stats_df['turbine_id'].tolist())
+        self.assertEqual(0.0, stats_df['std_deviation'].iloc[0])
+        self.assertTrue(pd.isna(stats_df['std_deviation'].iloc[1]))
+        self.assertEqual([False, False], stats_df['has_anomaly_reading'].tolist())
+
+    def test_stats_without_readings(self):
+        input_df = pd.DataFrame({'turbine_id': pd.Series([], dtype='int64'),
+                                 'power_output': pd.Series([], dtype='float64')})
+
+        stats_df = stats.calculate_stats(input_df)
+
+        self.assertTrue(stats_df.empty)
+        self.assertEqual(['turbine_id', 'min_power', 'max_power', 'average', 'std_deviation', 'has_anomaly_reading'],
+                         list(stats_df.columns))
+
+    def test_window_stats_match_stats_per_window(self):
+        # Given the readings of two daily windows
+        input_df = pd.DataFrame({
+            'timestamp': ['2023-01-01 00:00:00.000000', '2023-01-01 05:00:00.000000', '2023-01-01 05:00:00.000000',
+                          '2023-01-02 00:00:00.000000', '2023-01-02 23:00:00.000000', '2023-01-02 23:00:00.000000'],
+            'turbine_id': [1, 1, 2, 1, 1, 2],
+            'power_output': [1.0, 1.2, 0.8, 1.5, 1.4, 2.0]
+        })
+
+        stats_df = stats.calculate_window_stats(input_df, datetime(2023, 1, 1), timedelta(days=1))
+
+        # The stats of each window are the same as the stats of the readings of that window alone
+        self.assertEqual([0, 0, 1, 1], stats_df['window_index'].tolist())
+        for window_index, window_df in [(0, input_df.iloc[:3]), (1, input_df.iloc[3:])]:
+            expected_result = stats.calculate_stats(window_df)
+            actual_result = stats_df[stats_df['window_index'] == window_index].drop(columns='window_index')
+            pd.testing.assert_frame_equal(actual_result.reset_index(drop=True), expected_result)
+
+    def test_streaming_stats_match_stats_of_all_readings(self):
+        # Given readings streamed in chunks of 3, with the readings of every turbine spread over several chunks
+        input_df = pd.DataFrame({
+            'turbine_id': [1, 1, 2, 2, 2, 3, 3, 3, 3, 3, 3],
+            'power_output': [1.00, 1.20, .80, 1.50, 1.40, 1.898753, -1.22217336, -1.05931412, 15.13199601,
+                             -0.07501486, 0.14636453]
+        })
+        readings_chunks = (input_df.iloc[start:start + 3] for start in range(0, len(input_df), 3))
+
+        stats_df = stats.calculate_streaming_stats(readings_chunks)
+
+        pd.testing.assert_frame_equal(stats_df, stats.calculate_stats(input_df), check_dtype=False)
+        self.assertTrue(stats.calculate_streaming_stats(iter([])).empty)
+
+    def test_merged_shard_stats_match_stats_of_the_window(self):
+        # Given the readings of 5 turbines in the database
+        input_df = pd.DataFrame({
+            'timestamp': pd.to_datetime(['2023-01-01 00:00:00'] * 5 + ['2023-01-01 01:00:00'] * 5),
+            'turbine_id': [1, 2, 3, 4, 5] * 2,
+            'power_output': [1.0, 1.2, 0.8, 1.5, 1.4, 2.0, 1.1, 0.9, 1.6, 1.3],
+            'pipeline_version': '1',
+            'load_id': 1,
+        })
+        engine = create_engine('sqlite://')
+        create_tables(engine)
+        with engine.begin() as connection:
+            PandasBulkWriter().write(connection, CleanedReadingEntity.__tablename__, input_df)
+
+        # The stats of the 2 shards are computed separately & merged like the parallel stats do
+        shard_stats = []
+        with engine.connect() as connection:
+            for turbine_shard in range(2):
+                shard_df = pd.read_sql_query(CLEANED_READINGS_SHARD_QUERY, connection, params={
+                    'pipeline_version': '1', 'from_date': datetime(2023, 1, 1), 'to_date': datetime(2023, 1, 2),
+                    'turbine_shard': turbine_shard, 'turbine_shards': 2})
+                self.assertTrue((shard_df['turbine_id'] % 2 == turbine_shard).all())
+                shard_stats.append(stats.calculate_stats(shard_df))
+        stats_df = pd.concat(shard_stats, ignore_index=True).sort_values('turbine_id', ignore_index=True)
+
+        pd.testing.assert_frame_equal(stats_df, stats.calculate_stats(input_df))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,87 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from sqlalchemy import text
+
+import src.analysis.stats as stats
+import src.pipeline.watch as watch
+from src.config import AppConfig
+from tests.test_persistence import create_database_manager
+
+CSV_HEADER = 'timestamp,turbine_id,wind_speed,wind_direction,power_output\n'
+
+
+class TestWatch(unittest.TestCase):
+    # Polls of an input directory of its own into a database of its own, with the stats of daily windows
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db_manager = create_database_manager(self.directory.name)
+        self.input_directory = os.path.join(self.directory.name, 'input')
+        os.makedirs(self.input_directory)
+        self.file_path = os.path.join(self.input_directory, 'data.csv')
+
+        for patch in [mock.patch.object(watch, 'DatabaseManager', return_value=self.db_manager),
+                      mock.patch.object(stats, 'DatabaseManager', return_value=self.db_manager),
+                      mock.patch.multiple(AppConfig, INPUT_DIRECTORY_PATH=self.input_directory, PIPELINE_VERSION='1',
+                                          STATS_VERSION='1', DURATION_IN_DAYS=1, BACKFILL_SLICE_DAYS=0,
+                                          USE_ACCUMULATORS=False, STREAMING_MEMORY_BUDGET_MB=0, STATS_WORKERS=1,
+                                          METRICS_TEXTFILE=None)]:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        self.db_manager.engine.dispose()
+        self.directory.cleanup()
+
+    def append(self, data):
+        with open(self.file_path, 'a') as file:
+            file.write(data)
+
+    def query(self, sql):
+        with self.db_manager.engine.connect() as connection:
+            return [tuple(row) for row in connection.execute(text(sql))]
+
+    def poll(self):
+        # Counts the windows the stats are created for
+        created_windows = []
+        create_window_stats = stats.create_window_stats
+
+        def record_window(db_manager, from_date, to_date):
+            created_windows.append((from_date, to_date))
+            create_window_stats(db_manager, from_date, to_date)
+
+        with mock.patch.object(stats, 'create_window_stats', side_effect=record_window):
+            watch.watch_input_directory(0, max_polls=1)
+        return created_windows
+
+    def test_appended_lines_refresh_only_the_stats_of_their_windows(self):
+        # Given a file with the readings of two days, the last line still being written
+        self.append(CSV_HEADER + '2022-01-01 00:00:00,1,10,180,1.0\n2022-01-01 12:00:00,1,11,190,2.0\n'
+                                 '2022-01-02 00:00:00,1,12,200,3.0\n2022-01-02 06:00:00,1,1')
+
+        # The partial line is left for the next poll, the stats of both days are created
+        self.assertEqual([(datetime(2022, 1, 1), datetime(2022, 1, 2)), (datetime(2022, 1, 2), datetime(2022, 1, 3))],
+                         self.poll())
+        self.assertEqual([(3,)], self.query("SELECT MAX(last_loaded_line_number) FROM load_control"))
+        self.assertEqual([(3,)], self.query("SELECT COUNT(*) FROM cleaned_reading"))
+
+        # Once the line is complete only the stats of its day are created again
+        self.append('3,210,5.0\n')
+        self.assertEqual([(datetime(2022, 1, 2), datetime(2022, 1, 3))], self.poll())
+        self.assertEqual([(4,)], self.query("SELECT MAX(last_loaded_line_number) FROM load_control"))
+        self.assertEqual([(4.0,)], self.query(
+            "SELECT average FROM statistics s JOIN statistics_control sc ON sc.id = s.statistics_control_id "
+            "WHERE sc.from_date = '2022-01-02 00:00:00.000000'"))
+
+        # A poll without changes creates no stats, the windows created again have a single statistics_control row
+        self.assertEqual([], self.poll())
+        self.assertEqual([('2022-01-01 00:00:00.000000', 1), ('2022-01-02 00:00:00.000000', 1)], self.query(
+            "SELECT from_date, COUNT(*) FROM statistics_control GROUP BY from_date ORDER BY from_date"))
+
+
+if __name__ == '__main__':
+    unittest.main()